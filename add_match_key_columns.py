@@ -0,0 +1,33 @@
+"""
+Add normalized call sign / vessel match keys to an existing database and backfill them
+Works on both local SQLite and Railway PostgreSQL (new databases get the columns from the models)
+
+The app runs the same migration on startup (database.init_db); this script runs it by hand.
+New and updated rows get their keys from the model event listeners; this fills in existing rows.
+"""
+import asyncio
+import sys
+from database import migrate_match_keys
+
+
+async def migrate():
+    print("="*80)
+    print("MATCH KEY COLUMN MIGRATION")
+    print("="*80)
+
+    results = await migrate_match_keys()
+
+    print("\n" + "="*80)
+    print("MIGRATION COMPLETE" if all(ok for ok, _ in results) else "MIGRATION FAILED")
+    print("="*80)
+    if not results:
+        print("  - Columns, indexes and keys already up to date")
+    for ok, message in results:
+        print(f"  {'✓' if ok else '✗'} {message}")
+    print("="*80)
+
+    return all(ok for ok, _ in results)
+
+if __name__ == "__main__":
+    if not asyncio.run(migrate()):
+        sys.exit(1)
@@ -8,6 +8,8 @@ def migrate():
     try:
         # Connect to database
         conn = sqlite3.connect('data/app.db')
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
         cursor = conn.cursor()
 
         # Check if table exists
@@ -27,20 +29,23 @@ def migrate():
             return
 
         # Add source column with default value 'calculated'
+        # Schema change and any backfill run in one transaction (one commit/fsync)
         print("Adding 'source' column to monthly_mrr_snapshots table...")
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute("""
             ALTER TABLE monthly_mrr_snapshots
             ADD COLUMN source TEXT DEFAULT 'calculated'
         """)
 
+        # Existing rows get the column default, so no backfill is needed
+
         conn.commit()
         print("Successfully added 'source' column")
 
         # Show current data
-        cursor.execute("SELECT month, source FROM monthly_mrr_snapshots ORDER BY month")
-        snapshots = cursor.fetchall()
-        print(f"\nCurrent snapshots ({len(snapshots)} total):")
-        for month, source in snapshots:
+        total = cursor.execute("SELECT COUNT(*) FROM monthly_mrr_snapshots").fetchone()[0]
+        print(f"\nCurrent snapshots ({total} total):")
+        for month, source in cursor.execute("SELECT month, source FROM monthly_mrr_snapshots ORDER BY month"):
             print(f"  {month}: {source or 'calculated'}")
 
         conn.close()
@@ -0,0 +1,52 @@
+"""
+Run the MRR gap analyses in one process
+
+Usage:
+    python analyze.py <command> [<command> ...]
+
+Commands:
+    gap         Subscription vs invoice MRR gap with multi-tier matching (analyze_mrr_gap.py)
+    deep-dive   Gap breakdown per customer + Excel export (analyze_mrr_gap_deep_dive.py)
+    september   Zoho MRR Details report for September 2025 (analyze_september.py)
+
+Commands run in the order given on one event loop and share the database
+connection pool, so connection setup is paid once instead of once per script.
+"""
+import asyncio
+import sys
+from database import engine
+from analyze_mrr_gap import analyze_gap
+from analyze_mrr_gap_deep_dive import deep_dive_gap_analysis
+import analyze_september
+
+COMMANDS = {
+    'gap': analyze_gap,
+    'deep-dive': deep_dive_gap_analysis,
+    'september': analyze_september.main,
+}
+
+
+async def run(commands):
+    try:
+        for name in commands:
+            command = COMMANDS[name]
+            if asyncio.iscoroutinefunction(command):
+                await command()
+            else:
+                command()  # Excel-only analysis, no database access
+    finally:
+        # Close pooled connections before the event loop shuts down
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    commands = sys.argv[1:]
+    unknown = [name for name in commands if name not in COMMANDS]
+
+    if not commands or unknown:
+        if unknown:
+            print(f"Unknown command(s): {', '.join(unknown)}")
+        print(__doc__)
+        sys.exit(1)
+
+    asyncio.run(run(commands))
@@ -1,12 +1,13 @@
 import pandas as pd
+import numpy as np
+import re
 import sys
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from concurrent.futures import ProcessPoolExecutor
+from excel_cache import read_excel_cached
 
-print("=" * 100)
-print("COMPREHENSIVE INVOICE MRR ANALYSIS")
-print("Comparing Invoice-based MRR vs Subscription-based MRR")
-print("=" * 100)
+# Dates in descriptions like "Gjelder perioden 01 May 2025 til 30 Apr 2026"
+DATE_PATTERN = re.compile(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})')
 
 # Files to analyze
 files = {
@@ -14,291 +15,299 @@ files = {
     '2025': r"C:/Users/nikolai/Code/Saas_analyse/excel/Receivable Details (1).xlsx"
 }
 
-all_data = []
+# Only the columns used below - skips parsing the rest of the wide Zoho export
+USECOLS = {
+    'transaction_date', 'transaction_type', 'transaction_id', 'transaction_number',
+    'status', 'item_name', 'description', 'product_name', 'customer_name',
+    'bcy_total', 'bcy_total_with_tax', 'bcy_tax_amount'
+}
+NUMERIC_COLS = ['bcy_total', 'bcy_total_with_tax', 'bcy_tax_amount']
 
-for period, file_path in files.items():
+def _read_one(period, file_path):
+    """Load one Receivable Details export (top-level so worker processes can pickle it)"""
     try:
         print(f"\nLoading {period} data from {file_path}...")
 
-        # Read Excel file
-        df = pd.read_excel(file_path, skiprows=0)
+        # Read Excel file (via Parquet cache) - first row is the report title,
+        # column names are on the second row. Repeated headers come back as
+        # 'name.1', 'name.2' (pandas' own dedupe) and are dropped by USECOLS
+        df = read_excel_cached(file_path, header=1, columns=USECOLS)
 
-        # Use first row as column names
-        df.columns = df.iloc[0]
-        df = df[1:].reset_index(drop=True)
-
-        # Handle duplicate column names
-        cols = pd.Series(df.columns)
-        for dup in cols[cols.duplicated()].unique():
-            cols[cols[cols == dup].index.values.tolist()] = [dup + '_' + str(i) if i != 0 else dup for i in range(sum(cols == dup))]
-        df.columns = cols
+        # Stray text in the amount columns (e.g. "-", "N/A") becomes NaN instead of failing the file
+        for col in NUMERIC_COLS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
 
         print(f"  Loaded {len(df)} rows")
-        all_data.append(df)
+        return df
 
     except Exception as e:
         print(f"  ERROR: {e}")
-        continue
-
-# Combine all data
-df_combined = pd.concat(all_data, ignore_index=True)
-
-print(f"\n{'='*100}")
-print(f"COMBINED DATA SUMMARY")
-print(f"{'='*100}")
-print(f"Total rows: {len(df_combined)}")
-print(f"Date range: {df_combined['transaction_date'].min()} to {df_combined['transaction_date'].max()}")
-
-# Convert numeric columns
-numeric_cols = ['bcy_item_price', 'fcy_item_price', 'bcy_total', 'fcy_total',
-                'bcy_total_with_tax', 'fcy_total_with_tax', 'bcy_tax_amount', 'fcy_tax_amount',
-                'quantity_ordered']
-
-for col in numeric_cols:
-    if col in df_combined.columns:
-        df_combined[col] = pd.to_numeric(df_combined[col], errors='coerce')
-
-# Convert transaction_date to datetime
-df_combined['transaction_date'] = pd.to_datetime(df_combined['transaction_date'], errors='coerce')
-
-print(f"\nTransaction types: {df_combined['transaction_type'].value_counts().to_dict()}")
-print(f"Statuses: {df_combined['status'].value_counts().to_dict()}")
-
-# Financial summary
-print(f"\n{'='*100}")
-print(f"TOTAL FINANCIAL SUMMARY (All Time)")
-print(f"{'='*100}")
-print(f"Total invoiced (excl VAT): {df_combined['bcy_total'].sum():,.2f} NOK")
-print(f"Total invoiced (incl VAT): {df_combined['bcy_total_with_tax'].sum():,.2f} NOK")
-print(f"Total VAT: {df_combined['bcy_tax_amount'].sum():,.2f} NOK")
-
-# Separate invoices and credit notes
-invoices = df_combined[df_combined['transaction_type'] == 'invoice'].copy()
-creditnotes = df_combined[df_combined['transaction_type'] == 'creditnote'].copy()
-
-print(f"\nInvoices: {len(invoices)} lines, {invoices['bcy_total'].sum():,.2f} NOK (excl VAT)")
-print(f"Credit notes: {len(creditnotes)} lines, {creditnotes['bcy_total'].sum():,.2f} NOK (excl VAT)")
-print(f"Net: {(invoices['bcy_total'].sum() + creditnotes['bcy_total'].sum()):,.2f} NOK")
-
-# Monthly breakdown
-print(f"\n{'='*100}")
-print(f"MONTHLY BREAKDOWN (Invoice Date)")
-print(f"{'='*100}")
-
-df_combined['year_month'] = df_combined['transaction_date'].dt.to_period('M')
-monthly = df_combined.groupby(['year_month', 'transaction_type']).agg({
-    'bcy_total': 'sum',
-    'transaction_id': 'count'
-}).reset_index()
-
-monthly_pivot = monthly.pivot_table(
-    index='year_month',
-    columns='transaction_type',
-    values=['bcy_total', 'transaction_id'],
-    fill_value=0
-)
-
-print("\nMonthly invoice amounts (excl VAT):")
-print(monthly_pivot.head(20))
-
-# Now, let's try to calculate MRR from these invoices
-# This is tricky because we need to extract period information
-print(f"\n{'='*100}")
-print(f"ANALYZING INVOICE DESCRIPTIONS FOR PERIODS")
-print(f"{'='*100}")
-
-# Look at item descriptions to understand period structure
-sample_descriptions = df_combined[['item_name', 'description', 'product_name']].drop_duplicates().head(50)
-print("\nSample item descriptions:")
-print(sample_descriptions.to_string())
+        return None
 
 # Try to extract periods from description
 # Looks like format: "Gjelder perioden DD MMM YYYY til DD MMM YYYY"
-import re
-
-def extract_period_months(desc):
-    """Extract number of months from description like 'Gjelder perioden 01 May 2025 til 30 Apr 2026'"""
-    if pd.isna(desc):
-        return None, None, None
-
-    # Try to find date patterns
-    date_pattern = r'(\d{1,2})\s+(\w+)\s+(\d{4})'
-    matches = re.findall(date_pattern, str(desc))
-
-    if len(matches) >= 2:
-        try:
-            # Parse start and end dates
-            start_str = f"{matches[0][0]} {matches[0][1]} {matches[0][2]}"
-            end_str = f"{matches[1][0]} {matches[1][1]} {matches[1][2]}"
-
-            start_date = pd.to_datetime(start_str, format='%d %b %Y', errors='coerce')
-            end_date = pd.to_datetime(end_str, format='%d %b %Y', errors='coerce')
-
-            if pd.notna(start_date) and pd.notna(end_date):
-                # Calculate difference in months
-                delta = relativedelta(end_date, start_date)
-                months = delta.years * 12 + delta.months + (1 if delta.days > 0 else 0)
-                return months, start_date, end_date
-        except:
-            pass
-
-    return None, None, None
-
-print("\nExtracting periods from descriptions...")
-# Apply function and expand results into separate columns
-period_info = df_combined['description'].apply(extract_period_months).apply(pd.Series)
-period_info.columns = ['period_months', 'period_start', 'period_end']
-df_combined = pd.concat([df_combined, period_info], axis=1)
-
-# Check how many we extracted
-extracted = df_combined['period_months'].notna().sum()
-print(f"Successfully extracted period info from {extracted} / {len(df_combined)} rows ({100*extracted/len(df_combined):.1f}%)")
+def extract_period_months(descriptions):
+    """Extract number of months from descriptions like 'Gjelder perioden 01 May 2025 til 30 Apr 2026'
+
+    Vectorized over the whole column: one str.extractall sweep and one date parse per side.
+    """
+    matches = descriptions.fillna('').astype(str).str.extractall(DATE_PATTERN)
+    matches = matches[matches.index.get_level_values('match') < 2]
+    parts = matches[0] + ' ' + matches[1] + ' ' + matches[2]
+    parts = parts.unstack('match').reindex(index=descriptions.index, columns=[0, 1])
+
+    start_date = pd.to_datetime(parts[0], format='%d %b %Y', errors='coerce', cache=True)
+    end_date = pd.to_datetime(parts[1], format='%d %b %Y', errors='coerce', cache=True)
+
+    # Same as relativedelta: whole months, plus one for any leftover days
+    months = ((end_date.dt.year - start_date.dt.year) * 12
+              + (end_date.dt.month - start_date.dt.month)
+              + (end_date.dt.day > start_date.dt.day).astype(int))
+
+    # Only keep rows where both dates parsed
+    valid = start_date.notna() & end_date.notna()
+    return pd.DataFrame({
+        'period_months': months.where(valid),
+        'period_start': start_date.where(valid),
+        'period_end': end_date.where(valid),
+    })
 
 # For rows without period info, try to infer from product_name
 # (år) = 12 months, (mnd) = 1 month
-def infer_period_from_name(row):
-    if pd.notna(row['period_months']):
-        return row['period_months']
-
-    name = str(row['item_name'])
-    if '(år)' in name or '(År)' in name:
-        return 12
-    elif '(mnd)' in name or '(Mnd)' in name:
-        return 1
-    elif '60 dager' in name:
-        return 2  # ~60 days = ~2 months
-    elif '30 dager' in name:
-        return 1  # ~30 days = ~1 month
-
-    return None
-
-df_combined['period_months_inferred'] = df_combined.apply(infer_period_from_name, axis=1)
-inferred = df_combined['period_months_inferred'].notna().sum()
-print(f"After inference: {inferred} / {len(df_combined)} rows have period info ({100*inferred/len(df_combined):.1f}%)")
+def infer_period_from_name(item_names):
+    """Infer period months from item names, checked in the same order as before"""
+    name = item_names.astype(str)
+    conditions = [
+        name.str.contains('(år)', regex=False) | name.str.contains('(År)', regex=False),
+        name.str.contains('(mnd)', regex=False) | name.str.contains('(Mnd)', regex=False),
+        name.str.contains('60 dager', regex=False),  # ~60 days = ~2 months
+        name.str.contains('30 dager', regex=False),  # ~30 days = ~1 month
+    ]
+    return np.select(conditions, [12, 1, 2, 1], default=np.nan)
 
 # Now calculate period_start and period_end for rows where we have period_months but no dates
-def calculate_period_dates(row):
+def calculate_period_dates(df):
     """Calculate period start/end dates based on transaction date and inferred months"""
-    # If we already have dates from description extraction, keep them
-    if pd.notna(row['period_start']) and pd.notna(row['period_end']):
-        return row['period_start'], row['period_end']
-
-    # If we have inferred months, calculate dates
-    if pd.notna(row['period_months_inferred']) and pd.notna(row['transaction_date']):
-        # Use transaction date as start
-        start_date = row['transaction_date']
-        # Calculate end date by adding months
-        months = int(row['period_months_inferred'])
-        end_date = start_date + relativedelta(months=months)
-        return start_date, end_date
-
-    return row['period_start'], row['period_end']
-
-print("\nCalculating period dates for inferred periods...")
-period_dates = df_combined.apply(calculate_period_dates, axis=1).apply(pd.Series)
-period_dates.columns = ['calc_start', 'calc_end']
-df_combined['period_start'] = period_dates['calc_start']
-df_combined['period_end'] = period_dates['calc_end']
-
-# Convert to datetime to ensure proper comparison
-df_combined['period_start'] = pd.to_datetime(df_combined['period_start'], errors='coerce')
-df_combined['period_end'] = pd.to_datetime(df_combined['period_end'], errors='coerce')
-
-# Check how many now have dates
-with_dates = df_combined['period_start'].notna().sum()
-print(f"After calculation: {with_dates} / {len(df_combined)} rows have period dates ({100*with_dates/len(df_combined):.1f}%)")
+    period_start = df['period_start'].copy()
+    period_end = df['period_end'].copy()
+
+    # Rows with dates from description extraction keep them; the rest start at the transaction date
+    needs_dates = (period_start.isna() | period_end.isna()) & \
+        df['period_months_inferred'].notna() & df['transaction_date'].notna()
+
+    # Only a handful of distinct month counts (1, 2, 12), so add one DateOffset per group
+    for months in df.loc[needs_dates, 'period_months_inferred'].unique():
+        mask = needs_dates & (df['period_months_inferred'] == months)
+        period_start[mask] = df.loc[mask, 'transaction_date']
+        period_end[mask] = df.loc[mask, 'transaction_date'] + pd.DateOffset(months=int(months))
+
+    return period_start, period_end
 
 # Calculate MRR per line item
-def calculate_line_mrr(row):
-    """Calculate MRR for a single invoice line"""
-    amount_excl_vat = row['bcy_total']
-    period_months = row['period_months_inferred']
+def calculate_line_mrr(df):
+    """Calculate MRR for every invoice line (amount / months, 0 when unknown)"""
+    amount_excl_vat = df['bcy_total'].to_numpy(dtype=float)
+    period_months = df['period_months_inferred'].to_numpy(dtype=float)
 
-    if pd.isna(amount_excl_vat) or pd.isna(period_months) or period_months == 0:
-        return 0
+    valid = ~np.isnan(amount_excl_vat) & ~np.isnan(period_months) & (period_months != 0)
 
     # MRR = amount / months
-    mrr = amount_excl_vat / period_months
+    mrr = np.zeros(len(df))
+    np.divide(amount_excl_vat, period_months, out=mrr, where=valid)
 
     return mrr
 
-df_combined['line_mrr'] = df_combined.apply(calculate_line_mrr, axis=1)
-
-print(f"\n{'='*100}")
-print(f"INVOICE-BASED MRR CALCULATION")
-print(f"{'='*100}")
-
 # For each month, calculate active MRR
-# A line contributes to MRR in a month if its period covers that month
-
-def calculate_monthly_mrr(df, target_month):
-    """Calculate MRR for a specific month based on active invoice periods (including credit notes)"""
-    target_date = pd.to_datetime(f"{target_month}-01")
+# A line contributes to MRR in a month if its period covers the first day of that month
+def calculate_monthly_mrr(df, months_to_check):
+    """Calculate MRR per month based on active invoice periods (including credit notes)
 
-    # Filter to lines where period covers target month
+    Expands every line into the months it is active in and aggregates them in a
+    single groupby, instead of filtering the full DataFrame once per month.
+    """
     # CRITICAL: Include both invoices AND credit notes for accurate MRR
-    active_lines = df[
-        (df['period_start'] <= target_date) &
-        (df['period_end'] >= target_date) &
+    lines = df[
+        df['period_start'].notna() &
+        df['period_end'].notna() &
         (df['transaction_type'].isin(['invoice', 'creditnote']))
-    ].copy()
+    ]
+
+    starts = lines['period_start'].to_numpy(dtype='datetime64[ns]')
+    ends = lines['period_end'].to_numpy(dtype='datetime64[ns]')
 
-    total_mrr = active_lines['line_mrr'].sum()
-    line_count = len(active_lines)
+    # First month starting on/after period_start, last month starting on/before period_end
+    first_month = starts.astype('datetime64[M]')
+    first_month = first_month + (first_month.astype('datetime64[ns]') < starts).astype(int)
+    last_month = ends.astype('datetime64[M]')
+
+    # Only expand the months we report on
+    first_month = np.maximum(first_month, months_to_check.min().to_datetime64().astype('datetime64[M]'))
+    last_month = np.minimum(last_month, months_to_check.max().to_datetime64().astype('datetime64[M]'))
+
+    lengths = np.maximum((last_month - first_month).astype(int) + 1, 0)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    active = pd.DataFrame({
+        'month': (np.repeat(first_month, lengths) + offsets).astype('datetime64[ns]'),
+        'transaction_type': np.repeat(lines['transaction_type'].to_numpy(), lengths),
+        'line_mrr': np.repeat(lines['line_mrr'].to_numpy(), lengths),
+    })
+
+    by_month = active.groupby(['month', 'transaction_type']).agg(
+        mrr=('line_mrr', 'sum'),
+        lines=('line_mrr', 'size')
+    ).unstack('transaction_type', fill_value=0).reindex(months_to_check, fill_value=0)
 
     # Separate counts for visibility
-    invoice_count = len(active_lines[active_lines['transaction_type'] == 'invoice'])
-    creditnote_count = len(active_lines[active_lines['transaction_type'] == 'creditnote'])
-
-    return total_mrr, line_count, invoice_count, creditnote_count
-
-# Calculate MRR for recent months
-months_to_check = pd.date_range(start='2024-01-01', end='2025-10-01', freq='MS')
-mrr_by_month = []
-
-print("\nCalculating invoice-based MRR by month (including credit notes)...")
-for month in months_to_check:
-    month_str = month.strftime('%Y-%m')
-    mrr, count, inv_count, cn_count = calculate_monthly_mrr(df_combined, month_str)
-    mrr_by_month.append({
-        'month': month_str,
-        'invoice_mrr': mrr,
-        'active_lines': count,
-        'invoice_lines': inv_count,
-        'creditnote_lines': cn_count
+    line_counts = by_month['lines'].reindex(columns=['invoice', 'creditnote'], fill_value=0)
+
+    return pd.DataFrame({
+        'month': months_to_check.strftime('%Y-%m'),
+        'invoice_mrr': by_month['mrr'].sum(axis=1).to_numpy(),
+        'active_lines': line_counts.sum(axis=1).to_numpy(),
+        'invoice_lines': line_counts['invoice'].to_numpy(),
+        'creditnote_lines': line_counts['creditnote'].to_numpy()
     })
-    if month.year == 2024 and month.month <= 3:  # Show first few months
-        print(f"  {month_str}: {mrr:,.0f} NOK ({count} total: {inv_count} inv, {cn_count} cn)")
-    elif month.year == 2025:  # Show 2025
-        print(f"  {month_str}: {mrr:,.0f} NOK ({count} total: {inv_count} inv, {cn_count} cn)")
-
-mrr_df = pd.DataFrame(mrr_by_month)
-
-print(f"\n{'='*100}")
-print(f"INVOICE-BASED MRR SUMMARY")
-print(f"{'='*100}")
-print(mrr_df.tail(12))
-
-# Summary statistics
-print(f"\nMRR Statistics:")
-print(f"  Average MRR (2024): {mrr_df[mrr_df['month'].str.startswith('2024')]['invoice_mrr'].mean():,.0f} NOK")
-print(f"  Latest MRR (Oct 2025): {mrr_df[mrr_df['month'] == '2025-10']['invoice_mrr'].values[0]:,.0f} NOK")
-print(f"  Min MRR: {mrr_df['invoice_mrr'].min():,.0f} NOK")
-print(f"  Max MRR: {mrr_df['invoice_mrr'].max():,.0f} NOK")
-
-# Save results
-output_file = 'invoice_mrr_analysis.csv'
-mrr_df.to_csv(output_file, index=False)
-print(f"\nResults saved to: {output_file}")
-
-print(f"\n{'='*100}")
-print(f"KEY FINDINGS")
-print(f"{'='*100}")
-print(f"1. We have {len(df_combined)} invoice lines covering {df_combined['transaction_date'].min()} to {df_combined['transaction_date'].max()}")
-print(f"2. {100*inferred/len(df_combined):.1f}% of lines have period information extracted")
-print(f"3. Invoice-based MRR can now be calculated month-by-month based on active periods")
-print(f"4. This can be compared with subscription-based MRR from the database")
-print(f"\nNext steps:")
-print(f"  - Compare invoice-based MRR with subscription-based MRR from database")
-print(f"  - Identify which customers/products cause the difference")
-print(f"  - Investigate missing period information")
+
+def main():
+    print("=" * 100)
+    print("COMPREHENSIVE INVOICE MRR ANALYSIS")
+    print("Comparing Invoice-based MRR vs Subscription-based MRR")
+    print("=" * 100)
+
+    # Parse the exports in parallel - XLSX parsing is CPU-bound, one process per file
+    with ProcessPoolExecutor(max_workers=len(files)) as executor:
+        frames = list(executor.map(_read_one, files.keys(), files.values()))
+    all_data = [df for df in frames if df is not None]
+
+    # Combine all data
+    df_combined = pd.concat(all_data, ignore_index=True)
+
+    print(f"\n{'='*100}")
+    print(f"COMBINED DATA SUMMARY")
+    print(f"{'='*100}")
+    print(f"Total rows: {len(df_combined)}")
+    print(f"Date range: {df_combined['transaction_date'].min()} to {df_combined['transaction_date'].max()}")
+
+    # Convert transaction_date to datetime - Zoho exports dates as YYYY-MM-DD; a fixed format
+    # skips per-value format inference and cache=True parses each distinct date only once
+    df_combined['transaction_date'] = pd.to_datetime(df_combined['transaction_date'], format='%Y-%m-%d', errors='coerce', cache=True)
+
+    print(f"\nTransaction types: {df_combined['transaction_type'].value_counts().to_dict()}")
+    print(f"Statuses: {df_combined['status'].value_counts().to_dict()}")
+
+    # Financial summary
+    print(f"\n{'='*100}")
+    print(f"TOTAL FINANCIAL SUMMARY (All Time)")
+    print(f"{'='*100}")
+    print(f"Total invoiced (excl VAT): {df_combined['bcy_total'].sum():,.2f} NOK")
+    print(f"Total invoiced (incl VAT): {df_combined['bcy_total_with_tax'].sum():,.2f} NOK")
+    print(f"Total VAT: {df_combined['bcy_tax_amount'].sum():,.2f} NOK")
+
+    # Separate invoices and credit notes
+    invoices = df_combined[df_combined['transaction_type'] == 'invoice'].copy()
+    creditnotes = df_combined[df_combined['transaction_type'] == 'creditnote'].copy()
+
+    print(f"\nInvoices: {len(invoices)} lines, {invoices['bcy_total'].sum():,.2f} NOK (excl VAT)")
+    print(f"Credit notes: {len(creditnotes)} lines, {creditnotes['bcy_total'].sum():,.2f} NOK (excl VAT)")
+    print(f"Net: {(invoices['bcy_total'].sum() + creditnotes['bcy_total'].sum()):,.2f} NOK")
+
+    # Monthly breakdown
+    print(f"\n{'='*100}")
+    print(f"MONTHLY BREAKDOWN (Invoice Date)")
+    print(f"{'='*100}")
+
+    df_combined['year_month'] = df_combined['transaction_date'].dt.to_period('M')
+    # One groupby, then unstack transaction_type into columns ('total', 'invoice'), ('n', 'creditnote'), ...
+    monthly_pivot = df_combined.groupby(['year_month', 'transaction_type']).agg(
+        total=('bcy_total', 'sum'),
+        n=('transaction_id', 'count')
+    ).unstack('transaction_type', fill_value=0)
+
+    print("\nMonthly invoice amounts (excl VAT):")
+    print(monthly_pivot.head(20))
+
+    # Now, let's try to calculate MRR from these invoices
+    # This is tricky because we need to extract period information
+    print(f"\n{'='*100}")
+    print(f"ANALYZING INVOICE DESCRIPTIONS FOR PERIODS")
+    print(f"{'='*100}")
+
+    # Look at item descriptions to understand period structure
+    sample_descriptions = df_combined[['item_name', 'description', 'product_name']].drop_duplicates().head(50)
+    print("\nSample item descriptions:")
+    print(sample_descriptions.to_string())
+
+    print("\nExtracting periods from descriptions...")
+    period_info = extract_period_months(df_combined['description'])
+    # Assign the columns in place rather than concat, which would copy the whole frame
+    for col in period_info.columns:
+        df_combined[col] = period_info[col]
+
+    # Check how many we extracted
+    extracted = df_combined['period_months'].notna().sum()
+    print(f"Successfully extracted period info from {extracted} / {len(df_combined)} rows ({100*extracted/len(df_combined):.1f}%)")
+
+    df_combined['period_months_inferred'] = np.where(
+        df_combined['period_months'].notna(),
+        df_combined['period_months'],
+        infer_period_from_name(df_combined['item_name'])
+    )
+    inferred = df_combined['period_months_inferred'].notna().sum()
+    print(f"After inference: {inferred} / {len(df_combined)} rows have period info ({100*inferred/len(df_combined):.1f}%)")
+
+    print("\nCalculating period dates for inferred periods...")
+    df_combined['period_start'], df_combined['period_end'] = calculate_period_dates(df_combined)
+
+    # Check how many now have dates
+    with_dates = df_combined['period_start'].notna().sum()
+    print(f"After calculation: {with_dates} / {len(df_combined)} rows have period dates ({100*with_dates/len(df_combined):.1f}%)")
+
+    df_combined['line_mrr'] = calculate_line_mrr(df_combined)
+
+    print(f"\n{'='*100}")
+    print(f"INVOICE-BASED MRR CALCULATION")
+    print(f"{'='*100}")
+
+    # Calculate MRR for recent months
+    months_to_check = pd.date_range(start='2024-01-01', end='2025-10-01', freq='MS')
+
+    print("\nCalculating invoice-based MRR by month (including credit notes)...")
+    mrr_df = calculate_monthly_mrr(df_combined, months_to_check)
+
+    for month, row in zip(months_to_check, mrr_df.itertuples(index=False)):
+        if (month.year == 2024 and month.month <= 3) or month.year == 2025:  # Show first few months and 2025
+            print(f"  {row.month}: {row.invoice_mrr:,.0f} NOK ({row.active_lines} total: {row.invoice_lines} inv, {row.creditnote_lines} cn)")
+
+    print(f"\n{'='*100}")
+    print(f"INVOICE-BASED MRR SUMMARY")
+    print(f"{'='*100}")
+    print(mrr_df.tail(12))
+
+    # Summary statistics
+    print(f"\nMRR Statistics:")
+    print(f"  Average MRR (2024): {mrr_df[mrr_df['month'].str.startswith('2024')]['invoice_mrr'].mean():,.0f} NOK")
+    print(f"  Latest MRR (Oct 2025): {mrr_df[mrr_df['month'] == '2025-10']['invoice_mrr'].values[0]:,.0f} NOK")
+    print(f"  Min MRR: {mrr_df['invoice_mrr'].min():,.0f} NOK")
+    print(f"  Max MRR: {mrr_df['invoice_mrr'].max():,.0f} NOK")
+
+    # Save results
+    output_file = 'invoice_mrr_analysis.csv'
+    mrr_df.to_csv(output_file, index=False)
+    print(f"\nResults saved to: {output_file}")
+
+    print(f"\n{'='*100}")
+    print(f"KEY FINDINGS")
+    print(f"{'='*100}")
+    print(f"1. We have {len(df_combined)} invoice lines covering {df_combined['transaction_date'].min()} to {df_combined['transaction_date'].max()}")
+    print(f"2. {100*inferred/len(df_combined):.1f}% of lines have period information extracted")
+    print(f"3. Invoice-based MRR can now be calculated month-by-month based on active periods")
+    print(f"4. This can be compared with subscription-based MRR from the database")
+    print(f"\nNext steps:")
+    print(f"  - Compare invoice-based MRR with subscription-based MRR from database")
+    print(f"  - Identify which customers/products cause the difference")
+    print(f"  - Investigate missing period information")
+
+if __name__ == "__main__":
+    main()
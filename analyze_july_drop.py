@@ -3,9 +3,9 @@ Analyze the significant MRR drop from July to August 2025
 """
 
 import asyncio
+import pandas as pd
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from sqlalchemy import select
+from sqlalchemy import select, func, except_
 from database import AsyncSessionLocal
 from models.accounting import AccountingReceivableItem
 from services.accounting import AccountingService
@@ -18,58 +18,61 @@ async def analyze_july_drop():
         july_end = datetime(2025, 7, 31, 23, 59, 59)
         august_end = datetime(2025, 8, 31, 23, 59, 59)
 
-        # Get items active in July
-        stmt_july = select(AccountingReceivableItem).where(
-            AccountingReceivableItem.period_start_date <= july_end,
-            AccountingReceivableItem.period_end_date >= july_end
-        )
-        result = await session.execute(stmt_july)
-        july_items = result.scalars().all()
-
-        # Get items active in August
-        stmt_august = select(AccountingReceivableItem).where(
-            AccountingReceivableItem.period_start_date <= august_end,
-            AccountingReceivableItem.period_end_date >= august_end
-        )
-        result = await session.execute(stmt_august)
-        august_items = result.scalars().all()
-
-        # Categorize items
-        july_mrr_items = []
-        august_mrr_items = []
-
-        for item in july_items:
-            category = service.categorize_item(item.item_name)
-            if service.is_recurring_category(category) and item.mrr_per_month:
-                july_mrr_items.append({
-                    'item': item,
-                    'category': category,
-                    'mrr': item.mrr_per_month
-                })
-
-        for item in august_items:
-            category = service.categorize_item(item.item_name)
-            if service.is_recurring_category(category) and item.mrr_per_month:
-                august_mrr_items.append({
-                    'item': item,
-                    'category': category,
-                    'mrr': item.mrr_per_month
-                })
-
-        # Find items that were in July but not in August
-        july_ids = {item['item'].id for item in july_mrr_items}
-        august_ids = {item['item'].id for item in august_mrr_items}
-
-        disappeared_ids = july_ids - august_ids
-        new_ids = august_ids - july_ids
+        def active_ids(month_end):
+            """IDs of items with MRR that are active on month_end"""
+            return select(AccountingReceivableItem.id).where(
+                AccountingReceivableItem.period_start_date <= month_end,
+                AccountingReceivableItem.period_end_date >= month_end,
+                AccountingReceivableItem.mrr_per_month != 0
+            )
+
+        async def recurring_total(month_end):
+            """Total recurring MRR on month_end - summed in SQL, categorized per distinct item name"""
+            stmt = select(
+                AccountingReceivableItem.item_name,
+                func.sum(AccountingReceivableItem.mrr_per_month)
+            ).where(
+                AccountingReceivableItem.period_start_date <= month_end,
+                AccountingReceivableItem.period_end_date >= month_end,
+                AccountingReceivableItem.mrr_per_month != 0
+            ).group_by(AccountingReceivableItem.item_name)
+            result = await session.execute(stmt)
+            return sum(
+                mrr for item_name, mrr in result.all()
+                if service.is_recurring_category(service.categorize_item(item_name))
+            )
+
+        async def recurring_items(ids_stmt):
+            """Load the items for an ID set and keep only recurring categories"""
+            # Plain column rows instead of ORM objects - read-only analysis, no identity map needed
+            stmt = select(
+                AccountingReceivableItem.id,
+                AccountingReceivableItem.customer_name,
+                AccountingReceivableItem.item_name,
+                AccountingReceivableItem.mrr_per_month.label('mrr'),
+                AccountingReceivableItem.period_start_date,
+                AccountingReceivableItem.period_end_date,
+                AccountingReceivableItem.transaction_number,
+                AccountingReceivableItem.transaction_type
+            ).where(AccountingReceivableItem.id.in_(ids_stmt))
+            result = await session.stream(stmt)
+            df = pd.DataFrame([tuple(row) async for row in result], columns=list(result.keys()))
+
+            df['category'] = df['item_name'].map(service.categorize_item)
+            is_recurring = df['category'].map(service.is_recurring_category).astype(bool)
+            return df[is_recurring].sort_values('mrr', key=abs, ascending=False, kind='stable')
+
+        # Items active in July but not in August (and vice versa) - set difference done in SQL
+        disappeared_items = await recurring_items(except_(active_ids(july_end), active_ids(august_end)))
+        new_items = await recurring_items(except_(active_ids(august_end), active_ids(july_end)))
 
         print("\n" + "="*80)
         print("ANALYSE: MRR NEDGANG FRA JULI TIL AUGUST 2025")
         print("="*80)
 
         # Calculate totals
-        july_total = sum(item['mrr'] for item in july_mrr_items)
-        august_total = sum(item['mrr'] for item in august_mrr_items)
+        july_total = await recurring_total(july_end)
+        august_total = await recurring_total(august_end)
 
         print(f"\nJuli MRR: {july_total:,.2f} kr")
         print(f"August MRR: {august_total:,.2f} kr")
@@ -77,54 +80,45 @@ async def analyze_july_drop():
 
         # Items that disappeared
         print(f"\n\n{'='*80}")
-        print(f"ITEMS SOM FORSVANT (var i juli, ikke i august): {len(disappeared_ids)}")
+        print(f"ITEMS SOM FORSVANT (var i juli, ikke i august): {len(disappeared_items)}")
         print(f"{'='*80}\n")
 
-        disappeared_items = [item for item in july_mrr_items if item['item'].id in disappeared_ids]
-        disappeared_items.sort(key=lambda x: abs(x['mrr']), reverse=True)
-
-        total_disappeared = sum(item['mrr'] for item in disappeared_items)
+        total_disappeared = disappeared_items['mrr'].sum()
         print(f"Total MRR som forsvant: {total_disappeared:,.2f} kr\n")
 
-        # Group by customer
-        by_customer = {}
-        for item in disappeared_items:
-            customer = item['item'].customer_name
-            if customer not in by_customer:
-                by_customer[customer] = []
-            by_customer[customer].append(item)
-
-        # Sort customers by total MRR impact
-        sorted_customers = sorted(by_customer.items(), key=lambda x: sum(i['mrr'] for i in x[1]), reverse=True)
+        # Group by customer - items within each customer stay sorted by MRR impact
+        by_customer = disappeared_items.groupby('customer_name', sort=False, dropna=False).agg(
+            total_mrr=('mrr', 'sum'),
+            n=('mrr', 'size')
+        )
+        top_items = disappeared_items.groupby('customer_name', sort=False, dropna=False).head(5)
 
         print("TOP 20 KUNDER MED ITEMS SOM FORSVANT:\n")
-        for i, (customer, items) in enumerate(sorted_customers[:20], 1):
-            customer_mrr = sum(item['mrr'] for item in items)
-            print(f"{i}. {customer}: {customer_mrr:,.2f} kr ({len(items)} items)")
-            for item in items[:5]:  # Show max 5 items per customer
-                print(f"   - {item['item'].item_name}: {item['mrr']:,.2f} kr")
-                print(f"     Periode: {item['item'].period_start_date.strftime('%d.%m.%Y')} - {item['item'].period_end_date.strftime('%d.%m.%Y')}")
-                print(f"     Transaction: {item['item'].transaction_number} ({item['item'].transaction_type})")
-            if len(items) > 5:
-                print(f"   ... og {len(items) - 5} flere items")
+        for i, (customer, row) in enumerate(by_customer.nlargest(20, 'total_mrr').iterrows(), 1):
+            print(f"{i}. {customer}: {row['total_mrr']:,.2f} kr ({int(row['n'])} items)")
+            # Lines without a customer name form their own (NaN) group, which == never matches
+            is_customer = top_items['customer_name'].isna() if pd.isna(customer) else top_items['customer_name'] == customer
+            for item in top_items[is_customer].itertuples(index=False):  # Show max 5 items per customer
+                print(f"   - {item.item_name}: {item.mrr:,.2f} kr")
+                print(f"     Periode: {item.period_start_date.strftime('%d.%m.%Y')} - {item.period_end_date.strftime('%d.%m.%Y')}")
+                print(f"     Transaction: {item.transaction_number} ({item.transaction_type})")
+            if row['n'] > 5:
+                print(f"   ... og {int(row['n']) - 5} flere items")
             print()
 
         # New items in August
         print(f"\n{'='*80}")
-        print(f"NYE ITEMS (ikke i juli, men i august): {len(new_ids)}")
+        print(f"NYE ITEMS (ikke i juli, men i august): {len(new_items)}")
         print(f"{'='*80}\n")
 
-        new_items = [item for item in august_mrr_items if item['item'].id in new_ids]
-        new_items.sort(key=lambda x: abs(x['mrr']), reverse=True)
-
-        total_new = sum(item['mrr'] for item in new_items)
+        total_new = new_items['mrr'].sum()
         print(f"Total ny MRR: {total_new:,.2f} kr\n")
 
         print("TOP 10 NYE ITEMS:\n")
-        for i, item in enumerate(new_items[:10], 1):
-            print(f"{i}. {item['item'].customer_name}: {item['mrr']:,.2f} kr")
-            print(f"   {item['item'].item_name}")
-            print(f"   Periode: {item['item'].period_start_date.strftime('%d.%m.%Y')} - {item['item'].period_end_date.strftime('%d.%m.%Y')}")
+        for i, item in enumerate(new_items.head(10).itertuples(index=False), 1):
+            print(f"{i}. {item.customer_name}: {item.mrr:,.2f} kr")
+            print(f"   {item.item_name}")
+            print(f"   Periode: {item.period_start_date.strftime('%d.%m.%Y')} - {item.period_end_date.strftime('%d.%m.%Y')}")
             print()
 
         # Category breakdown
@@ -132,14 +126,9 @@ async def analyze_july_drop():
         print("KATEGORIER SOM FORSVANT")
         print(f"{'='*80}\n")
 
-        by_category = {}
-        for item in disappeared_items:
-            cat = item['category']
-            if cat not in by_category:
-                by_category[cat] = 0
-            by_category[cat] += item['mrr']
+        by_category = disappeared_items.groupby('category', sort=False)['mrr'].sum()
 
-        for cat, mrr in sorted(by_category.items(), key=lambda x: abs(x[1]), reverse=True):
+        for cat, mrr in by_category.sort_values(key=abs, ascending=False, kind='stable').items():
             print(f"{cat}: {mrr:,.2f} kr")
 
 if __name__ == "__main__":
@@ -12,10 +12,8 @@ async def analyze():
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
     async with async_session() as session:
-        # Get all monthly snapshots
+        # Stream the monthly snapshots - table and consistency checks are done in one pass
         stmt = select(MonthlyMRRSnapshot).order_by(MonthlyMRRSnapshot.month)
-        result = await session.execute(stmt)
-        snapshots = result.scalars().all()
 
         print('=== MONTHLY MRR SNAPSHOT ANALYSE ===')
         print('')
@@ -31,7 +29,8 @@ async def analyze():
         print('-' * 120)
 
         previous_mrr = None
-        for snap in snapshots:
+        errors_by_month = []  # (month, [errors]) for the consistency report below
+        async for snap in await session.stream_scalars(stmt):
             # Calculate what MRR should be based on previous month + net change
             if previous_mrr is not None:
                 calculated_mrr = previous_mrr + snap.net_mrr
@@ -45,29 +44,12 @@ async def analyze():
             if abs(diff) > 100:  # More than 100 kr difference
                 warning = ' [!]'
 
-            # Check if net_mrr = new_mrr - churned_mrr
-            expected_net = snap.new_mrr - snap.churned_mrr
-            if abs(snap.net_mrr - expected_net) > 1:  # Allow 1 kr rounding
-                warning += ' [NET ERR]'
-
-            print(f'{snap.month:10s} {snap.mrr:>12,.0f} {snap.new_mrr:>12,.0f} {snap.churned_mrr:>12,.0f} {snap.net_mrr:>12,.0f} {calculated_mrr:>15,.0f} {diff:>12,.0f}{warning}')
-
-            previous_mrr = snap.mrr
-
-        print('-' * 120)
-        print('')
-        print('Sjekker for feil:')
-        print('')
-
-        # Check each snapshot for consistency
-        previous_mrr = None
-        errors_found = False
-        for snap in snapshots:
             errors = []
 
             # 1. Check if net_mrr = new_mrr - churned_mrr
             expected_net = snap.new_mrr - snap.churned_mrr
-            if abs(snap.net_mrr - expected_net) > 1:
+            if abs(snap.net_mrr - expected_net) > 1:  # Allow 1 kr rounding
+                warning += ' [NET ERR]'
                 errors.append(f'Net MRR feil: {snap.net_mrr:,.0f} burde vaere {expected_net:,.0f}')
 
             # 2. Check if MRR change matches net_mrr
@@ -77,14 +59,23 @@ async def analyze():
                     errors.append(f'MRR endring ({actual_change:,.0f}) matcher ikke Net MRR ({snap.net_mrr:,.0f})')
 
             if errors:
-                errors_found = True
-                print(f'{snap.month}:')
-                for error in errors:
-                    print(f'  [X] {error}')
+                errors_by_month.append((snap.month, errors))
+
+            print(f'{snap.month:10s} {snap.mrr:>12,.0f} {snap.new_mrr:>12,.0f} {snap.churned_mrr:>12,.0f} {snap.net_mrr:>12,.0f} {calculated_mrr:>15,.0f} {diff:>12,.0f}{warning}')
 
             previous_mrr = snap.mrr
 
-        if not errors_found:
+        print('-' * 120)
+        print('')
+        print('Sjekker for feil:')
+        print('')
+
+        for month, errors in errors_by_month:
+            print(f'{month}:')
+            for error in errors:
+                print(f'  [X] {error}')
+
+        if not errors_by_month:
             print('[OK] Ingen feil funnet i datasettene!')
 
         print('')
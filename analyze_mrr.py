@@ -4,43 +4,40 @@ from datetime import datetime
 conn = sqlite3.connect('data/app.db')
 cursor = conn.cursor()
 
-# Get all live subscriptions
-cursor.execute('''
-    SELECT id, customer_name, amount, interval, interval_unit, currency_code
+# Monthly MRR from subscription amount, normalized in SQL
+MRR_SQL = '''
+    CASE
+        WHEN interval = "months" THEN amount * 1.0 / interval_unit
+        WHEN interval = "years" THEN amount * 1.0 / (interval_unit * 12)
+        ELSE amount
+    END
+'''
+
+# Get the live subscriptions with the highest MRR
+cursor.execute(f'''
+    SELECT customer_name, amount, interval, interval_unit, currency_code, {MRR_SQL} AS mrr
     FROM subscriptions
     WHERE status = "live"
-    ORDER BY amount DESC
+    ORDER BY mrr DESC
     LIMIT 20
 ''')
 
 print("Top 20 highest MRR subscriptions:")
 print("=" * 100)
 
-def normalize_to_mrr(amount, interval, interval_unit):
-    """Calculate monthly MRR from subscription amount"""
-    if interval == "months":
-        return amount / interval_unit
-    elif interval == "years":
-        return amount / (interval_unit * 12)
-    else:
-        return amount
-
-total_mrr = 0
-for row in cursor.fetchall():
-    sub_id, name, amount, interval, interval_unit, currency = row
-    mrr = normalize_to_mrr(amount, interval, interval_unit)
-    total_mrr += mrr
+for name, amount, interval, interval_unit, currency, mrr in cursor.fetchall():
     print(f"{name[:40]:40} | {amount:10.2f} {currency} | {interval:8} {interval_unit} | MRR: {mrr:10.2f}")
 
 print("=" * 100)
 
 # Get total statistics
-cursor.execute('''
+cursor.execute(f'''
     SELECT
         COUNT(*) as count,
         interval,
         interval_unit,
-        SUM(amount) as total_amount
+        SUM(amount) as total_amount,
+        SUM({MRR_SQL}) as group_mrr
     FROM subscriptions
     WHERE status = "live"
     GROUP BY interval, interval_unit
@@ -51,10 +48,7 @@ print("\nBreakdown by billing interval:")
 print("-" * 80)
 grand_total_mrr = 0
 
-for row in cursor.fetchall():
-    count, interval, interval_unit, total_amount = row
-    # Calculate total MRR for this group
-    group_mrr = normalize_to_mrr(total_amount, interval, interval_unit)
+for count, interval, interval_unit, total_amount, group_mrr in cursor.fetchall():
     grand_total_mrr += group_mrr
     print(f"{interval:10} every {interval_unit:2} | Count: {count:4} | Total: {total_amount:12,.2f} | MRR: {group_mrr:12,.2f}")
 
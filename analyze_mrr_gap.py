@@ -3,12 +3,134 @@ Detailed MRR Gap Analysis - Compare subscription-based vs invoice-based MRR
 """
 
 import asyncio
+import sys
+import pandas as pd
 from datetime import datetime
 from database import AsyncSessionLocal
 from models.invoice import Invoice, InvoiceLineItem
 from models.subscription import Subscription
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, case, func, or_, exists, bindparam
+
+# Subscription MRR excl. VAT, computed in SQL. `interval` holds the unit
+# ("months"/"years"); yearly plans are spread over 12 months
+SUB_MRR = case(
+    (func.lower(Subscription.interval) == 'years', func.coalesce(Subscription.amount, 0) / 1.25 / 12),
+    else_=func.coalesce(Subscription.amount, 0) / 1.25
+)
+
+
+# Statements are built once at import; the month and statuses are bound per execution
+ACTIVE_STATUSES = ['live', 'non_renewing']
+IS_ACTIVE = Subscription.status.in_(bindparam('statuses', expanding=True))
+
+# Invoice lines whose period overlaps the month
+IN_MONTH = (
+    InvoiceLineItem.period_start_date <= bindparam('month_end'),
+    InvoiceLineItem.period_end_date >= bindparam('month_start')
+)
+
+# MRR per customer is summed by the database
+SUB_MRR_BY_CUSTOMER_STMT = (
+    select(Subscription.customer_name, func.sum(SUB_MRR))
+    .where(IS_ACTIVE)
+    .group_by(Subscription.customer_name)
+)
+
+# Per-subscription rows (MRR already computed)
+SUB_ROWS_STMT = select(
+    Subscription.id,
+    Subscription.customer_name,
+    SUB_MRR.label('mrr'),
+    Subscription.plan_name,
+    Subscription.vessel_name,
+    Subscription.call_sign,
+    Subscription.vessel_key,
+    Subscription.call_sign_key
+).where(IS_ACTIVE)
+
+INV_MRR_BY_CUSTOMER_STMT = (
+    select(
+        Invoice.customer_name,
+        func.coalesce(func.sum(InvoiceLineItem.mrr_per_month), 0),
+        func.count(InvoiceLineItem.id)
+    )
+    .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)
+    .where(*IN_MONTH)
+    .group_by(Invoice.customer_name)
+)
+
+
+def _tier_match_stmt():
+    """
+    (sub_id, tier) for every active subscription matched by an invoice line in the month
+
+    All three tiers are resolved by the database in one query. A subscription
+    gets the first tier that matches any active invoice line:
+      1. subscription_id
+      2. call sign + customer name
+      3. vessel + customer name
+    """
+    sub_keys = select(
+        Subscription.id,
+        Subscription.customer_name,
+        Subscription.call_sign_key,
+        Subscription.vessel_key
+    ).where(IS_ACTIVE).cte('sub_keys')
+
+    line_keys = select(
+        InvoiceLineItem.subscription_id,
+        Invoice.customer_name,
+        InvoiceLineItem.call_sign_key,
+        InvoiceLineItem.vessel_key
+    ).join(Invoice, InvoiceLineItem.invoice_id == Invoice.id).where(*IN_MONTH).cte('line_keys')
+
+    by_sub_id = exists().where(line_keys.c.subscription_id == sub_keys.c.id)
+    by_call_sign = exists().where(
+        line_keys.c.call_sign_key == sub_keys.c.call_sign_key,
+        line_keys.c.customer_name == sub_keys.c.customer_name
+    )
+    by_vessel = exists().where(
+        line_keys.c.vessel_key == sub_keys.c.vessel_key,
+        line_keys.c.customer_name == sub_keys.c.customer_name
+    )
+
+    return (
+        select(sub_keys.c.id, case((by_sub_id, 1), (by_call_sign, 2), else_=3))
+        .where(or_(by_sub_id, by_call_sign, by_vessel))
+    )
+
+
+TIER_MATCH_STMT = _tier_match_stmt()
+
+
+async def fetch_subscriptions():
+    """Subscription MRR per customer, plus per-subscription rows for the matching report"""
+    params = {'statuses': ACTIVE_STATUSES}
+    async with AsyncSessionLocal() as session:
+        sub_customer_result = await session.execute(SUB_MRR_BY_CUSTOMER_STMT, params)
+        sub_result = await session.execute(SUB_ROWS_STMT, params)
+
+        return dict(sub_customer_result.all()), pd.DataFrame(sub_result.all(), columns=list(sub_result.keys()))
+
+
+async def fetch_invoice_mrr(month_start, month_end):
+    """(customer_name, MRR, line count) for invoice lines active in the month, summed by the database"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            INV_MRR_BY_CUSTOMER_STMT,
+            {'month_start': month_start, 'month_end': month_end}
+        )
+        return result.all()
+
+
+async def fetch_tier_matches(month_start, month_end):
+    """(sub_id, tier) for every active subscription matched by an invoice line in the month"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            TIER_MATCH_STMT,
+            {'statuses': ACTIVE_STATUSES, 'month_start': month_start, 'month_end': month_end}
+        )
+        return result.all()
 
 
 async def analyze_gap():
@@ -21,244 +143,162 @@ async def analyze_gap():
     target_month_start = datetime(2025, 10, 1)
     target_month_end = datetime(2025, 10, 31)
 
-    async with AsyncSessionLocal() as session:
-        # [1] GET SUBSCRIPTIONS
-        print("\n[1] FETCHING SUBSCRIPTIONS")
-        print("-"*120)
-        sub_result = await session.execute(
-            select(Subscription).where(Subscription.status.in_(['live', 'non_renewing']))
+    # The three queries are independent - run them concurrently, each on its own session
+    (sub_mrr_by_customer, subs), inv_customer_rows, tier_matches = await asyncio.gather(
+        fetch_subscriptions(),
+        fetch_invoice_mrr(target_month_start, target_month_end),
+        fetch_tier_matches(target_month_start, target_month_end)
+    )
+
+    # [1] GET SUBSCRIPTIONS
+    print("\n[1] FETCHING SUBSCRIPTIONS")
+    print("-"*120)
+    total_sub_mrr = sum(sub_mrr_by_customer.values())
+
+    sub_mrr_by_sub_id = pd.DataFrame({
+        'customer': subs['customer_name'],
+        'mrr': subs['mrr'],
+        'plan': subs['plan_name'],
+        'vessel': subs['vessel_name'].fillna(''),
+        'call_sign': subs['call_sign'].fillna('')
+    }).set_axis(subs['id']).to_dict('index')
+
+    # Distinct call signs and vessel + customer pairs available for matching (keys are normalized on write)
+    has_vessel = subs['vessel_key'].notna()
+    vessel_customer_keys = pd.DataFrame({
+        'vessel': subs.loc[has_vessel, 'vessel_key'],
+        'customer': subs.loc[has_vessel, 'customer_name'].astype(str)
+    }).drop_duplicates()
+
+    print(f"  Subscriptions: {len(sub_mrr_by_sub_id)}")
+    print(f"  Total MRR: {total_sub_mrr:,.2f} NOK")
+    print(f"  Customers: {len(sub_mrr_by_customer)}")
+    print(f"  Subscriptions with call sign: {subs['call_sign_key'].nunique()}")
+    print(f"  Subscriptions with vessel: {len(vessel_customer_keys)}")
+
+    # [2] GET INVOICE LINE ITEMS
+    print("\n[2] FETCHING INVOICE LINE ITEMS")
+    print("-"*120)
+    inv_mrr_by_customer = {}
+    line_count = 0
+    for customer_name, mrr, lines in inv_customer_rows:
+        inv_mrr_by_customer[customer_name] = mrr
+        line_count += lines
+    total_inv_mrr = sum(inv_mrr_by_customer.values())
+
+    print(f"  Invoice line items: {line_count}")
+    print(f"  Total MRR: {total_inv_mrr:,.2f} NOK")
+    print(f"  Customers: {len(inv_mrr_by_customer)}")
+
+    # [3] CUSTOMER COMPARISON
+    print("\n[3] CUSTOMER COMPARISON")
+    print("-"*120)
+    # Key views support set operations directly; MRR is summed while filtering instead of re-looked up
+    all_customers = sub_mrr_by_customer.keys() | inv_mrr_by_customer.keys()
+    only_in_subs = sub_mrr_by_customer.keys() - inv_mrr_by_customer.keys()
+    only_in_invoices = inv_mrr_by_customer.keys() - sub_mrr_by_customer.keys()
+
+    only_subs_mrr = sum(v for c, v in sub_mrr_by_customer.items() if c not in inv_mrr_by_customer)
+    only_inv_mrr = sum(v for c, v in inv_mrr_by_customer.items() if c not in sub_mrr_by_customer)
+
+    print(f"  Total unique customers: {len(all_customers)}")
+    print(f"  Only in subscriptions: {len(only_in_subs)} ({only_subs_mrr:,.2f} NOK)")
+    print(f"  Only in invoices: {len(only_in_invoices)} ({only_inv_mrr:,.2f} NOK)")
+
+    # [4] TOP GAPS
+    print("\n[4] TOP 20 CUSTOMERS WITH LARGEST GAPS")
+    print("-"*120)
+    # Align both sides on customer and let pandas compute and sort the differences
+    merged = (pd.Series(sub_mrr_by_customer, dtype=float).to_frame('sub_mrr')
+              .join(pd.Series(inv_mrr_by_customer, dtype=float).to_frame('inv_mrr'), how='outer')
+              .fillna(0))
+    merged['diff'] = merged['inv_mrr'] - merged['sub_mrr']
+    gap_customers = merged[merged['diff'].abs() > 0.01]
+    gap_customers = gap_customers.sort_values('diff', key=abs, ascending=False, kind='stable')
+
+    print(f"{'Customer':<50} {'Sub MRR':>15} {'Inv MRR':>15} {'Diff':>15}")
+    print("-"*120)
+    # Table rows are formatted up front and written in one call
+    sys.stdout.writelines(
+        f"{row.Index:<50} {row.sub_mrr:>15,.2f} {row.inv_mrr:>15,.2f} {row.diff:>15,.2f}\n"
+        for row in gap_customers.head(20).itertuples()
+    )
+
+    # [5] MULTI-TIER MATCHING: SUBSCRIPTION ID, CALL SIGN, VESSEL
+    print("\n[5] MULTI-TIER MATCHING ANALYSIS")
+    print("-"*120)
+
+    # Track matched subscriptions
+    matched_by_sub_id = set()
+    matched_by_call_sign = set()
+    matched_by_vessel = set()
+
+    # Tiers were resolved in SQL (see fetch_tier_matches)
+    for sub_id, tier in tier_matches:
+        if tier == 1:
+            matched_by_sub_id.add(sub_id)
+        elif tier == 2:
+            matched_by_call_sign.add(sub_id)
+        else:
+            matched_by_vessel.add(sub_id)
+
+    # Calculate MRR for each tier
+    mrr_matched_sub_id = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_sub_id)
+    mrr_matched_call_sign = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_call_sign)
+    mrr_matched_vessel = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_vessel)
+
+    # Unmatched subscriptions
+    all_matched = matched_by_sub_id | matched_by_call_sign | matched_by_vessel
+    unmatched_subs = []
+    for sub_id, sub_info in sub_mrr_by_sub_id.items():
+        if sub_id not in all_matched:
+            unmatched_subs.append({
+                'sub_id': sub_id,
+                'customer': sub_info['customer'],
+                'mrr': sub_info['mrr'],
+                'plan': sub_info['plan'],
+                'vessel': sub_info['vessel'],
+                'call_sign': sub_info['call_sign']
+            })
+
+    unmatched_subs.sort(key=lambda x: x['mrr'], reverse=True)
+    mrr_unmatched = sum(s['mrr'] for s in unmatched_subs)
+
+    print(f"  Matching Results:")
+    print(f"    Tier 1 - By Subscription ID: {len(matched_by_sub_id):4d} ({mrr_matched_sub_id:12,.2f} NOK)")
+    print(f"    Tier 2 - By Call Sign:       {len(matched_by_call_sign):4d} ({mrr_matched_call_sign:12,.2f} NOK)")
+    print(f"    Tier 3 - By Vessel+Customer: {len(matched_by_vessel):4d} ({mrr_matched_vessel:12,.2f} NOK)")
+    print(f"    {'-'*70}")
+    print(f"    Total Matched:                {len(all_matched):4d} ({mrr_matched_sub_id + mrr_matched_call_sign + mrr_matched_vessel:12,.2f} NOK)")
+    print(f"    Still Unmatched:              {len(unmatched_subs):4d} ({mrr_unmatched:12,.2f} NOK)")
+
+    if unmatched_subs[:20]:
+        print(f"\n  TOP 20 UNMATCHED SUBSCRIPTIONS:")
+        print(f"  {'Customer':<35} {'Plan':<30} {'Vessel':<15} {'Call Sign':<10} {'MRR':>12}")
+        print(f"  {'-'*110}")
+        sys.stdout.writelines(
+            f"  {item['customer']:<35} {item['plan']:<30} {item['vessel']:<15} {item['call_sign']:<10} {item['mrr']:>12,.2f}\n"
+            for item in unmatched_subs[:20]
         )
-        subscriptions = sub_result.scalars().all()
-
-        sub_mrr_by_customer = {}
-        sub_mrr_by_sub_id = {}
-        sub_by_call_sign = {}  # NEW: Index by call sign
-        sub_by_vessel_customer = {}  # NEW: Index by vessel + customer
-        total_sub_mrr = 0
-
-        for sub in subscriptions:
-            amount = float(sub.amount or 0)
-            interval_unit = str(sub.interval_unit or 'months').lower()
-            interval_val = sub.interval
-
-            if isinstance(interval_val, str):
-                if interval_val.lower() in ['years', 'months']:
-                    interval_unit = interval_val.lower()
-                    interval = 1
-                else:
-                    try:
-                        interval = int(interval_val)
-                    except:
-                        interval = 1
-            else:
-                interval = int(interval_val or 1)
-
-            if interval_unit == 'years':
-                mrr = (amount / 1.25) / 12
-            elif interval_unit == 'months':
-                mrr = (amount / 1.25) / interval
-            else:
-                mrr = amount / 1.25
-
-            customer_name = sub.customer_name
-            sub_id = sub.id
-
-            if customer_name not in sub_mrr_by_customer:
-                sub_mrr_by_customer[customer_name] = 0
-            sub_mrr_by_customer[customer_name] += mrr
-
-            sub_info = {
-                'customer': customer_name,
-                'mrr': mrr,
-                'plan': sub.plan_name,
-                'vessel': sub.vessel_name or '',
-                'call_sign': sub.call_sign or ''
-            }
-            sub_mrr_by_sub_id[sub_id] = sub_info
-
-            # NEW: Index by call sign (if exists)
-            if sub.call_sign:
-                call_sign_clean = sub.call_sign.strip().upper()
-                if call_sign_clean not in sub_by_call_sign:
-                    sub_by_call_sign[call_sign_clean] = []
-                sub_by_call_sign[call_sign_clean].append((sub_id, sub_info))
-
-            # NEW: Index by vessel + customer (if vessel exists)
-            if sub.vessel_name:
-                vessel_clean = sub.vessel_name.strip().upper()
-                vessel_customer_key = f"{vessel_clean}|{customer_name}"
-                if vessel_customer_key not in sub_by_vessel_customer:
-                    sub_by_vessel_customer[vessel_customer_key] = []
-                sub_by_vessel_customer[vessel_customer_key].append((sub_id, sub_info))
-
-            total_sub_mrr += mrr
-
-        print(f"  Subscriptions: {len(subscriptions)}")
-        print(f"  Total MRR: {total_sub_mrr:,.2f} NOK")
-        print(f"  Customers: {len(sub_mrr_by_customer)}")
-        print(f"  Subscriptions with call sign: {len(sub_by_call_sign)}")
-        print(f"  Subscriptions with vessel: {len(sub_by_vessel_customer)}")
-
-        # [2] GET INVOICE LINE ITEMS
-        print("\n[2] FETCHING INVOICE LINE ITEMS")
-        print("-"*120)
-        inv_result = await session.execute(
-            select(InvoiceLineItem, Invoice)
-            .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)
-            .where(
-                InvoiceLineItem.period_start_date <= target_month_end,
-                InvoiceLineItem.period_end_date >= target_month_start
-            )
-        )
-        invoice_rows = inv_result.all()
-
-        inv_mrr_by_customer = {}
-        inv_mrr_by_sub_id = {}
-        total_inv_mrr = 0
-
-        for line_item, invoice in invoice_rows:
-            mrr = line_item.mrr_per_month or 0
-            customer_name = invoice.customer_name
-            sub_id = line_item.subscription_id
-
-            if customer_name not in inv_mrr_by_customer:
-                inv_mrr_by_customer[customer_name] = 0
-            inv_mrr_by_customer[customer_name] += mrr
-
-            if sub_id:
-                if sub_id not in inv_mrr_by_sub_id:
-                    inv_mrr_by_sub_id[sub_id] = 0
-                inv_mrr_by_sub_id[sub_id] += mrr
-
-            total_inv_mrr += mrr
-
-        print(f"  Invoice line items: {len(invoice_rows)}")
-        print(f"  Total MRR: {total_inv_mrr:,.2f} NOK")
-        print(f"  Customers: {len(inv_mrr_by_customer)}")
-
-        # [3] CUSTOMER COMPARISON
-        print("\n[3] CUSTOMER COMPARISON")
-        print("-"*120)
-        all_customers = set(sub_mrr_by_customer.keys()) | set(inv_mrr_by_customer.keys())
-        only_in_subs = set(sub_mrr_by_customer.keys()) - set(inv_mrr_by_customer.keys())
-        only_in_invoices = set(inv_mrr_by_customer.keys()) - set(sub_mrr_by_customer.keys())
-
-        only_subs_mrr = sum(sub_mrr_by_customer.get(c, 0) for c in only_in_subs)
-        only_inv_mrr = sum(inv_mrr_by_customer.get(c, 0) for c in only_in_invoices)
-
-        print(f"  Total unique customers: {len(all_customers)}")
-        print(f"  Only in subscriptions: {len(only_in_subs)} ({only_subs_mrr:,.2f} NOK)")
-        print(f"  Only in invoices: {len(only_in_invoices)} ({only_inv_mrr:,.2f} NOK)")
-
-        # [4] TOP GAPS
-        print("\n[4] TOP 20 CUSTOMERS WITH LARGEST GAPS")
-        print("-"*120)
-        gap_customers = []
-        for customer in all_customers:
-            sub_mrr = sub_mrr_by_customer.get(customer, 0)
-            inv_mrr = inv_mrr_by_customer.get(customer, 0)
-            diff = inv_mrr - sub_mrr
-            if abs(diff) > 0.01:
-                gap_customers.append({'customer': customer, 'sub_mrr': sub_mrr, 'inv_mrr': inv_mrr, 'diff': diff})
-
-        gap_customers.sort(key=lambda x: abs(x['diff']), reverse=True)
-
-        print(f"{'Customer':<50} {'Sub MRR':>15} {'Inv MRR':>15} {'Diff':>15}")
-        print("-"*120)
-        for item in gap_customers[:20]:
-            print(f"{item['customer']:<50} {item['sub_mrr']:>15,.2f} {item['inv_mrr']:>15,.2f} {item['diff']:>15,.2f}")
-
-        # [5] MULTI-TIER MATCHING: SUBSCRIPTION ID, CALL SIGN, VESSEL
-        print("\n[5] MULTI-TIER MATCHING ANALYSIS")
-        print("-"*120)
-
-        # Track matched subscriptions
-        matched_by_sub_id = set()
-        matched_by_call_sign = set()
-        matched_by_vessel = set()
-
-        # Tier 1: Match by subscription_id
-        for sub_id in inv_mrr_by_sub_id.keys():
-            if sub_id in sub_mrr_by_sub_id:
-                matched_by_sub_id.add(sub_id)
-
-        # Tier 2: Match by call sign (for unmatched subscriptions)
-        for line_item, invoice in invoice_rows:
-            if line_item.call_sign:
-                call_sign_clean = line_item.call_sign.strip().upper()
-                if call_sign_clean in sub_by_call_sign:
-                    # Found matching call sign in subscriptions
-                    for sub_id, sub_info in sub_by_call_sign[call_sign_clean]:
-                        if sub_id not in matched_by_sub_id:  # Only if not already matched
-                            # Verify customer name also matches
-                            if invoice.customer_name == sub_info['customer']:
-                                matched_by_call_sign.add(sub_id)
-
-        # Tier 3: Match by vessel + customer (for still unmatched)
-        for line_item, invoice in invoice_rows:
-            if line_item.vessel_name:
-                vessel_clean = line_item.vessel_name.strip().upper()
-                vessel_customer_key = f"{vessel_clean}|{invoice.customer_name}"
-                if vessel_customer_key in sub_by_vessel_customer:
-                    for sub_id, sub_info in sub_by_vessel_customer[vessel_customer_key]:
-                        if sub_id not in matched_by_sub_id and sub_id not in matched_by_call_sign:
-                            matched_by_vessel.add(sub_id)
-
-        # Calculate MRR for each tier
-        mrr_matched_sub_id = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_sub_id)
-        mrr_matched_call_sign = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_call_sign)
-        mrr_matched_vessel = sum(sub_mrr_by_sub_id[sid]['mrr'] for sid in matched_by_vessel)
-
-        # Unmatched subscriptions
-        all_matched = matched_by_sub_id | matched_by_call_sign | matched_by_vessel
-        unmatched_subs = []
-        for sub_id, sub_info in sub_mrr_by_sub_id.items():
-            if sub_id not in all_matched:
-                unmatched_subs.append({
-                    'sub_id': sub_id,
-                    'customer': sub_info['customer'],
-                    'mrr': sub_info['mrr'],
-                    'plan': sub_info['plan'],
-                    'vessel': sub_info['vessel'],
-                    'call_sign': sub_info['call_sign']
-                })
-
-        unmatched_subs.sort(key=lambda x: x['mrr'], reverse=True)
-        mrr_unmatched = sum(s['mrr'] for s in unmatched_subs)
-
-        print(f"  Matching Results:")
-        print(f"    Tier 1 - By Subscription ID: {len(matched_by_sub_id):4d} ({mrr_matched_sub_id:12,.2f} NOK)")
-        print(f"    Tier 2 - By Call Sign:       {len(matched_by_call_sign):4d} ({mrr_matched_call_sign:12,.2f} NOK)")
-        print(f"    Tier 3 - By Vessel+Customer: {len(matched_by_vessel):4d} ({mrr_matched_vessel:12,.2f} NOK)")
-        print(f"    {'-'*70}")
-        print(f"    Total Matched:                {len(all_matched):4d} ({mrr_matched_sub_id + mrr_matched_call_sign + mrr_matched_vessel:12,.2f} NOK)")
-        print(f"    Still Unmatched:              {len(unmatched_subs):4d} ({mrr_unmatched:12,.2f} NOK)")
-
-        if unmatched_subs[:20]:
-            print(f"\n  TOP 20 UNMATCHED SUBSCRIPTIONS:")
-            print(f"  {'Customer':<35} {'Plan':<30} {'Vessel':<15} {'Call Sign':<10} {'MRR':>12}")
-            print(f"  {'-'*110}")
-            for item in unmatched_subs[:20]:
-                print(f"  {item['customer']:<35} {item['plan']:<30} {item['vessel']:<15} {item['call_sign']:<10} {item['mrr']:>12,.2f}")
-
-        # [6] SUMMARY
-        print("\n" + "="*120)
-        print("SUMMARY WITH MULTI-TIER MATCHING")
-        print("="*120)
-        print(f"Subscription-based MRR: {total_sub_mrr:,.2f} NOK")
-        print(f"Invoice-based MRR:     {total_inv_mrr:,.2f} NOK")
-        print(f"Total gap:             {total_inv_mrr - total_sub_mrr:,.2f} NOK ({((total_inv_mrr - total_sub_mrr) / total_sub_mrr * 100):.1f}%)")
-        print(f"\nMatching breakdown:")
-        print(f"  Matched by Subscription ID:  {len(matched_by_sub_id):4d} subs ({mrr_matched_sub_id:12,.2f} NOK)")
-        print(f"  Matched by Call Sign:        {len(matched_by_call_sign):4d} subs ({mrr_matched_call_sign:12,.2f} NOK)")
-        print(f"  Matched by Vessel+Customer:  {len(matched_by_vessel):4d} subs ({mrr_matched_vessel:12,.2f} NOK)")
-        print(f"  {'-'*80}")
-        print(f"  Total Matched:               {len(all_matched):4d} subs ({mrr_matched_sub_id + mrr_matched_call_sign + mrr_matched_vessel:12,.2f} NOK)")
-        print(f"  Still Unmatched:             {len(unmatched_subs):4d} subs ({mrr_unmatched:12,.2f} NOK)")
-        print(f"\nGap contributors:")
-        print(f"  1. Unmatched subscriptions: -{mrr_unmatched:,.2f} NOK ({len(unmatched_subs)} subs)")
-        print(f"  2. Customers only in invoices: +{only_inv_mrr:,.2f} NOK ({len(only_in_invoices)} customers)")
-        print(f"  3. Amount differences in matched: {(total_inv_mrr - total_sub_mrr) - (only_inv_mrr - mrr_unmatched):,.2f} NOK")
+
+    # [6] SUMMARY
+    print("\n" + "="*120)
+    print("SUMMARY WITH MULTI-TIER MATCHING")
+    print("="*120)
+    print(f"Subscription-based MRR: {total_sub_mrr:,.2f} NOK")
+    print(f"Invoice-based MRR:     {total_inv_mrr:,.2f} NOK")
+    print(f"Total gap:             {total_inv_mrr - total_sub_mrr:,.2f} NOK ({((total_inv_mrr - total_sub_mrr) / total_sub_mrr * 100):.1f}%)")
+    print(f"\nMatching breakdown:")
+    print(f"  Matched by Subscription ID:  {len(matched_by_sub_id):4d} subs ({mrr_matched_sub_id:12,.2f} NOK)")
+    print(f"  Matched by Call Sign:        {len(matched_by_call_sign):4d} subs ({mrr_matched_call_sign:12,.2f} NOK)")
+    print(f"  Matched by Vessel+Customer:  {len(matched_by_vessel):4d} subs ({mrr_matched_vessel:12,.2f} NOK)")
+    print(f"  {'-'*80}")
+    print(f"  Total Matched:               {len(all_matched):4d} subs ({mrr_matched_sub_id + mrr_matched_call_sign + mrr_matched_vessel:12,.2f} NOK)")
+    print(f"  Still Unmatched:             {len(unmatched_subs):4d} subs ({mrr_unmatched:12,.2f} NOK)")
+    print(f"\nGap contributors:")
+    print(f"  1. Unmatched subscriptions: -{mrr_unmatched:,.2f} NOK ({len(unmatched_subs)} subs)")
+    print(f"  2. Customers only in invoices: +{only_inv_mrr:,.2f} NOK ({len(only_in_invoices)} customers)")
+    print(f"  3. Amount differences in matched: {(total_inv_mrr - total_sub_mrr) - (only_inv_mrr - mrr_unmatched):,.2f} NOK")
 
 
 if __name__ == "__main__":
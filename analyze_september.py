@@ -1,40 +1,70 @@
 """Analyze September 2025 Zoho MRR report"""
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from excel_cache import cached_parquet_path, column_values, to_arrow
 
 file_path = r"c:\Users\nikolai\Downloads\MRR Details (2).xlsx"
 
-try:
-    # Read Zoho report
-    df = pd.read_excel(file_path, skiprows=1)
 
-    print("=== ZOHO MRR DETAILS (September 2025) ===\n")
+def as_float(column):
+    """Column as float64 - values that are not numbers become null (like pd.to_numeric(errors='coerce'))"""
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        return pc.cast(column, pa.float64())
+    # Mixed text/number columns are stored with their cell types; coerce them like the old script
+    return pa.array(pd.to_numeric(column_values(column), errors='coerce'), type=pa.float64())
 
-    # Total MRR
-    df['mrr_numeric'] = pd.to_numeric(df['mrr'], errors='coerce')
-    total_mrr_zoho = df['mrr_numeric'].sum()
 
-    print(f"Total MRR from Zoho: {total_mrr_zoho:,.2f} NOK")
-    print(f"Total subscriptions: {len(df)}")
+def as_timestamp(column):
+    """Column as timestamps - unparseable values become null (like pd.to_datetime(errors='coerce'))"""
+    if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+        return column
+    return pa.array(pd.to_datetime(column_values(column), errors='coerce'))
 
-    # Unique customers
-    unique_customers = df['customer_id'].nunique()
-    print(f"Unique customers: {unique_customers}")
 
-    # Average MRR per subscription
-    avg_mrr = total_mrr_zoho / len(df)
-    print(f"Average MRR per subscription: {avg_mrr:.2f} NOK")
+def main():
+    try:
+        # Read Zoho report (first row is a title, headers are on the second row).
+        # Goes through the Parquet cache - the workbook is only parsed when it has changed,
+        # and the aggregates below run as Arrow compute kernels on the cached columns
+        try:
+            table = pq.read_table(cached_parquet_path(file_path, header=1))
+        except Exception as e:
+            print(f"  WARNING: Could not write Parquet cache ({e}), reading Excel directly")
+            table = to_arrow(pd.read_excel(file_path, header=1))
 
-    # ARPU
-    arpu = total_mrr_zoho / unique_customers
-    print(f"ARPU: {arpu:.2f} NOK")
+        print("=== ZOHO MRR DETAILS (September 2025) ===\n")
 
-    # Check date range
-    df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce')
-    print(f"\nDate range: {df['date_parsed'].min()} to {df['date_parsed'].max()}")
+        # Total MRR
+        total_mrr_zoho = pc.sum(as_float(table['mrr'])).as_py() or 0
 
-    print(f"\nColumns available: {list(df.columns)}")
+        print(f"Total MRR from Zoho: {total_mrr_zoho:,.2f} NOK")
+        print(f"Total subscriptions: {table.num_rows}")
 
-except Exception as e:
-    print(f"Error: {e}")
-    import traceback
-    traceback.print_exc()
+        # Unique customers
+        unique_customers = pc.count_distinct(table['customer_id']).as_py()
+        print(f"Unique customers: {unique_customers}")
+
+        # Average MRR per subscription
+        avg_mrr = total_mrr_zoho / table.num_rows
+        print(f"Average MRR per subscription: {avg_mrr:.2f} NOK")
+
+        # ARPU
+        arpu = total_mrr_zoho / unique_customers
+        print(f"ARPU: {arpu:.2f} NOK")
+
+        # Check date range
+        date_range = pc.min_max(as_timestamp(table['date']))
+        print(f"\nDate range: {date_range['min'].as_py()} to {date_range['max'].as_py()}")
+
+        print(f"\nColumns available: {table.column_names}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,151 @@ Compares subscription-based MRR vs invoice-based MRR at customer level
 Uses month-end snapshot approach (accounting closing date)
 """
 import asyncio
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from sqlalchemy import select, and_, or_
+from sqlalchemy import select, and_, or_, case, func
 from database import AsyncSessionLocal
+from dates import month_end_snapshot
 from models.subscription import Subscription
 from models.invoice import Invoice, InvoiceLineItem
 
+# Subscription MRR (same logic as MetricsCalculator)
+# interval is "months" or "years", interval_unit is 1, 2, 3, etc
+# Normalize to monthly: divide by VAT and by the number of months (12 per year)
+SUB_MRR = case(
+    (Subscription.interval == "years", Subscription.amount / 1.25 / (12 * Subscription.interval_unit)),
+    else_=Subscription.amount / 1.25 / Subscription.interval_unit
+)
+
+INV_MRR = func.coalesce(InvoiceLineItem.mrr_per_month, 0)
+
+# Cleaned call signs for matching - the stored match keys (stripped, upper case).
+# Blank call signs have no key; they stay '' so they are matched like before
+SUB_CALL_SIGN_CLEAN = func.coalesce(Subscription.call_sign_key, '')
+INV_CALL_SIGN_CLEAN = func.coalesce(InvoiceLineItem.call_sign_key, '')
+
+
+def active_subscriptions(month_end):
+    """Subscriptions active on the month-end date"""
+    return and_(
+        Subscription.status.in_(['live', 'non_renewing']),
+        or_(
+            Subscription.activated_at.is_(None),
+            Subscription.activated_at <= month_end
+        ),
+        or_(
+            Subscription.expires_at.is_(None),
+            Subscription.expires_at >= month_end
+        )
+    )
+
+
+def active_line_items(month_end):
+    """Invoice line items active on the month-end date (accounting snapshot)"""
+    return and_(
+        InvoiceLineItem.period_start_date <= month_end,
+        InvoiceLineItem.period_end_date >= month_end  # Must still be active on month-end
+    )
+
+
+async def fetch_subscriptions(month_end):
+    """Count, total MRR, top 10 and call sign rows for active subscriptions (own session)"""
+    sub_active = active_subscriptions(month_end)
+
+    async with AsyncSessionLocal() as session:
+        # Count and total are aggregated in the database
+        stmt = select(func.count(), func.coalesce(func.sum(SUB_MRR), 0)).where(sub_active)
+        sub_count, total_sub_mrr = (await session.execute(stmt)).one()
+
+        stmt = (
+            select(Subscription.customer_name, Subscription.plan_name, SUB_MRR.label('sub_mrr'))
+            .where(sub_active)
+            .order_by(SUB_MRR.desc(), Subscription.id)
+            .limit(10)
+        )
+        result = await session.execute(stmt)
+        top_subs = pd.DataFrame.from_records(result.all(), columns=['customer_name', 'plan_name', 'sub_mrr'])
+
+        # Full rows are only needed for matching, which is done by call sign
+        stmt = select(
+            Subscription.id,
+            Subscription.customer_id,
+            Subscription.customer_name,
+            Subscription.vessel_name,
+            Subscription.call_sign,
+            Subscription.plan_name,
+            Subscription.status,
+            Subscription.amount,
+            Subscription.interval,
+            Subscription.interval_unit,
+            SUB_MRR,
+            SUB_CALL_SIGN_CLEAN,
+        ).where(sub_active, Subscription.call_sign.is_not(None)).execution_options(yield_per=1000)
+        # Streamed in batches - only the DataFrame holds the rows
+        result = await session.stream(stmt)
+        df_subs_with_call = pd.DataFrame.from_records([tuple(row) async for row in result], columns=[
+            'subscription_id', 'customer_id', 'customer_name', 'vessel_name', 'call_sign',
+            'plan_name', 'status', 'amount', 'interval', 'interval_unit', 'sub_mrr', 'call_sign_clean'
+        ])
+
+    return sub_count, total_sub_mrr, top_subs, df_subs_with_call
+
+
+async def fetch_invoices(month_end):
+    """Count, total MRR, top 10 and call sign rows for active invoice lines (own session)"""
+    line_active = active_line_items(month_end)
+
+    async with AsyncSessionLocal() as session:
+        # Count, total and subscription_id matches are aggregated in the database
+        stmt = select(
+            func.count(),
+            func.coalesce(func.sum(INV_MRR), 0),
+            func.count(InvoiceLineItem.subscription_id.distinct())
+        ).where(line_active)
+        line_count, total_inv_mrr, matched_by_sub_id = (await session.execute(stmt)).one()
+
+        # Invoice details come from an outer join, so lines without an invoice are kept
+        stmt = (
+            select(Invoice.customer_name, InvoiceLineItem.name, INV_MRR.label('inv_mrr'))
+            .outerjoin(Invoice, InvoiceLineItem.invoice_id == Invoice.id)
+            .where(line_active)
+            .order_by(INV_MRR.desc(), InvoiceLineItem.id)
+            .limit(10)
+        )
+        result = await session.execute(stmt)
+        top_lines = pd.DataFrame.from_records(result.all(), columns=['customer_name', 'item_name', 'inv_mrr'])
+
+        # Full rows are only needed for matching, which is done by call sign
+        stmt = select(
+            InvoiceLineItem.invoice_id,
+            InvoiceLineItem.id,
+            InvoiceLineItem.subscription_id,
+            Invoice.customer_id,
+            Invoice.customer_name,
+            InvoiceLineItem.vessel_name,
+            InvoiceLineItem.call_sign,
+            InvoiceLineItem.name,
+            Invoice.transaction_type,
+            InvoiceLineItem.item_total,
+            InvoiceLineItem.period_months,
+            InvoiceLineItem.period_start_date,
+            InvoiceLineItem.period_end_date,
+            INV_MRR,
+            INV_CALL_SIGN_CLEAN,
+        ).outerjoin(Invoice, InvoiceLineItem.invoice_id == Invoice.id).where(
+            line_active, InvoiceLineItem.call_sign.is_not(None)
+        ).execution_options(yield_per=1000)
+        # Streamed in batches - only the DataFrame holds the rows
+        result = await session.stream(stmt)
+        df_invoices_with_call = pd.DataFrame.from_records([tuple(row) async for row in result], columns=[
+            'invoice_id', 'line_item_id', 'subscription_id', 'customer_id', 'customer_name',
+            'vessel_name', 'call_sign', 'item_name', 'transaction_type', 'item_total',
+            'period_months', 'period_start', 'period_end', 'inv_mrr', 'call_sign_clean'
+        ])
+
+    return line_count, total_inv_mrr, matched_by_sub_id, top_lines, df_invoices_with_call
+
+
 async def analyze_september_gap():
     """
     Analyze MRR gap for September 2025
@@ -26,13 +164,7 @@ async def analyze_september_gap():
 
     # Calculate month-end date (like accounting month-end closing)
     year, month = 2025, 9
-    if month == 12:
-        month_end = datetime(year + 1, 1, 1) - timedelta(days=1)
-    else:
-        month_end = datetime(year, month + 1, 1) - timedelta(days=1)
-
-    # Set to end of day
-    month_end = month_end.replace(hour=23, minute=59, second=59)
+    month_end = month_end_snapshot(year, month)
 
     print("=" * 100)
     print(f"SEPTEMBER 2025 MRR GAP ANALYSIS (Month-End Snapshot)")
@@ -41,239 +173,158 @@ async def analyze_september_gap():
     print(f"Snapshot date: {month_end} (last day of month)")
     print(f"Method: Accounting month-end closing\n")
 
-    async with AsyncSessionLocal() as session:
-        # ===== 1. GET SUBSCRIPTION-BASED MRR =====
-        print("\n" + "=" * 100)
-        print("1. SUBSCRIPTION-BASED MRR (Active in September 2025)")
-        print("=" * 100)
-
-        # Get active subscriptions on Sept 30, 2025
-        stmt = select(Subscription).where(
-            and_(
-                Subscription.status.in_(['live', 'non_renewing']),
-                or_(
-                    Subscription.activated_at.is_(None),
-                    Subscription.activated_at <= month_end
-                ),
-                or_(
-                    Subscription.expires_at.is_(None),
-                    Subscription.expires_at >= month_end
-                )
-            )
-        )
-        result = await session.execute(stmt)
-        subscriptions = result.scalars().all()
-
-        print(f"Found {len(subscriptions)} active subscriptions")
-
-        # Calculate MRR for each subscription
-        subscription_data = []
-        total_sub_mrr = 0
-
-        for sub in subscriptions:
-            # Calculate MRR (same logic as MetricsCalculator)
-            amount = sub.amount
-            interval = sub.interval  # "months" or "years"
-            interval_unit = sub.interval_unit  # 1, 2, 3, etc
-
-            # Normalize to monthly
-            if interval == "years":
-                mrr = (amount / 1.25) / (12 * interval_unit)  # Divide by VAT and years
-            else:  # months
-                mrr = (amount / 1.25) / interval_unit  # Divide by VAT and months
-
-            total_sub_mrr += mrr
-
-            subscription_data.append({
-                'subscription_id': sub.id,
-                'customer_id': sub.customer_id,
-                'customer_name': sub.customer_name,
-                'vessel_name': sub.vessel_name,
-                'call_sign': sub.call_sign,
-                'plan_name': sub.plan_name,
-                'status': sub.status,
-                'amount': amount,
-                'interval': interval,
-                'interval_unit': interval_unit,
-                'sub_mrr': mrr
-            })
-
-        df_subs = pd.DataFrame(subscription_data)
-        print(f"Total Subscription MRR: {total_sub_mrr:,.2f} NOK")
-        print(f"\nTop 10 subscriptions by MRR:")
-        print(df_subs.nlargest(10, 'sub_mrr')[['customer_name', 'plan_name', 'sub_mrr']])
-
-        # ===== 2. GET INVOICE-BASED MRR =====
-        print("\n" + "=" * 100)
-        print("2. INVOICE-BASED MRR (Active on Sept 30, 2025 23:59:59)")
-        print("=" * 100)
-
-        # Get invoice line items active on month-end date (accounting snapshot)
-        stmt = select(InvoiceLineItem).where(
-            and_(
-                InvoiceLineItem.period_start_date <= month_end,
-                InvoiceLineItem.period_end_date >= month_end  # Must still be active on month-end
-            )
+    # Subscriptions and invoices are independent reads - run them concurrently
+    (sub_count, total_sub_mrr, top_subs, df_subs_with_call), \
+        (line_count, total_inv_mrr, matched_by_sub_id, top_lines, df_invoices_with_call) = await asyncio.gather(
+            fetch_subscriptions(month_end),
+            fetch_invoices(month_end)
         )
-        result = await session.execute(stmt)
-        line_items = result.scalars().all()
-
-        print(f"Found {len(line_items)} active invoice line items (on month-end)")
-
-        # Get invoice details for each line item
-        invoice_data = []
-        total_inv_mrr = 0
-
-        for item in line_items:
-            # Get invoice details
-            invoice = await session.get(Invoice, item.invoice_id)
-
-            mrr = item.mrr_per_month if item.mrr_per_month else 0
-            total_inv_mrr += mrr
-
-            invoice_data.append({
-                'invoice_id': item.invoice_id,
-                'line_item_id': item.id,
-                'subscription_id': item.subscription_id,
-                'customer_id': invoice.customer_id if invoice else None,
-                'customer_name': invoice.customer_name if invoice else None,
-                'vessel_name': item.vessel_name,
-                'call_sign': item.call_sign,
-                'item_name': item.name,
-                'transaction_type': invoice.transaction_type if invoice else None,
-                'item_total': item.item_total,
-                'period_months': item.period_months,
-                'period_start': item.period_start_date,
-                'period_end': item.period_end_date,
-                'inv_mrr': mrr
-            })
-
-        df_invoices = pd.DataFrame(invoice_data)
-        print(f"Total Invoice MRR: {total_inv_mrr:,.2f} NOK")
-        print(f"\nTop 10 invoice lines by MRR:")
-        print(df_invoices.nlargest(10, 'inv_mrr')[['customer_name', 'item_name', 'inv_mrr']])
-
-        # ===== 3. CALCULATE GAP =====
-        print("\n" + "=" * 100)
-        print("3. MRR GAP SUMMARY")
-        print("=" * 100)
-        gap = total_sub_mrr - total_inv_mrr
-        gap_pct = (gap / total_sub_mrr * 100) if total_sub_mrr > 0 else 0
-
-        print(f"Subscription MRR: {total_sub_mrr:>15,.2f} NOK")
-        print(f"Invoice MRR:      {total_inv_mrr:>15,.2f} NOK")
-        print(f"Gap:              {gap:>15,.2f} NOK ({gap_pct:+.2f}%)")
-
-        # ===== 4. MATCH SUBSCRIPTIONS TO INVOICES =====
-        print("\n" + "=" * 100)
-        print("4. MATCHING SUBSCRIPTIONS TO INVOICES")
-        print("=" * 100)
-
-        # Try to match by subscription_id first
-        matched_by_sub_id = df_invoices[df_invoices['subscription_id'].notna()].groupby('subscription_id')['inv_mrr'].sum()
-        print(f"Matched by subscription_id: {len(matched_by_sub_id)} subscriptions")
-
-        # Match by call_sign (most reliable for vessels)
-        df_subs_with_call = df_subs[df_subs['call_sign'].notna()].copy()
-        df_invoices_with_call = df_invoices[df_invoices['call_sign'].notna()].copy()
-
-        # Clean call signs for matching
-        df_subs_with_call['call_sign_clean'] = df_subs_with_call['call_sign'].str.strip().str.upper()
-        df_invoices_with_call['call_sign_clean'] = df_invoices_with_call['call_sign'].str.strip().str.upper()
-
-        # Aggregate invoice MRR by call sign
-        inv_by_call = df_invoices_with_call.groupby('call_sign_clean')['inv_mrr'].sum().to_dict()
-
-        # Match subscriptions to invoices
-        df_subs_with_call['inv_mrr_matched'] = df_subs_with_call['call_sign_clean'].map(inv_by_call)
-        df_subs_with_call['mrr_diff'] = df_subs_with_call['sub_mrr'] - df_subs_with_call['inv_mrr_matched'].fillna(0)
-
-        # ===== 5. IDENTIFY UNMATCHED SUBSCRIPTIONS =====
-        print("\n" + "=" * 100)
-        print("5. UNMATCHED SUBSCRIPTIONS (Have subscription but no invoice)")
-        print("=" * 100)
-
-        unmatched_subs = df_subs_with_call[df_subs_with_call['inv_mrr_matched'].isna() | (df_subs_with_call['inv_mrr_matched'] == 0)]
-        print(f"Found {len(unmatched_subs)} unmatched subscriptions")
-        unmatched_mrr = unmatched_subs['sub_mrr'].sum()
-        print(f"Total unmatched subscription MRR: {unmatched_mrr:,.2f} NOK")
-
-        if len(unmatched_subs) > 0:
-            print("\nTop 20 unmatched subscriptions:")
-            print(unmatched_subs.nlargest(20, 'sub_mrr')[['customer_name', 'call_sign', 'plan_name', 'sub_mrr']])
-
-        # ===== 6. IDENTIFY LARGE DISCREPANCIES =====
-        print("\n" + "=" * 100)
-        print("6. LARGE DISCREPANCIES (>1000 NOK difference)")
-        print("=" * 100)
-
-        large_diffs = df_subs_with_call[abs(df_subs_with_call['mrr_diff']) > 1000].copy()
-        print(f"Found {len(large_diffs)} subscriptions with >1000 NOK difference")
-
-        if len(large_diffs) > 0:
-            print("\nTop 20 discrepancies:")
-            large_diffs_sorted = large_diffs.reindex(large_diffs['mrr_diff'].abs().sort_values(ascending=False).index)
-            print(large_diffs_sorted[['customer_name', 'call_sign', 'plan_name', 'sub_mrr', 'inv_mrr_matched', 'mrr_diff']].head(20))
-
-        # ===== 7. IDENTIFY UNMATCHED INVOICES =====
-        print("\n" + "=" * 100)
-        print("7. UNMATCHED INVOICES (Have invoice but no subscription)")
-        print("=" * 100)
-
-        # Find invoices without matching subscriptions
-        sub_call_signs = set(df_subs_with_call['call_sign_clean'].unique())
-        unmatched_invs = df_invoices_with_call[~df_invoices_with_call['call_sign_clean'].isin(sub_call_signs)]
-
-        print(f"Found {len(unmatched_invs)} unmatched invoice lines")
-        unmatched_inv_mrr = unmatched_invs['inv_mrr'].sum()
-        print(f"Total unmatched invoice MRR: {unmatched_inv_mrr:,.2f} NOK")
-
-        if len(unmatched_invs) > 0:
-            print("\nTop 20 unmatched invoices:")
-            print(unmatched_invs.nlargest(20, 'inv_mrr')[['customer_name', 'call_sign', 'item_name', 'inv_mrr']])
-
-        # ===== 8. SUMMARY OF GAP SOURCES =====
-        print("\n" + "=" * 100)
-        print("8. GAP BREAKDOWN")
-        print("=" * 100)
-
-        print(f"Total gap: {gap:,.2f} NOK ({gap_pct:+.2f}%)")
-        print(f"\nSources:")
-        print(f"  1. Unmatched subscriptions (no invoice):     {unmatched_mrr:>12,.2f} NOK")
-        print(f"  2. Unmatched invoices (no subscription):     {-unmatched_inv_mrr:>12,.2f} NOK")
-
-        # Small differences in matched items
-        matched_diffs = df_subs_with_call[df_subs_with_call['inv_mrr_matched'].notna() & (df_subs_with_call['inv_mrr_matched'] > 0)]
-        small_diff_sum = matched_diffs['mrr_diff'].sum()
-        print(f"  3. Calculation differences (matched items):  {small_diff_sum:>12,.2f} NOK")
-
-        explained_gap = unmatched_mrr - unmatched_inv_mrr + small_diff_sum
-        print(f"\nExplained gap: {explained_gap:,.2f} NOK")
-        print(f"Unexplained:   {gap - explained_gap:,.2f} NOK")
-
-        # ===== 9. SAVE DETAILED RESULTS =====
-        print("\n" + "=" * 100)
-        print("9. SAVING RESULTS")
-        print("=" * 100)
-
-        # Save full comparison
-        df_subs_with_call.to_csv('september_gap_subscriptions.csv', index=False)
-        print("Saved: september_gap_subscriptions.csv")
-
-        df_invoices_with_call.to_csv('september_gap_invoices.csv', index=False)
-        print("Saved: september_gap_invoices.csv")
-
-        if len(unmatched_subs) > 0:
-            unmatched_subs.to_csv('september_gap_unmatched_subs.csv', index=False)
-            print("Saved: september_gap_unmatched_subs.csv")
-
-        if len(unmatched_invs) > 0:
-            unmatched_invs.to_csv('september_gap_unmatched_invoices.csv', index=False)
-            print("Saved: september_gap_unmatched_invoices.csv")
-
-        print("\n" + "=" * 100)
-        print("ANALYSIS COMPLETE")
-        print("=" * 100)
+
+    # ===== 1. GET SUBSCRIPTION-BASED MRR =====
+    print("\n" + "=" * 100)
+    print("1. SUBSCRIPTION-BASED MRR (Active in September 2025)")
+    print("=" * 100)
+
+    print(f"Found {sub_count} active subscriptions")
+    print(f"Total Subscription MRR: {total_sub_mrr:,.2f} NOK")
+    print(f"\nTop 10 subscriptions by MRR:")
+    print(top_subs)
+
+    # ===== 2. GET INVOICE-BASED MRR =====
+    print("\n" + "=" * 100)
+    print("2. INVOICE-BASED MRR (Active on Sept 30, 2025 23:59:59)")
+    print("=" * 100)
+
+    print(f"Found {line_count} active invoice line items (on month-end)")
+    print(f"Total Invoice MRR: {total_inv_mrr:,.2f} NOK")
+    print(f"\nTop 10 invoice lines by MRR:")
+    print(top_lines)
+
+    # ===== 3. CALCULATE GAP =====
+    print("\n" + "=" * 100)
+    print("3. MRR GAP SUMMARY")
+    print("=" * 100)
+    gap = total_sub_mrr - total_inv_mrr
+    gap_pct = (gap / total_sub_mrr * 100) if total_sub_mrr > 0 else 0
+
+    print(f"Subscription MRR: {total_sub_mrr:>15,.2f} NOK")
+    print(f"Invoice MRR:      {total_inv_mrr:>15,.2f} NOK")
+    print(f"Gap:              {gap:>15,.2f} NOK ({gap_pct:+.2f}%)")
+
+    # ===== 4. MATCH SUBSCRIPTIONS TO INVOICES =====
+    print("\n" + "=" * 100)
+    print("4. MATCHING SUBSCRIPTIONS TO INVOICES")
+    print("=" * 100)
+
+    # Try to match by subscription_id first
+    print(f"Matched by subscription_id: {matched_by_sub_id} subscriptions")
+
+    # Match by call_sign (most reliable for vessels)
+    # Shared categorical codes for the call signs of both sides, so the groupby,
+    # merge and isin below work on int codes instead of hashing strings
+    call_signs = pd.concat([df_subs_with_call['call_sign_clean'], df_invoices_with_call['call_sign_clean']]).unique()
+    call_sign_type = pd.CategoricalDtype(call_signs)
+    df_subs_with_call['call_sign_clean'] = df_subs_with_call['call_sign_clean'].astype(call_sign_type)
+    df_invoices_with_call['call_sign_clean'] = df_invoices_with_call['call_sign_clean'].astype(call_sign_type)
+
+    # Aggregate invoice MRR by call sign (observed: only call signs that have invoices)
+    inv_by_call = (
+        df_invoices_with_call.groupby('call_sign_clean', as_index=False, observed=True)['inv_mrr'].sum()
+        .rename(columns={'inv_mrr': 'inv_mrr_matched'})
+    )
+
+    # Match subscriptions to invoices (left join keeps every subscription)
+    df_subs_with_call = df_subs_with_call.merge(inv_by_call, on='call_sign_clean', how='left')
+    df_subs_with_call['mrr_diff'] = df_subs_with_call['sub_mrr'] - df_subs_with_call['inv_mrr_matched'].fillna(0)
+
+    # ===== 5. IDENTIFY UNMATCHED SUBSCRIPTIONS =====
+    print("\n" + "=" * 100)
+    print("5. UNMATCHED SUBSCRIPTIONS (Have subscription but no invoice)")
+    print("=" * 100)
+
+    unmatched_subs = df_subs_with_call[df_subs_with_call['inv_mrr_matched'].isna() | (df_subs_with_call['inv_mrr_matched'] == 0)]
+    print(f"Found {len(unmatched_subs)} unmatched subscriptions")
+    unmatched_mrr = unmatched_subs['sub_mrr'].sum()
+    print(f"Total unmatched subscription MRR: {unmatched_mrr:,.2f} NOK")
+
+    if len(unmatched_subs) > 0:
+        print("\nTop 20 unmatched subscriptions:")
+        print(unmatched_subs.nlargest(20, 'sub_mrr')[['customer_name', 'call_sign', 'plan_name', 'sub_mrr']])
+
+    # ===== 6. IDENTIFY LARGE DISCREPANCIES =====
+    print("\n" + "=" * 100)
+    print("6. LARGE DISCREPANCIES (>1000 NOK difference)")
+    print("=" * 100)
+
+    is_large_diff = np.abs(df_subs_with_call['mrr_diff'].to_numpy()) > 1000
+    large_diffs = df_subs_with_call[is_large_diff].copy()
+    print(f"Found {len(large_diffs)} subscriptions with >1000 NOK difference")
+
+    if len(large_diffs) > 0:
+        print("\nTop 20 discrepancies:")
+        large_diffs_sorted = large_diffs.sort_values('mrr_diff', key=abs, ascending=False)
+        print(large_diffs_sorted[['customer_name', 'call_sign', 'plan_name', 'sub_mrr', 'inv_mrr_matched', 'mrr_diff']].head(20))
+
+    # ===== 7. IDENTIFY UNMATCHED INVOICES =====
+    print("\n" + "=" * 100)
+    print("7. UNMATCHED INVOICES (Have invoice but no subscription)")
+    print("=" * 100)
+
+    # Find invoices without matching subscriptions
+    # Both columns share the categorical dtype, so isin works on the codes directly
+    sub_call_signs = df_subs_with_call['call_sign_clean'].unique()
+    unmatched_invs = df_invoices_with_call[~df_invoices_with_call['call_sign_clean'].isin(sub_call_signs)]
+
+    print(f"Found {len(unmatched_invs)} unmatched invoice lines")
+    unmatched_inv_mrr = unmatched_invs['inv_mrr'].sum()
+    print(f"Total unmatched invoice MRR: {unmatched_inv_mrr:,.2f} NOK")
+
+    if len(unmatched_invs) > 0:
+        print("\nTop 20 unmatched invoices:")
+        print(unmatched_invs.nlargest(20, 'inv_mrr')[['customer_name', 'call_sign', 'item_name', 'inv_mrr']])
+
+    # ===== 8. SUMMARY OF GAP SOURCES =====
+    print("\n" + "=" * 100)
+    print("8. GAP BREAKDOWN")
+    print("=" * 100)
+
+    print(f"Total gap: {gap:,.2f} NOK ({gap_pct:+.2f}%)")
+    print(f"\nSources:")
+    print(f"  1. Unmatched subscriptions (no invoice):     {unmatched_mrr:>12,.2f} NOK")
+    print(f"  2. Unmatched invoices (no subscription):     {-unmatched_inv_mrr:>12,.2f} NOK")
+
+    # Small differences in matched items
+    matched_diffs = df_subs_with_call[df_subs_with_call['inv_mrr_matched'].notna() & (df_subs_with_call['inv_mrr_matched'] > 0)]
+    small_diff_sum = matched_diffs['mrr_diff'].sum()
+    print(f"  3. Calculation differences (matched items):  {small_diff_sum:>12,.2f} NOK")
+
+    explained_gap = unmatched_mrr - unmatched_inv_mrr + small_diff_sum
+    print(f"\nExplained gap: {explained_gap:,.2f} NOK")
+    print(f"Unexplained:   {gap - explained_gap:,.2f} NOK")
+
+    # ===== 9. SAVE DETAILED RESULTS =====
+    print("\n" + "=" * 100)
+    print("9. SAVING RESULTS")
+    print("=" * 100)
+
+    # Save full comparison (Parquet: typed columns, much faster to write than CSV)
+    df_subs_with_call.to_parquet('september_gap_subscriptions.parquet', compression='zstd', index=False)
+    print("Saved: september_gap_subscriptions.parquet")
+
+    df_invoices_with_call.to_parquet('september_gap_invoices.parquet', compression='zstd', index=False)
+    print("Saved: september_gap_invoices.parquet")
+
+    if len(unmatched_subs) > 0:
+        unmatched_subs.to_parquet('september_gap_unmatched_subs.parquet', compression='zstd', index=False)
+        print("Saved: september_gap_unmatched_subs.parquet")
+
+    if len(unmatched_invs) > 0:
+        unmatched_invs.to_parquet('september_gap_unmatched_invoices.parquet', compression='zstd', index=False)
+        print("Saved: september_gap_unmatched_invoices.parquet")
+
+    print("\n" + "=" * 100)
+    print("ANALYSIS COMPLETE")
+    print("=" * 100)
 
 if __name__ == "__main__":
     asyncio.run(analyze_september_gap())
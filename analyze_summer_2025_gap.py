@@ -4,13 +4,37 @@ Focus: Juni, Juli, September 2025
 """
 
 import asyncio
+import pandas as pd
 from datetime import datetime
 from sqlalchemy import select
 from database import AsyncSessionLocal
+from dates import month_end_snapshot
 from models.subscription import Subscription, MonthlyMRRSnapshot
 from models.accounting import AccountingReceivableItem, AccountingMRRSnapshot
 from services.accounting import AccountingService
 
+# Accounting items per snapshot date - the items for a month-end don't change within a run
+_items_cache: dict[datetime, pd.DataFrame] = {}
+
+
+async def fetch_accounting_items(session, month_end):
+    """item_name / mrr for accounting items active on month_end (cached per month_end)"""
+    if month_end not in _items_cache:
+        # Only the columns used, streamed in batches
+        stmt = select(
+            AccountingReceivableItem.item_name,
+            AccountingReceivableItem.mrr_per_month
+        ).where(
+            AccountingReceivableItem.period_start_date <= month_end,
+            AccountingReceivableItem.period_end_date >= month_end
+        ).execution_options(yield_per=1000)
+        result = await session.stream(stmt)
+        items = pd.DataFrame.from_records([tuple(row) async for row in result], columns=['item_name', 'mrr'])
+        items['mrr'] = items['mrr'].fillna(0)
+        _items_cache[month_end] = items
+    return _items_cache[month_end]
+
+
 async def analyze_summer_gap():
     print("\n" + "="*120)
     print("ANALYSE: SUBSCRIPTION vs ACCOUNTING MRR GAP - SOMMER 2025")
@@ -55,46 +79,23 @@ async def analyze_summer_gap():
 
             # Get accounting items breakdown by category
             year, month = map(int, target_month.split('-'))
-            if month == 12:
-                month_end = datetime(year + 1, 1, 1)
-            else:
-                month_end = datetime(year, month + 1, 1)
-            from dateutil.relativedelta import relativedelta
-            month_end = month_end - relativedelta(days=1)
-            month_end = month_end.replace(hour=23, minute=59, second=59)
+            month_end = month_end_snapshot(year, month)
 
             # Get all accounting items active on last day of month
-            stmt = select(AccountingReceivableItem).where(
-                AccountingReceivableItem.period_start_date <= month_end,
-                AccountingReceivableItem.period_end_date >= month_end
-            )
-            result = await session.execute(stmt)
-            items = result.scalars().all()
-
-            # Categorize
-            by_category = {}
-            recurring_total = 0
-            non_recurring_total = 0
-
-            for item in items:
-                category = service.categorize_item(item.item_name)
-                is_recurring = service.is_recurring_category(category)
-                mrr = item.mrr_per_month or 0
+            items = await fetch_accounting_items(session, month_end)
 
-                if category not in by_category:
-                    by_category[category] = {
-                        'mrr': 0,
-                        'count': 0,
-                        'is_recurring': is_recurring
-                    }
+            # Categorize - once per distinct item name, not once per item
+            # (kept out of the cached frame)
+            item_names = items['item_name'].fillna('')
+            category_map = {name: service.categorize_item(name) for name in item_names.unique()}
+            categories = item_names.map(category_map)
 
-                by_category[category]['mrr'] += mrr
-                by_category[category]['count'] += 1
+            # Categories in order of first appearance (same as the item order)
+            by_category = items['mrr'].groupby(categories, sort=False).agg(['sum', 'count'])
+            by_category['is_recurring'] = [service.is_recurring_category(cat) for cat in by_category.index]
 
-                if is_recurring:
-                    recurring_total += mrr
-                else:
-                    non_recurring_total += mrr
+            recurring_total = by_category.loc[by_category['is_recurring'], 'sum'].sum()
+            non_recurring_total = by_category.loc[~by_category['is_recurring'], 'sum'].sum()
 
             print("ACCOUNTING BREAKDOWN PER KATEGORI:")
             print("-" * 80)
@@ -102,11 +103,11 @@ async def analyze_summer_gap():
             print("-" * 80)
 
             # Sort by MRR
-            sorted_categories = sorted(by_category.items(), key=lambda x: abs(x[1]['mrr']), reverse=True)
+            sorted_categories = by_category.sort_values('sum', key=abs, ascending=False, kind='stable')
 
-            for cat_name, cat_data in sorted_categories:
+            for cat_name, cat_data in sorted_categories.iterrows():
                 cat_type = "RECURRING" if cat_data['is_recurring'] else "ENGANGS"
-                print(f"{cat_name:<30} {cat_type:<15} {cat_data['mrr']:>15,.0f} {cat_data['count']:>10}")
+                print(f"{cat_name:<30} {cat_type:<15} {cat_data['sum']:>15,.0f} {cat_data['count']:>10}")
 
             print("-" * 80)
             print(f"{'RECURRING TOTAL':<30} {'':15} {recurring_total:>15,.0f}")
@@ -1,8 +1,9 @@
 import pandas as pd
+from excel_cache import read_excel_cached
 
-# Read the Excel file
+# Read the Excel file (through the Parquet cache - only parsed again when the file changes)
 file_path = r"c:\Users\nikolai\Downloads\MRR Details.xlsx"
-df = pd.read_excel(file_path)
+df = read_excel_cached(file_path)
 
 print("=" * 100)
 print("ZOHO MRR DETAILS - COLUMN ANALYSIS")
@@ -7,8 +7,8 @@ from datetime import datetime
 import asyncio
 from database import AsyncSessionLocal
 from models.invoice import InvoiceLineItem, Invoice
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, and_
+from excel_cache import read_excel_cached
 
 
 async def analyze_zoho_report():
@@ -25,8 +25,8 @@ async def analyze_zoho_report():
     print("-"*80)
 
     try:
-        # Try reading the Excel file
-        df = pd.read_excel(zoho_file)
+        # Try reading the Excel file (through the Parquet cache)
+        df = read_excel_cached(zoho_file)
         print(f"Loaded Zoho report: {len(df)} rows, {len(df.columns)} columns")
         print("\nColumn names:")
         for i, col in enumerate(df.columns):
@@ -57,75 +57,60 @@ async def analyze_zoho_report():
     except Exception as e:
         print(f"Error reading Zoho report: {e}")
 
-    # Now calculate OUR September MRR
-    print("\n\n[4] OUR SEPTEMBER 2025 CALCULATION")
-    print("-"*80)
-
-    target_month_start = datetime(2025, 9, 1)
-    target_month_end = datetime(2025, 9, 30)
+    # Now calculate OUR September and October MRR (October for comparison)
+    months = [
+        ("[4]", "SEPTEMBER", "September", datetime(2025, 9, 1), datetime(2025, 9, 30)),
+        ("[5]", "OCTOBER", "October", datetime(2025, 10, 1), datetime(2025, 10, 31)),
+    ]
 
     async with AsyncSessionLocal() as session:
-        # Get all line items with periods that overlap September 2025
+        # One query for both months: the months are adjacent, so "overlaps September or
+        # October" is "overlaps September 1 - October 31". The database flags which of
+        # the months each line overlaps (a line can overlap both)
         result = await session.execute(
-            select(InvoiceLineItem)
+            select(
+                *[
+                    and_(
+                        InvoiceLineItem.period_start_date <= target_month_end,
+                        InvoiceLineItem.period_end_date >= target_month_start
+                    )
+                    for _, _, _, target_month_start, target_month_end in months
+                ],
+                InvoiceLineItem.mrr_per_month,
+                Invoice.customer_id,
+                Invoice.transaction_type
+            )
             .join(Invoice)
             .where(
                 InvoiceLineItem.period_start_date.isnot(None),
                 InvoiceLineItem.period_end_date.isnot(None),
-                InvoiceLineItem.period_start_date <= target_month_end,
-                InvoiceLineItem.period_end_date >= target_month_start
+                InvoiceLineItem.period_start_date <= months[-1][4],
+                InvoiceLineItem.period_end_date >= months[0][3]
             )
-            .options(selectinload(InvoiceLineItem.invoice))
         )
-        line_items = result.scalars().all()
-
-        total_mrr = sum(float(item.mrr_per_month or 0) for item in line_items)
-        unique_customers = len(set(item.invoice.customer_id for item in line_items))
-
-        print(f"Total Invoice-based MRR (September 2025): {total_mrr:,.2f} NOK")
-        print(f"Total Customers: {unique_customers}")
-        print(f"Total Line Items: {len(line_items)}")
-
-        # Show breakdown by transaction type
-        invoices_mrr = sum(float(item.mrr_per_month or 0) for item in line_items if item.invoice.transaction_type == 'invoice')
-        creditnotes_mrr = sum(float(item.mrr_per_month or 0) for item in line_items if item.invoice.transaction_type == 'creditnote')
-
-        print(f"\nBreakdown:")
-        print(f"  Invoices MRR: {invoices_mrr:,.2f} NOK")
-        print(f"  Credit Notes MRR: {creditnotes_mrr:,.2f} NOK")
-        print(f"  Net MRR: {invoices_mrr + creditnotes_mrr:,.2f} NOK")
-
-    # Now calculate OCTOBER for comparison
-    print("\n\n[5] OUR OCTOBER 2025 CALCULATION")
-    print("-"*80)
+        lines = pd.DataFrame.from_records(result.all(), columns=[
+            *[month_name for _, _, month_name, _, _ in months], 'mrr_per_month', 'customer_id', 'transaction_type'
+        ])
+        lines['mrr_per_month'] = lines['mrr_per_month'].fillna(0).astype(float)
 
-    target_month_start = datetime(2025, 10, 1)
-    target_month_end = datetime(2025, 10, 31)
+    for section, heading, month_name, _, _ in months:
+        print(f"\n\n{section} OUR {heading} 2025 CALCULATION")
+        print("-"*80)
 
-    async with AsyncSessionLocal() as session:
-        result = await session.execute(
-            select(InvoiceLineItem)
-            .join(Invoice)
-            .where(
-                InvoiceLineItem.period_start_date.isnot(None),
-                InvoiceLineItem.period_end_date.isnot(None),
-                InvoiceLineItem.period_start_date <= target_month_end,
-                InvoiceLineItem.period_end_date >= target_month_start
-            )
-            .options(selectinload(InvoiceLineItem.invoice))
-        )
-        line_items = result.scalars().all()
+        # Line items with periods that overlap the month
+        line_items = lines[lines[month_name].astype(bool)]
 
-        total_mrr = sum(float(item.mrr_per_month or 0) for item in line_items)
-        unique_customers = len(set(item.invoice.customer_id for item in line_items))
+        total_mrr = line_items['mrr_per_month'].sum()
+        unique_customers = line_items['customer_id'].nunique(dropna=False)
 
-        print(f"Total Invoice-based MRR (October 2025): {total_mrr:,.2f} NOK")
+        print(f"Total Invoice-based MRR ({month_name} 2025): {total_mrr:,.2f} NOK")
         print(f"Total Customers: {unique_customers}")
         print(f"Total Line Items: {len(line_items)}")
 
         # Show breakdown by transaction type
-        invoices_mrr = sum(float(item.mrr_per_month or 0) for item in line_items if item.invoice.transaction_type == 'invoice')
-        creditnotes_mrr = sum(float(item.mrr_per_month or 0) for item in line_items if item.invoice.transaction_type == 'creditnote')
+        mrr_by_type = line_items.groupby('transaction_type')['mrr_per_month'].sum()
+        invoices_mrr = mrr_by_type.get('invoice', 0)
+        creditnotes_mrr = mrr_by_type.get('creditnote', 0)
 
         print(f"\nBreakdown:")
         print(f"  Invoices MRR: {invoices_mrr:,.2f} NOK")
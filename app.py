@@ -1,26 +1,48 @@
 # Invoice drilldown feature added
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, BackgroundTasks, FastAPI, Depends, HTTPException, UploadFile, File
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.requests import Request
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import bindparam, exists, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from collections import Counter
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional
-from pydantic import BaseModel
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
+from functools import lru_cache, partial
+from typing import Any, List, Optional
+from dateutil import parser as date_parser
+from dateutil.relativedelta import relativedelta
+from pydantic import BaseModel, ConfigDict
+import asyncio
+import calendar
+import heapq
+import httpx
+import logging
+import os
+import re
+import shutil
+import tempfile
 # Reload: database column added to data/app.db
 
 from config import settings
-from database import init_db, get_session
+from dates import month_end_snapshot
+from database import init_db, get_session, AsyncSessionLocal, engine
 from services import ZohoClient, MetricsCalculator, AnalysisService, ZohoReportImporter, InvoiceService, InvoiceSyncService
 from services.accounting import AccountingService
 from services.product_config import ProductConfigService
-from models.subscription import Subscription, MetricsSnapshot, SyncStatus, MonthlyMRRSnapshot
+from models.subscription import Subscription, MetricsSnapshot, SyncStatus, MonthlyMRRSnapshot, match_key
 from models.invoice import Invoice, InvoiceLineItem, InvoiceMRRSnapshot
-from auth import verify_credentials
+from auth import verify_credentials, verify_api_auth
+
+logger = logging.getLogger(__name__)
+if settings.app_env == "dev":
+    # Sync diagnostics (sample payloads etc.) are logged at DEBUG in dev only
+    logging.basicConfig(level=logging.INFO)
+    logger.setLevel(logging.DEBUG)
+
 
 # Helper function for safe printing (Windows console Unicode handling)
 def safe_print(message: str):
@@ -41,189 +63,442 @@ sync_progress = {
     "message": "",
     "created": 0,
     "updated": 0,
+    # Progress of each sync phase (the phases can run concurrently - see update_sync_progress)
+    "phases": {},
 }
 
+PHASE_PROGRESS_FIELDS = ("stage", "current", "total", "percentage", "message", "created", "updated")
+
 def update_sync_progress(stage: str = None, current: int = None, total: int = None,
-                         message: str = None, created: int = None, updated: int = None):
-    """Update global sync progress"""
+                         message: str = None, created: int = None, updated: int = None,
+                         phase: str = None):
+    """
+    Update global sync progress
+
+    Sync phases that can run concurrently pass their phase name: their values go to
+    sync_progress["phases"][phase], and the top-level fields follow one phase at a
+    time (the first one still running), so two phases never mix stage and counts.
+    """
+    if phase is None:
+        progress = sync_progress
+    else:
+        progress = sync_progress["phases"].setdefault(phase, {
+            "stage": phase, "current": 0, "total": 0, "percentage": 0,
+            "message": "", "created": 0, "updated": 0, "done": False,
+        })
+
     if stage is not None:
-        sync_progress["stage"] = stage
+        progress["stage"] = stage
     if current is not None:
-        sync_progress["current"] = current
+        progress["current"] = current
     if total is not None:
-        sync_progress["total"] = total
+        progress["total"] = total
     if message is not None:
-        sync_progress["message"] = message
+        progress["message"] = message
     if created is not None:
-        sync_progress["created"] = created
+        progress["created"] = created
     if updated is not None:
-        sync_progress["updated"] = updated
+        progress["updated"] = updated
 
     # Recalculate percentage using stored values (not parameters)
-    stored_current = sync_progress.get("current", 0)
-    stored_total = sync_progress.get("total", 0)
+    stored_current = progress.get("current", 0)
+    stored_total = progress.get("total", 0)
     if stored_total and stored_total > 0:
-        sync_progress["percentage"] = round((stored_current / stored_total) * 100, 1)
+        progress["percentage"] = round((stored_current / stored_total) * 100, 1)
     else:
-        sync_progress["percentage"] = 0
+        progress["percentage"] = 0
+
+    if phase is not None:
+        _show_running_phase()
+
+
+def finish_sync_phase(phase: str):
+    """Mark a sync phase as done, so the top-level progress moves on to the next running phase"""
+    if phase in sync_progress["phases"]:
+        sync_progress["phases"][phase]["done"] = True
+        _show_running_phase()
+
+
+def _show_running_phase():
+    """Copy the first phase that is still running to the top-level progress fields"""
+    for progress in sync_progress["phases"].values():
+        if not progress["done"]:
+            sync_progress.update({field: progress[field] for field in PHASE_PROGRESS_FIELDS})
+            return
 
-# Global scheduler instance
-scheduler = AsyncIOScheduler()
+# Daily sync runs at 08:00 local time
+DAILY_SYNC_HOUR = 8
+
+# Subscriptions listed by /api/mrr-breakdown (largest MRR first)
+TOP_SUBSCRIPTIONS_LIMIT = 100
+
+# Rows per COPY batch on a full subscription sync (Zoho pages hold 200)
+SUBSCRIPTION_COPY_BATCH_SIZE = 5000
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_str(date_str: str):
+    """Parse a Zoho date string (cached - the same timestamps repeat across a sync)"""
+    try:
+        # Zoho sends ISO 8601 ("2025-01-02T10:00:00+0100" or "2025-01-02")
+        dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+    except ValueError:
+        if "T" in date_str:
+            raise
+        # Anything else that isn't a timestamp: let dateutil try
+        dt = date_parser.parse(date_str)
+    # Remove timezone info for PostgreSQL compatibility
+    return dt.replace(tzinfo=None)
+
+
+def parse_date(date_value):
+    """Parse a date from the Zoho API (datetime or string) to a naive datetime, None if missing/invalid"""
+    if not date_value:
+        return None
+    try:
+        # If already a datetime object (from Zoho API), just strip timezone
+        if isinstance(date_value, datetime):
+            return date_value.replace(tzinfo=None)
+        return _parse_date_str(str(date_value).strip())
+    except Exception as e:
+        logger.warning("Failed to parse date %r: %s", date_value, e)
+        return None
+
+
+# Zoho custom field label/id -> subscription column
+CUSTOM_FIELD_COLUMNS = {
+    "Fartøy": "vessel_name",
+    "Kallesignal": "call_sign",
+    "Radiokallesignal": "call_sign",
+}
+
+
+class ZohoSubscriptionIn(BaseModel):
+    """Fields of a Zoho subscription used by the sync, coerced once by pydantic"""
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    subscription_id: str
+    customer_id: Optional[str] = ""
+    customer_name: Optional[str] = ""
+    plan_code: Optional[str] = ""
+    plan_name: Optional[str] = ""
+    status: Optional[str] = ""
+    amount: float = 0.0
+    currency_code: Optional[str] = "NOK"
+    # Note: Zoho sends interval as number and interval_unit as text (e.g. "months", "years")
+    interval: int = 1
+    interval_unit: Optional[str] = "months"
+    custom_fields: List[dict] = []
+    created_time: Any = None
+    activated_at: Any = None
+    cancelled_at: Any = None
+    expires_at: Any = None
+    scheduled_cancellation_date: Any = None
+
+
+def subscription_row(sub_data: dict, synced_at: datetime) -> dict:
+    """Subscription column values from a Zoho subscription (synced_at is shared by the whole page)"""
+    sub = ZohoSubscriptionIn.model_validate(sub_data)
+    expires_at = parse_date(sub.expires_at)
+
+    # For non_renewing subscriptions, use scheduled_cancellation_date as expiry date
+    if sub.status == "non_renewing":
+        scheduled_cancellation = parse_date(sub.scheduled_cancellation_date)
+        if scheduled_cancellation:
+            expires_at = scheduled_cancellation
+
+    # Extract custom fields (vessel and call sign) - one dict lookup per field
+    custom_values = {}
+    for field in sub.custom_fields:
+        column = CUSTOM_FIELD_COLUMNS.get(field.get("label")) or CUSTOM_FIELD_COLUMNS.get(field.get("customfield_id"))
+        if column:
+            custom_values[column] = field.get("value")
+    vessel_name = custom_values.get("vessel_name")
+    call_sign = custom_values.get("call_sign")
+
+    return {
+        "id": sub.subscription_id,
+        "customer_id": sub.customer_id,
+        "customer_name": sub.customer_name,
+        "plan_code": sub.plan_code,
+        "plan_name": sub.plan_name,
+        "status": sub.status,
+        "amount": sub.amount,
+        "currency_code": sub.currency_code,
+        # Stored swapped: the interval column holds the unit, interval_unit the number
+        "interval": sub.interval_unit,  # "months" or "years"
+        "interval_unit": sub.interval,  # 1, 2, 3, etc.
+        "vessel_name": vessel_name,
+        "call_sign": call_sign,
+        # Bulk upserts bypass the ORM listeners that normally set the match keys
+        "call_sign_key": match_key(call_sign),
+        "vessel_key": match_key(vessel_name),
+        "created_time": parse_date(sub.created_time),
+        "activated_at": parse_date(sub.activated_at),
+        "cancelled_at": parse_date(sub.cancelled_at),
+        "expires_at": expires_at,
+        "last_synced": synced_at,
+    }
+
+
+def last_month_ends(months: int) -> list:
+    """(month_str, month-end snapshot date) for the current month and the months before it"""
+    today = datetime.utcnow()
+    month_ends = []
+    for i in range(months):
+        month_date = today - relativedelta(months=i)
+        month_ends.append((month_date.strftime("%Y-%m"), month_end_snapshot(month_date.year, month_date.month)))
+    return month_ends
+
+
+async def upsert_subscriptions(session: AsyncSession, rows: list) -> int:
+    """
+    Insert or update a page of subscription rows in one statement (ON CONFLICT on id)
+
+    Rows must have unique ids. Columns not in the rows are left untouched on update.
+
+    Returns:
+        Number of rows that were new
+    """
+    ids = [row["id"] for row in rows]
+    result = await session.execute(select(Subscription.id).where(Subscription.id.in_(ids)))
+    existing = set(result.scalars())
+
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(Subscription).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Subscription.id],
+        set_={name: stmt.excluded[name] for name in rows[0] if name != "id"},
+    )
+    await session.execute(stmt)
+
+    return len(ids) - len(existing)
+
+
+async def upsert_monthly_snapshots(session: AsyncSession, rows: list, update_columns: list) -> set:
+    """
+    Insert or update monthly snapshots in one statement (ON CONFLICT on month)
+
+    New months get every column in the rows; existing ones only update_columns
+    (and updated_at). Rows must have unique months and the same keys.
+
+    Returns:
+        Months that already had a snapshot
+    """
+    months = [row["month"] for row in rows]
+    result = await session.execute(select(MonthlyMRRSnapshot.month).where(MonthlyMRRSnapshot.month.in_(months)))
+    existing = set(result.scalars())
+
+    insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(MonthlyMRRSnapshot).values(rows)
+    set_ = {name: stmt.excluded[name] for name in update_columns}
+    # onupdate defaults don't fire for ON CONFLICT DO UPDATE
+    set_["updated_at"] = datetime.utcnow()
+    stmt = stmt.on_conflict_do_update(index_elements=[MonthlyMRRSnapshot.month], set_=set_)
+    await session.execute(stmt)
+
+    return existing
+
+
+async def copy_upsert_subscriptions(session: AsyncSession, rows: list) -> int:
+    """
+    Full-sync variant of upsert_subscriptions for PostgreSQL
+
+    COPYs all rows into a temporary staging table (dropped on commit), then
+    merges them with a single INSERT ... SELECT ... ON CONFLICT (id) DO UPDATE.
+    Rows must have unique ids.
+
+    Returns:
+        Number of rows that were new
+    """
+    columns = list(rows[0])
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    updates = ", ".join(f'"{name}" = EXCLUDED."{name}"' for name in columns if name != "id")
+
+    await session.execute(text(
+        "CREATE TEMP TABLE subscriptions_stage (LIKE subscriptions INCLUDING DEFAULTS) ON COMMIT DROP"
+    ))
+
+    # COPY through the asyncpg connection behind the session (same transaction)
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        "subscriptions_stage",
+        records=[tuple(row[name] for name in columns) for row in rows],
+        columns=columns,
+    )
+
+    result = await session.execute(text(
+        "SELECT count(*) FROM subscriptions_stage s "
+        "WHERE NOT EXISTS (SELECT 1 FROM subscriptions t WHERE t.id = s.id)"
+    ))
+    created = result.scalar()
+
+    await session.execute(text(
+        f"INSERT INTO subscriptions ({column_list}) SELECT {column_list} FROM subscriptions_stage "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}"
+    ))
+
+    return created
+
+
+async def skipped_sync_phase(name: str, result):
+    """Placeholder for a sync phase that is disabled"""
+    print(f"\n=== {name} sync skipped (disabled) ===")
+    return result
+
+
+async def run_sync_phases(*phases) -> list:
+    """
+    Run independent sync phases concurrently, so their Zoho round-trips overlap
+
+    SQLite allows a single writer, and the invoice sync keeps a write transaction
+    open between API pages, so there the phases run one after the other.
+    """
+    if engine.dialect.name == "sqlite":
+        try:
+            return [await phase for phase in phases]
+        finally:
+            # After a failure the later phases never ran - close them, or Python warns
+            # "coroutine was never awaited" (no-op for the ones that finished)
+            for phase in phases:
+                phase.close()
+    # A TaskGroup cancels the sibling phases as soon as one fails, so none keeps
+    # writing after the sync has already been reported as failed
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(phase) for phase in phases]
+    except* Exception as eg:
+        raise eg.exceptions[0]
+    return [task.result() for task in tasks]
 
 
 async def auto_sync_job():
     """
     Automatic daily sync job
     Runs subscriptions and invoices sync
+
+    Returns:
+        True if the sync completed, False if it failed (the error is logged)
     """
     print("\n" + "="*80)
     print(f"[AUTO SYNC] STARTED at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*80)
 
     try:
-        from database import AsyncSessionLocal
+        # Shared client (keeps its access token and connection pool)
+        zoho = await get_zoho_client()
 
+        # Last successful sync (for the incremental subscription fetch)
+        from sqlalchemy import desc
+        stmt = select(SyncStatus).where(SyncStatus.success == True).order_by(desc(SyncStatus.last_sync_time)).limit(1)
         async with AsyncSessionLocal() as session:
-            # Initialize clients
-            zoho = ZohoClient(
-                client_id=settings.zoho_client_id,
-                client_secret=settings.zoho_client_secret,
-                refresh_token=settings.zoho_refresh_token,
-                org_id=settings.zoho_org_id,
-                base_url=settings.zoho_base
-            )
-
-            # 1. Sync subscriptions (incremental)
-            print("\n[SUBSCRIPTIONS] Syncing...")
-            from sqlalchemy import select, desc
-            stmt = select(SyncStatus).where(SyncStatus.success == True).order_by(desc(SyncStatus.last_sync_time)).limit(1)
             result = await session.execute(stmt)
             last_sync = result.scalar_one_or_none()
 
-            last_modified_time = None
-            if last_sync:
-                last_modified_time = last_sync.last_sync_time.strftime("%Y-%m-%dT%H:%M:%S")
-                print(f"  Incremental sync since {last_modified_time}")
+        last_modified_time = None
+        if last_sync:
+            last_modified_time = last_sync.last_sync_time.strftime("%Y-%m-%dT%H:%M:%S")
+            print(f"  Incremental sync since {last_modified_time}")
 
-            zoho_subs = await zoho.get_all_subscriptions(last_modified_time=last_modified_time)
+        async def sync_subscription_pages():
+            # 1. Sync subscriptions (incremental)
+            print("\n[SUBSCRIPTIONS] Syncing...")
 
+            # (Same subscription sync logic as in the endpoint) - stream Zoho pages and
+            # upsert each one in a short session (latest payload wins for repeated ids)
             synced_count = 0
-            for sub_data in zoho_subs:
-                # (Same subscription sync logic as in the endpoint)
-                def parse_date(date_value):
-                    if not date_value:
-                        return None
-                    try:
-                        if isinstance(date_value, datetime):
-                            return date_value.replace(tzinfo=None)
-                        date_str = str(date_value).strip()
-                        if "T" in date_str:
-                            dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-                            return dt.replace(tzinfo=None)
-                        else:
-                            from dateutil import parser
-                            dt = parser.parse(date_str)
-                            return dt.replace(tzinfo=None)
-                    except Exception as e:
-                        print(f"Warning: Failed to parse date '{date_value}': {e}")
-                        return None
-
-                created_time = parse_date(sub_data.get("created_time"))
-                activated_at = parse_date(sub_data.get("activated_at"))
-                cancelled_at = parse_date(sub_data.get("cancelled_at"))
-                expires_at = parse_date(sub_data.get("expires_at"))
-
-                if sub_data.get("status") == "non_renewing":
-                    scd_raw = sub_data.get("scheduled_cancellation_date")
-                    scheduled_cancellation = parse_date(scd_raw)
-                    if scheduled_cancellation:
-                        expires_at = scheduled_cancellation
-
-                vessel_name = None
-                call_sign = None
-                custom_fields = sub_data.get("custom_fields", [])
-                for field in custom_fields:
-                    label = field.get("label", "")
-                    if label == "Fartøy" or field.get("customfield_id") == "Fartøy":
-                        vessel_name = field.get("value")
-                    elif label in ["Kallesignal", "Radiokallesignal"] or field.get("customfield_id") in ["Kallesignal", "Radiokallesignal"]:
-                        call_sign = field.get("value")
-
-                subscription = await session.get(Subscription, sub_data["subscription_id"])
-
-                if subscription:
-                    subscription.customer_id = sub_data.get("customer_id", "")
-                    subscription.customer_name = sub_data.get("customer_name", "")
-                    subscription.plan_code = sub_data.get("plan_code", "")
-                    subscription.plan_name = sub_data.get("plan_name", "")
-                    subscription.status = sub_data.get("status", "")
-                    subscription.amount = float(sub_data.get("amount", 0))
-                    subscription.currency_code = sub_data.get("currency_code", "NOK")
-                    subscription.interval = sub_data.get("interval_unit", "months")
-                    subscription.interval_unit = int(sub_data.get("interval", 1))
-                    subscription.vessel_name = vessel_name
-                    subscription.call_sign = call_sign
-                    subscription.created_time = created_time
-                    subscription.activated_at = activated_at
-                    subscription.cancelled_at = cancelled_at
-                    subscription.expires_at = expires_at
-                    subscription.last_synced = datetime.utcnow()
-                else:
-                    subscription = Subscription(
-                        id=sub_data["subscription_id"],
-                        customer_id=sub_data.get("customer_id", ""),
-                        customer_name=sub_data.get("customer_name", ""),
-                        plan_code=sub_data.get("plan_code", ""),
-                        plan_name=sub_data.get("plan_name", ""),
-                        status=sub_data.get("status", ""),
-                        amount=float(sub_data.get("amount", 0)),
-                        currency_code=sub_data.get("currency_code", "NOK"),
-                        interval=sub_data.get("interval_unit", "months"),
-                        interval_unit=int(sub_data.get("interval", 1)),
-                        vessel_name=vessel_name,
-                        call_sign=call_sign,
-                        created_time=created_time,
-                        activated_at=activated_at,
-                        cancelled_at=cancelled_at,
-                        expires_at=expires_at,
-                    )
-                    session.add(subscription)
-
-                synced_count += 1
-
-            # Save sync status
-            sync_status = SyncStatus(
-                last_sync_time=datetime.utcnow(),
-                subscriptions_synced=synced_count,
-                success=True,
-            )
-            session.add(sync_status)
-            await session.commit()
+            async for zoho_page in zoho.iter_subscriptions(last_modified_time=last_modified_time):
+                synced_at = datetime.utcnow()
+                rows = list({row["id"]: row for row in (subscription_row(sub, synced_at) for sub in zoho_page)}.values())
+                async with AsyncSessionLocal() as session:
+                    await upsert_subscriptions(session, rows)
+                    await session.commit()
+                synced_count += len(zoho_page)
+
+            now = datetime.utcnow()
+            async with AsyncSessionLocal() as session:
+                # Save sync status
+                sync_status = SyncStatus(
+                    last_sync_time=now,
+                    subscriptions_synced=synced_count,
+                    success=True,
+                )
+                session.add(sync_status)
+                await session.commit()
 
-            print(f"  [OK] Synced {synced_count} subscriptions")
+                print(f"  [OK] Synced {synced_count} subscriptions")
 
-            # Update snapshots
-            calculator = MetricsCalculator(session)
-            current_month = datetime.utcnow().strftime("%Y-%m")
-            await calculator.save_monthly_snapshot(current_month, datetime.utcnow())
-            print(f"  [OK] Updated snapshot for {current_month}")
+                # Update snapshots
+                calculator = MetricsCalculator(session)
+                current_month = now.strftime("%Y-%m")
+                await calculator.save_monthly_snapshot(current_month, now)
+                print(f"  [OK] Updated snapshot for {current_month}")
 
+        async def sync_recent_invoices():
             # 2. Sync invoices (last 7 days)
             print("\n[INVOICES] Syncing...")
-            invoice_sync_service = InvoiceSyncService(session, zoho)
             since = datetime.utcnow() - timedelta(days=7)
-            invoice_stats = await invoice_sync_service.sync_incremental(since=since)
+            async with AsyncSessionLocal() as session:
+                invoice_sync_service = InvoiceSyncService(session, zoho)
+                invoice_stats = await invoice_sync_service.sync_incremental(since=since)
 
             print(f"  [OK] Synced {invoice_stats['invoices_synced']} invoices, {invoice_stats['creditnotes_synced']} credit notes")
 
-            print("\n[AUTO SYNC] COMPLETED SUCCESSFULLY")
-            print("="*80 + "\n")
+        # Independent Zoho resources and tables - overlap them where the database allows it
+        await run_sync_phases(sync_subscription_pages(), sync_recent_invoices())
+
+        print("\n[AUTO SYNC] COMPLETED SUCCESSFULLY")
+        print("="*80 + "\n")
+        return True
 
     except Exception as e:
         print(f"\n[ERROR] AUTO SYNC FAILED: {str(e)}")
         import traceback
         traceback.print_exc()
         print("="*80 + "\n")
+        return False
+
+
+_zoho_singleton: Optional[ZohoClient] = None
+
+
+async def get_zoho_client() -> ZohoClient:
+    """
+    Dependency for Zoho client
+
+    One client for the whole app, so the access token and the keep-alive
+    connections are reused across syncs instead of set up on every request.
+    """
+    global _zoho_singleton
+    if _zoho_singleton is None:
+        _zoho_singleton = ZohoClient(
+            client_id=settings.zoho_client_id,
+            client_secret=settings.zoho_client_secret,
+            refresh_token=settings.zoho_refresh_token,
+            org_id=settings.zoho_org_id,
+            base_url=settings.zoho_base,
+            http_client=httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(max_keepalive_connections=20),
+            ),
+        )
+    return _zoho_singleton
+
+
+async def daily_sync_loop():
+    """Run auto_sync_job every day at DAILY_SYNC_HOUR:00 (a plain asyncio task - one job needs no scheduler)"""
+    while True:
+        now = datetime.now()
+        next_run = now.replace(hour=DAILY_SYNC_HOUR, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+
+        try:
+            await auto_sync_job()
+        except Exception:
+            logger.exception("Daily sync failed")
 
 
 @asynccontextmanager
@@ -232,22 +507,24 @@ async def lifespan(app: FastAPI):
     # Startup
     await init_db()
 
-    # Start scheduler with daily sync at 08:00
-    scheduler.add_job(
-        auto_sync_job,
-        trigger=CronTrigger(hour=8, minute=0),  # 08:00 every day
-        id='daily_sync',
-        name='Daily Zoho Sync at 08:00',
-        replace_existing=True
-    )
-    scheduler.start()
-    print("[SCHEDULER] Started - Daily sync at 08:00")
+    # Start the daily sync at 08:00 - unless an external scheduler calls /api/auto-sync
+    # (with several workers every process would run its own loop)
+    daily_sync_task = None
+    if settings.auto_sync_enabled:
+        daily_sync_task = asyncio.create_task(daily_sync_loop())
+        print(f"[SCHEDULER] Started - Daily sync at {DAILY_SYNC_HOUR:02d}:00")
+    else:
+        print("[SCHEDULER] Disabled - daily sync is triggered externally via /api/auto-sync")
 
     yield
 
     # Shutdown
-    scheduler.shutdown()
-    print("[SCHEDULER] Stopped")
+    if daily_sync_task is not None:
+        daily_sync_task.cancel()
+        print("[SCHEDULER] Stopped")
+
+    if _zoho_singleton is not None:
+        await _zoho_singleton.aclose()
 
 
 app = FastAPI(
@@ -260,68 +537,50 @@ app = FastAPI(
 templates = Jinja2Templates(directory="templates")
 
 
-# Authentication middleware for all /api/* routes
-@app.middleware("http")
-async def auth_middleware(request: Request, call_next):
-    """Require Basic Auth for all /api/* routes if credentials are configured"""
-    # Only protect /api/* routes
-    if request.url.path.startswith("/api/"):
-        # Check if auth is configured
-        if settings.auth_username and settings.auth_password:
-            # Verify credentials
-            from auth import verify_credentials
-            from fastapi.security import HTTPBasic, HTTPBasicCredentials
-            import base64
+# All /api/* routes - Basic Auth runs as a router dependency, so pages and static files skip it
+api = APIRouter(prefix="/api", dependencies=[Depends(verify_api_auth)])
 
-            # Get Authorization header
-            auth_header = request.headers.get("Authorization")
-            if not auth_header or not auth_header.startswith("Basic "):
-                from fastapi.responses import Response
-                return Response(
-                    content="Authentication required",
-                    status_code=401,
-                    headers={"WWW-Authenticate": "Basic realm=\"SaaS Analytics\""}
-                )
 
-            # Decode credentials
-            try:
-                credentials_b64 = auth_header.split(" ")[1]
-                credentials_str = base64.b64decode(credentials_b64).decode("utf-8")
-                username, password = credentials_str.split(":", 1)
-
-                # Verify
-                import secrets
-                username_correct = secrets.compare_digest(username, settings.auth_username)
-                password_correct = secrets.compare_digest(password, settings.auth_password)
-
-                if not (username_correct and password_correct):
-                    from fastapi.responses import Response
-                    return Response(
-                        content="Invalid credentials",
-                        status_code=401,
-                        headers={"WWW-Authenticate": "Basic realm=\"SaaS Analytics\""}
-                    )
-            except Exception:
-                from fastapi.responses import Response
-                return Response(
-                    content="Invalid authentication",
-                    status_code=401,
-                    headers={"WWW-Authenticate": "Basic realm=\"SaaS Analytics\""}
-                )
+# Ids per IN (...) lookup of already-stored invoices/credit notes (stays under driver parameter limits)
+EXISTING_ID_BATCH_SIZE = 1000
 
-    response = await call_next(request)
-    return response
 
+# month -> (exists, checked_at) for the missing snapshot warning on the dashboard/documents pages.
+# Cleared whenever snapshots are synced, imported or deleted
+SNAPSHOT_EXISTS_TTL = timedelta(minutes=10)
+_snapshot_exists_cache: dict = {}
 
-def get_zoho_client() -> ZohoClient:
-    """Dependency for Zoho client"""
-    return ZohoClient(
-        client_id=settings.zoho_client_id,
-        client_secret=settings.zoho_client_secret,
-        refresh_token=settings.zoho_refresh_token,
-        org_id=settings.zoho_org_id,
-        base_url=settings.zoho_base,
-    )
+
+async def snapshot_exists(session: AsyncSession, month_str: str) -> bool:
+    """Whether a monthly snapshot exists for a month (cached for SNAPSHOT_EXISTS_TTL)"""
+    now = datetime.utcnow()
+    cached = _snapshot_exists_cache.get(month_str)
+    if cached and now - cached[1] < SNAPSHOT_EXISTS_TTL:
+        return cached[0]
+
+    # EXISTS - the database stops at the first index match and returns only a boolean
+    stmt = select(exists().where(MonthlyMRRSnapshot.month == month_str))
+    found = bool((await session.execute(stmt)).scalar())
+    _snapshot_exists_cache[month_str] = (found, now)
+    return found
+
+
+async def execute_concurrently(session: AsyncSession, *statements) -> list:
+    """
+    Execute independent read-only statements concurrently, so their round-trips overlap
+
+    One AsyncSession can't run statements concurrently, so each gets its own short
+    session (and pooled connection). On SQLite the statements run in order on the
+    request session instead. Results are buffered and usable after the session closes.
+    """
+    if engine.dialect.name == "sqlite":
+        return [await session.execute(stmt) for stmt in statements]
+
+    async def execute(stmt):
+        async with AsyncSessionLocal() as own_session:
+            return await own_session.execute(stmt)
+
+    return list(await asyncio.gather(*(execute(stmt) for stmt in statements)))
 
 
 def get_analysis_service() -> AnalysisService:
@@ -394,10 +653,169 @@ async def import_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/api/sync")
+async def sync_subscription_data(zoho: ZohoClient, last_modified_time: Optional[str]) -> int:
+    """Subscription part of /api/sync: stream from Zoho, upsert, update snapshots. Returns the synced count"""
+    synced_count = 0
+
+    update_sync_progress(stage="subscriptions", message="Henter subscriptions fra Zoho...", current=0, total=0,
+                         phase="subscriptions")
+
+    # Fetch subscriptions from Zoho (all statuses, including cancelled, to get accurate historical data)
+    # Note: We don't filter by status so we can track cancelled subscriptions for accurate churn
+    print("\n=== Syncing subscriptions ===")
+    print(f"Fetching all subscriptions from Zoho...")
+    if last_modified_time:
+        print(f"  (modified since {last_modified_time})")
+
+    created_count = 0
+    updated_count = 0
+    saved_count = 0
+    # Full sync on PostgreSQL: COPY through the staging table. Every COPY sets up its own
+    # temp table, so rows are buffered across Zoho pages into large batches first
+    use_copy = not last_modified_time and engine.dialect.name == "postgresql"
+    copy_rows = {}
+
+    async def save(rows: dict) -> int:
+        """Upsert rows (id -> row) in a short session. Returns the number of new subscriptions"""
+        async with AsyncSessionLocal() as session:
+            if use_copy:
+                created = await copy_upsert_subscriptions(session, list(rows.values()))
+            else:
+                created = await upsert_subscriptions(session, list(rows.values()))
+            await session.commit()
+        return created
+
+    # Stream Zoho page by page and upsert as the pages arrive - memory stays at one
+    # page (one COPY batch on a full PostgreSQL sync), and a session is only held while writing
+    async for zoho_page in zoho.iter_subscriptions(last_modified_time=last_modified_time):
+        # Log first subscription to see all available fields (only rendered at DEBUG level)
+        if synced_count == 0:
+            logger.debug("Sample Zoho subscription (first sub): %s", zoho_page[0])
+
+        # One upsert per page instead of a lookup + merge per subscription
+        # (latest payload wins for repeated ids)
+        synced_at = datetime.utcnow()
+        rows = {row["id"]: row for row in (subscription_row(sub, synced_at) for sub in zoho_page)}
+        if use_copy:
+            copy_rows.update(rows)
+            rows = None
+            if len(copy_rows) >= SUBSCRIPTION_COPY_BATCH_SIZE:
+                rows, copy_rows = copy_rows, {}
+        if rows:
+            created_count += await save(rows)
+            saved_count += len(rows)
+
+        synced_count += len(zoho_page)
+        updated_count = saved_count - created_count
+        print(f"  Progress: {synced_count} fetched, {saved_count} saved - Created: {created_count}, Updated: {updated_count}")
+        # Zoho doesn't send a total count, so the phase has no total while streaming
+        update_sync_progress(
+            current=synced_count, created=created_count, updated=updated_count,
+            message=f"Synkroniserer subscriptions... ({synced_count} hentet)", phase="subscriptions",
+        )
+
+    if copy_rows:
+        created_count += await save(copy_rows)
+        saved_count += len(copy_rows)
+        updated_count = saved_count - created_count
+
+    print(f"Total subscriptions fetched: {synced_count}")
+
+    # Summary log
+    print(f"\n{'='*60}")
+    safe_print(f"✓ Subscription sync complete")
+    print(f"{'='*60}")
+    print(f"Total processed: {synced_count}")
+    print(f"  - New subscriptions: {created_count}")
+    print(f"  - Updated subscriptions: {updated_count}")
+
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        # Save sync status
+        sync_status = SyncStatus(
+            last_sync_time=now,
+            subscriptions_synced=synced_count,
+            success=True,
+        )
+        session.add(sync_status)
+
+        await session.commit()
+
+        # A full sync regenerates the historical snapshots in the background (see /api/sync)
+        if last_modified_time:
+            # Incremental sync - just update current month
+            calculator = MetricsCalculator(session)
+            current_month = now.strftime("%Y-%m")
+            try:
+                await calculator.save_monthly_snapshot(current_month, now)
+                print(f"Updated snapshot for {current_month}")
+            except Exception as e:
+                print(f"Warning: Failed to save monthly snapshot: {e}")
+
+    finish_sync_phase("subscriptions")
+    return synced_count
+
+
+async def regenerate_snapshots(months: int):
+    """Regenerate the snapshots for the last months after a full sync (runs after the response is sent)"""
+    print("\n=== Generating historical snapshots ===")
+    month_ends = last_month_ends(months)
+    try:
+        async with AsyncSessionLocal() as session:
+            # One pass over the subscriptions for all months
+            await MetricsCalculator(session).save_monthly_snapshots(month_ends)
+        _snapshot_exists_cache.clear()
+        print(f"Generated {len(month_ends)} historical snapshots: {', '.join(m for m, _ in month_ends)}")
+    except Exception as e:
+        print(f"Warning: Failed to create historical snapshots: {e}")
+
+
+async def sync_invoice_data(zoho: ZohoClient, last_modified_time: Optional[str]) -> dict:
+    """Invoice/credit note part of /api/sync. Returns the InvoiceSyncService stats"""
+    print("\n=== Syncing invoices ===")
+    update_sync_progress(stage="invoices", message="Synkroniserer fakturaer og kreditnotaer...", current=0, total=1,
+                         phase="invoices")
+
+    # For incremental sync, only fetch last 7 days
+    # For full sync, fetch last 60 days (to avoid API limits)
+    now = datetime.utcnow()
+    if last_modified_time:
+        since = now - timedelta(days=7)
+        print(f"Syncing invoices modified since {since}")
+    else:
+        since = now - timedelta(days=60)
+        print(f"Full sync: Fetching invoices from last 60 days ({since})")
+
+    # The invoice sync interleaves API pages with writes, so it gets its own session
+    async with AsyncSessionLocal() as session:
+        invoice_sync_service = InvoiceSyncService(session, zoho)
+        invoice_stats = await invoice_sync_service.sync_incremental(
+            since=since, progress_callback=partial(update_sync_progress, phase="invoices")
+        )
+
+    print(f"Invoice sync complete: {invoice_stats['invoices_synced']} invoices, {invoice_stats['creditnotes_synced']} credit notes")
+    finish_sync_phase("invoices")
+
+    return invoice_stats
+
+
+@api.post("/auto-sync")
+async def trigger_auto_sync():
+    """
+    Run the daily sync job once
+
+    For an external scheduler (cron, systemd timer, Railway cron) when AUTO_SYNC_ENABLED=false,
+    so the job runs once per day no matter how many workers serve the app.
+    """
+    if not await auto_sync_job():
+        raise HTTPException(status_code=500, detail="Auto sync failed - see server logs")
+    return {"status": "success", "message": "Auto sync completed"}
+
+
+@api.post("/sync")
 async def sync_subscriptions(
+    background_tasks: BackgroundTasks,
     zoho: ZohoClient = Depends(get_zoho_client),
-    session: AsyncSession = Depends(get_session),
     force_full: bool = False,
     sync_subscriptions: bool = True,
     sync_invoices: bool = True,
@@ -420,8 +838,9 @@ async def sync_subscriptions(
         if not force_full:
             from sqlalchemy import select, desc
             stmt = select(SyncStatus).where(SyncStatus.success == True).order_by(desc(SyncStatus.last_sync_time)).limit(1)
-            result = await session.execute(stmt)
-            last_sync = result.scalar_one_or_none()
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(stmt)
+                last_sync = result.scalar_one_or_none()
 
             if last_sync:
                 # Format as ISO string for Zoho API
@@ -434,230 +853,46 @@ async def sync_subscriptions(
 
         # Mark sync as started
         sync_progress["is_syncing"] = True
-
-        # Initialize counters
-        synced_count = 0
-        invoice_stats = {"invoices_synced": 0, "creditnotes_synced": 0}
-
-        # === SUBSCRIPTION SYNC (if enabled) ===
-        if sync_subscriptions:
-            update_sync_progress(stage="subscriptions", message="Henter subscriptions fra Zoho...", current=0, total=1)
-
-            # Fetch subscriptions from Zoho (all statuses, including cancelled, to get accurate historical data)
-            # Note: We don't filter by status so we can track cancelled subscriptions for accurate churn
-            print("\n=== Syncing subscriptions ===")
-            print(f"Fetching all subscriptions from Zoho...")
-            if last_modified_time:
-                print(f"  (modified since {last_modified_time})")
-
-            zoho_subs = await zoho.get_all_subscriptions(last_modified_time=last_modified_time)
-            total_subs = len(zoho_subs)
-            print(f"Total subscriptions fetched: {total_subs}")
-
-            update_sync_progress(total=total_subs, current=0, message=f"Synkroniserer {total_subs} subscriptions...")
-
-            created_count = 0
-            updated_count = 0
-
-            # Log first subscription to see all available fields (only in debug mode)
-            if len(zoho_subs) > 0 and settings.app_env == "dev":
-                print("\n=== SAMPLE ZOHO SUBSCRIPTION (first sub) ===")
-                import json
-                print(json.dumps(zoho_subs[0], indent=2))
-                print("=" * 80 + "\n")
-
-            for sub_data in zoho_subs:
-                # Parse dates with better error handling
-                def parse_date(date_value):
-                    if not date_value:
-                        return None
-                    try:
-                        # If already a datetime object (from Zoho API), just strip timezone
-                        if isinstance(date_value, datetime):
-                            return date_value.replace(tzinfo=None)
-
-                        # Handle string formats from Zoho
-                        date_str = str(date_value).strip()
-                        if "T" in date_str:
-                            dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-                            # Remove timezone info for PostgreSQL compatibility
-                            return dt.replace(tzinfo=None)
-                        else:
-                            # Try parsing as date only
-                            from dateutil import parser
-                            dt = parser.parse(date_str)
-                            # Remove timezone info for PostgreSQL compatibility
-                            return dt.replace(tzinfo=None)
-                    except Exception as e:
-                        print(f"Warning: Failed to parse date '{date_value}': {e}")
-                        return None
-
-                created_time = parse_date(sub_data.get("created_time"))
-                activated_at = parse_date(sub_data.get("activated_at"))
-                cancelled_at = parse_date(sub_data.get("cancelled_at"))
-                expires_at = parse_date(sub_data.get("expires_at"))
-
-                # For non_renewing subscriptions, use scheduled_cancellation_date as expiry date
-                if sub_data.get("status") == "non_renewing":
-                    scd_raw = sub_data.get("scheduled_cancellation_date")
-                    scheduled_cancellation = parse_date(scd_raw)
-                    if scheduled_cancellation:
-                        expires_at = scheduled_cancellation
-
-                # Extract custom fields (vessel and call sign)
-                vessel_name = None
-                call_sign = None
-                custom_fields = sub_data.get("custom_fields", [])
-                for field in custom_fields:
-                    label = field.get("label", "")
-                    if label == "Fartøy" or field.get("customfield_id") == "Fartøy":
-                        vessel_name = field.get("value")
-                    elif label in ["Kallesignal", "Radiokallesignal"] or field.get("customfield_id") in ["Kallesignal", "Radiokallesignal"]:
-                        call_sign = field.get("value")
-
-                # Create or update subscription using merge to avoid duplicate key errors
-                # Check if exists first to track created vs updated (disable autoflush to prevent premature INSERT)
-                with session.no_autoflush:
-                    existing = await session.get(Subscription, sub_data["subscription_id"])
-                    is_new = existing is None
-
-                # Create subscription object (merge will handle insert or update)
-                subscription = Subscription(
-                    id=sub_data["subscription_id"],
-                    customer_id=sub_data.get("customer_id", ""),
-                    customer_name=sub_data.get("customer_name", ""),
-                    plan_code=sub_data.get("plan_code", ""),
-                    plan_name=sub_data.get("plan_name", ""),
-                    status=sub_data.get("status", ""),
-                    amount=float(sub_data.get("amount", 0)),
-                    currency_code=sub_data.get("currency_code", "NOK"),
-                    # Note: Zoho sends interval as number and interval_unit as text (e.g. "months", "years")
-                    interval=sub_data.get("interval_unit", "months"),  # "months" or "years"
-                    interval_unit=int(sub_data.get("interval", 1)),  # 1, 2, 3, etc.
-                    vessel_name=vessel_name,
-                    call_sign=call_sign,
-                    created_time=created_time,
-                    activated_at=activated_at,
-                    cancelled_at=cancelled_at,
-                    expires_at=expires_at,
-                    last_synced=datetime.utcnow(),
-                )
-
-                # Use merge to handle both insert and update automatically
-                await session.merge(subscription)
-
-                if is_new:
-                    created_count += 1
-                else:
-                    updated_count += 1
-
-                synced_count += 1
-
-                # Commit every 50 subscriptions to avoid memory buildup and autoflush issues
-                if synced_count % 50 == 0:
-                    await session.commit()
-                    progress_pct = (synced_count / total_subs) * 100 if total_subs > 0 else 0
-                    print(f"  Progress: {synced_count}/{total_subs} ({progress_pct:.1f}%) - Created: {created_count}, Updated: {updated_count}")
-                    update_sync_progress(current=synced_count, created=created_count, updated=updated_count)
-
-            # Summary log
-            print(f"\n{'='*60}")
-            safe_print(f"✓ Subscription sync complete")
-            print(f"{'='*60}")
-            print(f"Total processed: {synced_count}")
-            print(f"  - New subscriptions: {created_count}")
-            print(f"  - Updated subscriptions: {updated_count}")
-
-            # Save sync status
-            sync_status = SyncStatus(
-                last_sync_time=datetime.utcnow(),
-                subscriptions_synced=synced_count,
-                success=True,
-            )
-            session.add(sync_status)
-
-            await session.commit()
-
-            # Automatically generate historical snapshots on full sync
-            calculator = MetricsCalculator(session)
-
-            if not last_modified_time:  # Full sync
-                print("\n=== Generating historical snapshots ===")
-                from dateutil.relativedelta import relativedelta
-
-                today = datetime.utcnow()
-                snapshots_created = []
-
-                # Generate snapshots for last 12 months
-                for i in range(12):
-                    month_date = today - relativedelta(months=i)
-                    end_of_month = datetime(month_date.year, month_date.month, 1) + relativedelta(months=1) - relativedelta(days=1)
-                    end_of_month = end_of_month.replace(hour=23, minute=59, second=59)
-
-                    month_str = month_date.strftime("%Y-%m")
-
-                    try:
-                        await calculator.save_monthly_snapshot(month_str, end_of_month)
-                        snapshots_created.append(month_str)
-                        print(f"Created snapshot for {month_str}")
-                    except Exception as e:
-                        print(f"Warning: Failed to create snapshot for {month_str}: {e}")
-
-                print(f"Generated {len(snapshots_created)} historical snapshots")
-            else:
-                # Incremental sync - just update current month
-                current_month = datetime.utcnow().strftime("%Y-%m")
-                try:
-                    await calculator.save_monthly_snapshot(current_month, datetime.utcnow())
-                    print(f"Updated snapshot for {current_month}")
-                except Exception as e:
-                    print(f"Warning: Failed to save monthly snapshot: {e}")
-        else:
-            # Subscription sync disabled
-            print("\n=== Subscription sync skipped (disabled) ===")
-
-        # === INVOICE/CREDIT NOTE SYNC (if enabled) ===
-        if sync_invoices or sync_creditnotes:
-            print("\n=== Syncing invoices ===")
-            update_sync_progress(stage="invoices", message="Synkroniserer fakturaer og kreditnotaer...", current=0, total=1)
-
-            invoice_sync_service = InvoiceSyncService(session, zoho)
-
-            # For incremental sync, only fetch last 7 days
-            # For full sync, fetch last 60 days (to avoid API limits)
-            if last_modified_time:
-                since = datetime.utcnow() - timedelta(days=7)
-                print(f"Syncing invoices modified since {since}")
-            else:
-                since = datetime.utcnow() - timedelta(days=60)
-                print(f"Full sync: Fetching invoices from last 60 days ({since})")
-
-            invoice_stats = await invoice_sync_service.sync_incremental(since=since, progress_callback=update_sync_progress)
-
-            print(f"Invoice sync complete: {invoice_stats['invoices_synced']} invoices, {invoice_stats['creditnotes_synced']} credit notes")
-        else:
-            # Invoice sync disabled
-            print("\n=== Invoice sync skipped (disabled) ===")
+        sync_progress["phases"] = {}
+
+        # Subscriptions and invoices are independent Zoho resources and tables -
+        # fetch and write them concurrently where the database allows it
+        synced_count, invoice_stats = await run_sync_phases(
+            sync_subscription_data(zoho, last_modified_time) if sync_subscriptions
+            else skipped_sync_phase("Subscription", 0),
+            sync_invoice_data(zoho, last_modified_time) if (sync_invoices or sync_creditnotes)
+            else skipped_sync_phase("Invoice", {"invoices_synced": 0, "creditnotes_synced": 0}),
+        )
 
         sync_type = "incremental" if last_modified_time else "full"
 
         # Save successful sync status to database
+        now = datetime.utcnow()
         try:
             sync_status = SyncStatus(
-                last_sync_time=datetime.utcnow(),
+                last_sync_time=now,
                 sync_type=sync_type,
                 subscriptions_synced=synced_count,
                 invoices_synced=invoice_stats['invoices_synced'],
                 creditnotes_synced=invoice_stats['creditnotes_synced'],
                 success=True,
             )
-            session.add(sync_status)
-            await session.commit()
+            async with AsyncSessionLocal() as session:
+                session.add(sync_status)
+                await session.commit()
             print(f"✓ Saved sync status to database")
         except Exception as e:
             print(f"Warning: Failed to save sync status: {e}")
             # Don't fail the sync if we can't save status
 
+        # Snapshots may have been created - re-check the missing snapshot warning
+        _snapshot_exists_cache.clear()
+
+        # A full subscription sync rebuilds the last 12 monthly snapshots - the response
+        # doesn't wait for them, they show up a few seconds later
+        if sync_subscriptions and not last_modified_time:
+            background_tasks.add_task(regenerate_snapshots, 12)
+
         # Mark sync as complete and update progress with detailed summary
         sync_progress["is_syncing"] = False
         sync_progress["last_sync_result"] = {
@@ -666,7 +901,7 @@ async def sync_subscriptions(
             "subscriptions": synced_count,
             "invoices": invoice_stats['invoices_synced'],
             "creditnotes": invoice_stats['creditnotes_synced'],
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": now.isoformat()
         }
 
         # Build completion message based on what was synced
@@ -708,8 +943,6 @@ async def sync_subscriptions(
         }
 
     except Exception as e:
-        await session.rollback()
-
         # Mark sync as failed
         sync_progress["is_syncing"] = False
         update_sync_progress(stage="error", message=f"Feil: {str(e)}")
@@ -725,8 +958,9 @@ async def sync_subscriptions(
                 success=False,
                 error_message=str(e),
             )
-            session.add(sync_status)
-            await session.commit()
+            async with AsyncSessionLocal() as session:
+                session.add(sync_status)
+                await session.commit()
         except:
             pass  # Don't fail on logging failure
 
@@ -740,7 +974,7 @@ async def sync_subscriptions(
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
-@app.get("/api/sync/progress")
+@api.get("/sync/progress")
 async def get_sync_progress():
     """
     Get current sync progress for real-time updates
@@ -748,7 +982,7 @@ async def get_sync_progress():
     return sync_progress
 
 
-@app.get("/api/sync/history")
+@api.get("/sync/history")
 async def get_sync_history(
     limit: int = 50,
     session: AsyncSession = Depends(get_session)
@@ -789,7 +1023,7 @@ async def get_sync_history(
         }
 
 
-@app.get("/api/metrics")
+@api.get("/metrics")
 async def get_metrics(
     session: AsyncSession = Depends(get_session),
     analysis_service: AnalysisService = Depends(get_analysis_service),
@@ -848,7 +1082,7 @@ async def get_metrics(
         raise HTTPException(status_code=500, detail=f"Metrics calculation failed: {str(e)}")
 
 
-@app.get("/api/trends", response_class=HTMLResponse)
+@api.get("/trends", response_class=HTMLResponse)
 async def trends_page(request: Request):
     """
     Monthly trends view
@@ -856,7 +1090,7 @@ async def trends_page(request: Request):
     return templates.TemplateResponse("trends.html", {"request": request})
 
 
-@app.get("/api/dashboard", response_class=HTMLResponse)
+@api.get("/dashboard", response_class=HTMLResponse)
 async def dashboard(
     request: Request,
     session: AsyncSession = Depends(get_session),
@@ -878,11 +1112,7 @@ async def dashboard(
         # Check if we're in a new month and missing previous month's snapshot
         missing_snapshot_warning = None
         if today.day <= 5:  # Show warning for first 5 days of the month
-            stmt_previous = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == previous_month)
-            result_previous = await session.execute(stmt_previous)
-            previous_snapshot = result_previous.scalar_one_or_none()
-
-            if not previous_snapshot:
+            if not await snapshot_exists(session, previous_month):
                 month_name = datetime.strptime(previous_month, "%Y-%m").strftime("%B %Y")
                 missing_snapshot_warning = f"⚠️ Husk å importere MRR Details rapport for {month_name}! Gå til hjemmesiden og velg 'Importer MRR Details (Excel)'."
 
@@ -900,7 +1130,7 @@ async def dashboard(
         raise HTTPException(status_code=500, detail=f"Dashboard failed: {str(e)}")
 
 
-@app.get("/api/documents", response_class=HTMLResponse)
+@api.get("/documents", response_class=HTMLResponse)
 async def documents_page(request: Request, session: AsyncSession = Depends(get_session)):
     """
     Document overview page - shows all imported Excel files/snapshots
@@ -909,28 +1139,33 @@ async def documents_page(request: Request, session: AsyncSession = Depends(get_s
         from dateutil.relativedelta import relativedelta
         from sqlalchemy import select
 
-        # Get only Excel-imported snapshots (not calculated ones)
-        stmt = select(MonthlyMRRSnapshot).where(
+        # Get only Excel-imported snapshots (not calculated ones) - just the displayed columns
+        stmt = select(
+            MonthlyMRRSnapshot.month,
+            MonthlyMRRSnapshot.mrr,
+            MonthlyMRRSnapshot.total_customers,
+            MonthlyMRRSnapshot.active_subscriptions,
+            MonthlyMRRSnapshot.arpu,
+            MonthlyMRRSnapshot.updated_at,
+        ).where(
             MonthlyMRRSnapshot.source == "excel_import"
         ).order_by(MonthlyMRRSnapshot.month.desc())
         result = await session.execute(stmt)
-        snapshots = result.scalars().all()
 
-        documents = []
-        for snapshot in snapshots:
-            month_date = datetime.strptime(snapshot.month, "%Y-%m")
-            month_name = month_date.strftime("%B %Y").capitalize()
-
-            documents.append({
-                "month": snapshot.month,
-                "month_name": month_name,
+        documents = [
+            {
+                "month": month,
+                # "YYYY-MM" -> "September 2025"
+                "month_name": f"{calendar.month_name[int(month[5:7])]} {month[:4]}".capitalize(),
                 "has_snapshot": True,
-                "mrr": snapshot.mrr,
-                "customers": snapshot.total_customers,
-                "subscriptions": snapshot.active_subscriptions,
-                "arpu": snapshot.arpu,
-                "updated_at": snapshot.updated_at,
-            })
+                "mrr": mrr,
+                "customers": customers,
+                "subscriptions": subscriptions,
+                "arpu": arpu,
+                "updated_at": updated_at,
+            }
+            for month, mrr, customers, subscriptions, arpu, updated_at in result
+        ]
 
         # Check if current month is missing
         today = datetime.utcnow()
@@ -939,11 +1174,7 @@ async def documents_page(request: Request, session: AsyncSession = Depends(get_s
 
         missing_current_month = None
         if today.day <= 5:  # First 5 days of month
-            stmt_prev = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == previous_month)
-            result_prev = await session.execute(stmt_prev)
-            prev_snapshot = result_prev.scalar_one_or_none()
-
-            if not prev_snapshot:
+            if not await snapshot_exists(session, previous_month):
                 prev_month_name = datetime.strptime(previous_month, "%Y-%m").strftime("%B %Y")
                 missing_current_month = f"Husk å importere MRR Details rapport for {prev_month_name}!"
 
@@ -959,7 +1190,7 @@ async def documents_page(request: Request, session: AsyncSession = Depends(get_s
         raise HTTPException(status_code=500, detail=f"Documents page failed: {str(e)}")
 
 
-@app.get("/api/guide", response_class=HTMLResponse)
+@api.get("/guide", response_class=HTMLResponse)
 async def guide_page(request: Request):
     """
     User guide page
@@ -967,80 +1198,95 @@ async def guide_page(request: Request):
     return templates.TemplateResponse("guide.html", {"request": request})
 
 
-@app.get("/api/changelog", response_class=HTMLResponse)
+# Rendered CHANGELOG.md, keyed on the file's (mtime, size) - re-rendered only when the file changes
+_changelog_cache = {"key": None, "html": None}
+
+# Changelog markdown patterns, compiled once
+_RE_BOLD = re.compile(r'\*\*(.+?)\*\*')
+_RE_HEADING = re.compile(r'(#{1,4}) (.*)')
+_RE_LIST_ITEM = re.compile(r'( *)- (.*)')
+
+
+def render_changelog(changelog_md: str) -> str:
+    """
+    Convert CHANGELOG.md to HTML (the small markdown subset the changelog uses)
+
+    One pass over the lines: headings (## "version - date" gets the version badge),
+    horizontal rules, lists (nested by two-space indent) and paragraphs, with **bold** inline.
+    """
+    html_parts = []
+    paragraph = []
+    list_depth = 0
+
+    def bold(text):
+        return _RE_BOLD.sub(r'<strong>\1</strong>', text)
+
+    def end_paragraph():
+        if paragraph:
+            html_parts.append('<p>' + '\n'.join(paragraph) + '</p>')
+            paragraph.clear()
+
+    def end_lists(depth=0):
+        nonlocal list_depth
+        while list_depth > depth:
+            html_parts.append('</ul>')
+            list_depth -= 1
+
+    for line in changelog_md.splitlines():
+        item = _RE_LIST_ITEM.fullmatch(line)
+        if item:
+            end_paragraph()
+            depth = len(item.group(1)) // 2 + 1
+            end_lists(depth)
+            while list_depth < depth:
+                html_parts.append('<ul>')
+                list_depth += 1
+            html_parts.append(f'<li>{bold(item.group(2))}</li>')
+            continue
+
+        end_lists()
+        heading = _RE_HEADING.fullmatch(line)
+        if heading:
+            end_paragraph()
+            level = len(heading.group(1))
+            text = bold(heading.group(2))
+            if level == 2:
+                version, separator, rest = text.partition(' - ')
+                text = f'<span class="version-badge">{version}</span>{separator}{rest}'
+            html_parts.append(f'<h{level}>{text}</h{level}>')
+        elif line.strip() == '---':
+            end_paragraph()
+            html_parts.append('<hr>')
+        elif not line.strip():
+            end_paragraph()
+        else:
+            paragraph.append(bold(line))
+
+    end_paragraph()
+    end_lists()
+    return '\n'.join(html_parts)
+
+
+@api.get("/changelog", response_class=HTMLResponse)
 async def changelog_page(request: Request):
     """
     Changelog page - shows release notes and version history
     """
     try:
-        import os
-
         # Read CHANGELOG.md file
         changelog_path = os.path.join(os.path.dirname(__file__), "CHANGELOG.md")
 
         if not os.path.exists(changelog_path):
             changelog_html = "<p>Ingen endringslogg funnet.</p>"
         else:
-            with open(changelog_path, "r", encoding="utf-8") as f:
-                changelog_md = f.read()
-
-            # Simple markdown to HTML conversion
-            changelog_html = changelog_md
-
-            # Headers
-            changelog_html = changelog_html.replace("## ", '<h2><span class="version-badge">').replace(" - ", '</span> - ')
-            changelog_html = changelog_html.replace("### ", "<h3>")
-            changelog_html = changelog_html.replace("#### ", "<h4>")
-
-            # Bold
-            import re
-            changelog_html = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', changelog_html)
-
-            # Lists
-            lines = changelog_html.split('\n')
-            html_lines = []
-            in_list = False
-
-            for line in lines:
-                if line.startswith('- '):
-                    if not in_list:
-                        html_lines.append('<ul>')
-                        in_list = True
-                    html_lines.append(f'<li>{line[2:]}</li>')
-                else:
-                    if in_list:
-                        html_lines.append('</ul>')
-                        in_list = False
-
-                    # Close h2/h3/h4 tags
-                    if line.startswith('<h2>'):
-                        line = line + '</h2>'
-                    elif line.startswith('<h3>'):
-                        line = line + '</h3>'
-                    elif line.startswith('<h4>'):
-                        line = line + '</h4>'
-
-                    html_lines.append(line)
-
-            if in_list:
-                html_lines.append('</ul>')
-
-            changelog_html = '\n'.join(html_lines)
-
-            # Horizontal rules
-            changelog_html = changelog_html.replace('---', '<hr>')
-
-            # Line breaks
-            changelog_html = changelog_html.replace('\n\n', '</p><p>')
-            changelog_html = f'<p>{changelog_html}</p>'
-
-            # Clean up empty paragraphs
-            changelog_html = re.sub(r'<p>\s*</p>', '', changelog_html)
-            changelog_html = re.sub(r'<p>(<h[234])', r'\1', changelog_html)
-            changelog_html = re.sub(r'(</h[234]>)</p>', r'\1', changelog_html)
-            changelog_html = re.sub(r'<p>(<hr>)</p>', r'\1', changelog_html)
-            changelog_html = re.sub(r'<p>(<ul>)', r'\1', changelog_html)
-            changelog_html = re.sub(r'(</ul>)</p>', r'\1', changelog_html)
+            stat = os.stat(changelog_path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if _changelog_cache["key"] != key:
+                with open(changelog_path, "r", encoding="utf-8") as f:
+                    changelog_md = f.read()
+                _changelog_cache["html"] = render_changelog(changelog_md)
+                _changelog_cache["key"] = key
+            changelog_html = _changelog_cache["html"]
 
         return templates.TemplateResponse(
             "changelog.html",
@@ -1053,7 +1299,7 @@ async def changelog_page(request: Request):
         raise HTTPException(status_code=500, detail=f"Changelog page failed: {str(e)}")
 
 
-@app.get("/api/debug", response_class=HTMLResponse)
+@api.get("/debug", response_class=HTMLResponse)
 async def debug_page(request: Request, session: AsyncSession = Depends(get_session)):
     """
     Debug/Info page - shows database contents and data sources
@@ -1061,36 +1307,39 @@ async def debug_page(request: Request, session: AsyncSession = Depends(get_sessi
     try:
         from sqlalchemy import select, func
 
-        # Get all snapshots
-        stmt = select(MonthlyMRRSnapshot).order_by(MonthlyMRRSnapshot.month.desc())
-        result = await session.execute(stmt)
-        snapshots = result.scalars().all()
-
-        # Count by source
-        stmt_excel = select(func.count(MonthlyMRRSnapshot.id)).where(MonthlyMRRSnapshot.source == "excel_import")
-        excel_count = await session.scalar(stmt_excel) or 0
-
-        stmt_calc = select(func.count(MonthlyMRRSnapshot.id)).where(MonthlyMRRSnapshot.source == "calculated")
-        calc_count = await session.scalar(stmt_calc) or 0
-
-        # Get subscription counts
-        stmt_total_subs = select(func.count(Subscription.id))
-        total_subs = await session.scalar(stmt_total_subs) or 0
+        # Get all snapshots (only the displayed columns - no ORM objects)
+        stmt = select(
+            MonthlyMRRSnapshot.month,
+            MonthlyMRRSnapshot.source,
+            MonthlyMRRSnapshot.mrr,
+            MonthlyMRRSnapshot.arr,
+            MonthlyMRRSnapshot.total_customers,
+            MonthlyMRRSnapshot.active_subscriptions,
+            MonthlyMRRSnapshot.new_mrr,
+            MonthlyMRRSnapshot.churned_mrr,
+            MonthlyMRRSnapshot.updated_at,
+        ).order_by(MonthlyMRRSnapshot.month.desc())
 
-        stmt_active_subs = select(func.count(Subscription.id)).where(
-            Subscription.status.in_(["live", "non_renewing"])
+        # Get subscription counts (total and active in one query)
+        stmt_subs = select(
+            func.count(Subscription.id),
+            func.count(Subscription.id).filter(Subscription.status.in_(["live", "non_renewing"])),
         )
-        active_subs = await session.scalar(stmt_active_subs) or 0
 
         # Get last sync time
         stmt_sync = select(SyncStatus).order_by(SyncStatus.last_sync_time.desc()).limit(1)
-        result_sync = await session.execute(stmt_sync)
+
+        # The three queries are independent
+        result, result_subs, result_sync = await execute_concurrently(session, stmt, stmt_subs, stmt_sync)
+        total_subs, active_subs = result_subs.one()
         last_sync_obj = result_sync.scalar_one_or_none()
         last_sync = last_sync_obj.last_sync_time.strftime('%d.%m.%Y %H:%M') if last_sync_obj else None
 
-        # Prepare snapshot data
+        # Prepare snapshot data and count by source in the same pass over the rows
         snapshot_data = []
-        for snapshot in snapshots:
+        source_counts = Counter()
+        for snapshot in result:
+            source_counts[snapshot.source] += 1
             month_date = datetime.strptime(snapshot.month, "%Y-%m")
             snapshot_data.append({
                 "month": snapshot.month,
@@ -1106,9 +1355,9 @@ async def debug_page(request: Request, session: AsyncSession = Depends(get_sessi
             })
 
         stats = {
-            "total_snapshots": len(snapshots),
-            "excel_snapshots": excel_count,
-            "calculated_snapshots": calc_count,
+            "total_snapshots": len(snapshot_data),
+            "excel_snapshots": source_counts["excel_import"],
+            "calculated_snapshots": source_counts["calculated"],
             "total_subscriptions": total_subs,
             "active_subscriptions": active_subs,
             "last_sync": last_sync,
@@ -1126,7 +1375,7 @@ async def debug_page(request: Request, session: AsyncSession = Depends(get_sessi
         raise HTTPException(status_code=500, detail=f"Debug page failed: {str(e)}")
 
 
-@app.get("/api/monthly-trends")
+@api.get("/monthly-trends")
 async def get_monthly_trends(
     session: AsyncSession = Depends(get_session),
     months: int = 12,
@@ -1156,7 +1405,7 @@ async def get_monthly_trends(
         raise HTTPException(status_code=500, detail=f"Failed to get trends: {str(e)}")
 
 
-@app.get("/api/mrr-breakdown-page", response_class=HTMLResponse)
+@api.get("/mrr-breakdown-page", response_class=HTMLResponse)
 async def mrr_breakdown_page(request: Request):
     """
     MRR breakdown page
@@ -1164,7 +1413,7 @@ async def mrr_breakdown_page(request: Request):
     return templates.TemplateResponse("mrr_breakdown.html", {"request": request})
 
 
-@app.get("/api/mrr-breakdown")
+@api.get("/mrr-breakdown")
 async def get_mrr_breakdown(
     session: AsyncSession = Depends(get_session),
     month: Optional[str] = None,
@@ -1176,7 +1425,7 @@ async def get_mrr_breakdown(
         month: Optional month in YYYY-MM format (e.g., "2025-01") to show breakdown for that specific month
     """
     try:
-        from sqlalchemy import select, func
+        from sqlalchemy import select, func, case
         from dateutil.relativedelta import relativedelta
 
         # If month is specified, calculate as of end of that month
@@ -1187,71 +1436,86 @@ async def get_mrr_breakdown(
             as_of_date = datetime(year, month_num, 1) + relativedelta(months=1) - relativedelta(days=1)
             as_of_date = as_of_date.replace(hour=23, minute=59, second=59)
 
-            # Get subscriptions that were active at that time
-            stmt = select(Subscription).where(
+            # Subscriptions that were active at that time
+            conditions = [
                 Subscription.status.in_(["live", "non_renewing", "cancelled"]),
                 Subscription.activated_at <= as_of_date,
-                (Subscription.cancelled_at.is_(None)) | (Subscription.cancelled_at > as_of_date)
-            )
+                (Subscription.cancelled_at.is_(None)) | (Subscription.cancelled_at > as_of_date),
+            ]
         else:
-            # Get all currently live subscriptions (including non_renewing)
-            stmt = select(Subscription).where(Subscription.status.in_(["live", "non_renewing"]))
-
-        result = await session.execute(stmt)
-        subscriptions = result.scalars().all()
-
-        # Calculate summary
-        total_mrr = 0
-        monthly_mrr = 0
-        yearly_mrr = 0
-        monthly_count = 0
-        yearly_count = 0
-        monthly_total = 0
-        yearly_total = 0
-
-        top_subs = []
-
-        for sub in subscriptions:
-            # Remove 25% Norwegian VAT (MVA) from amount
-            amount_without_vat = sub.amount / 1.25
-
-            if sub.interval == "months":
-                mrr = amount_without_vat / sub.interval_unit
-                monthly_mrr += mrr
-                monthly_count += 1
-                monthly_total += sub.amount
-            elif sub.interval == "years":
-                mrr = amount_without_vat / (sub.interval_unit * 12)
-                yearly_mrr += mrr
-                yearly_count += 1
-                yearly_total += sub.amount
-            else:
-                mrr = amount_without_vat
-
-            total_mrr += mrr
-            top_subs.append({
-                "customer_name": sub.customer_name,
-                "plan_name": sub.plan_name,
-                "amount": sub.amount,
-                "currency": sub.currency_code,
-                "interval": sub.interval,
-                "interval_unit": sub.interval_unit,
-                "interval_label": f"{sub.interval} ({sub.interval_unit}x)" if sub.interval_unit > 1 else sub.interval,
-                "mrr": mrr
-            })
+            # All currently live subscriptions (including non_renewing)
+            conditions = [Subscription.status.in_(["live", "non_renewing"])]
+
+        # MRR per subscription: amount without 25% Norwegian VAT (MVA), spread over the billing period
+        is_monthly = Subscription.interval == "months"
+        is_yearly = Subscription.interval == "years"
+        mrr_expr = Subscription.amount / 1.25 / case(
+            (is_monthly, Subscription.interval_unit),
+            (is_yearly, Subscription.interval_unit * 12),
+            else_=1,
+        )
 
-        # Sort top subscriptions by MRR
-        top_subs.sort(key=lambda x: x["mrr"], reverse=True)
+        # Totals and the monthly/yearly split computed by the database in one row
+        totals_stmt = select(
+            func.count(Subscription.id),
+            func.count(func.distinct(Subscription.customer_id)),
+            func.sum(mrr_expr),
+            func.count(Subscription.id).filter(is_monthly),
+            func.sum(Subscription.amount).filter(is_monthly),
+            func.sum(mrr_expr).filter(is_monthly),
+            func.count(Subscription.id).filter(is_yearly),
+            func.sum(Subscription.amount).filter(is_yearly),
+            func.sum(mrr_expr).filter(is_yearly),
+        ).where(*conditions)
+
+        # Largest subscriptions by MRR - only the displayed columns
+        top_stmt = select(
+            Subscription.customer_name,
+            Subscription.plan_name,
+            Subscription.amount,
+            Subscription.currency_code,
+            Subscription.interval,
+            Subscription.interval_unit,
+            mrr_expr.label("mrr"),
+        ).where(*conditions).order_by(mrr_expr.desc()).limit(TOP_SUBSCRIPTIONS_LIMIT)
 
-        # Get unique customers
-        unique_customers = len(set(sub.customer_id for sub in subscriptions))
+        if month:
+            # The month's snapshot doesn't depend on the subscriptions - fetch all at once
+            snapshot_stmt = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month)
+            totals_result, top_result, snapshot_result = await execute_concurrently(
+                session, totals_stmt, top_stmt, snapshot_stmt
+            )
+        else:
+            totals_result, top_result = await execute_concurrently(session, totals_stmt, top_stmt)
+
+        (
+            subscription_count, unique_customers, total_mrr,
+            monthly_count, monthly_total, monthly_mrr,
+            yearly_count, yearly_total, yearly_mrr,
+        ) = totals_result.one()
+        # SUM over no rows is NULL
+        total_mrr = total_mrr or 0
+        monthly_total, monthly_mrr = monthly_total or 0, monthly_mrr or 0
+        yearly_total, yearly_mrr = yearly_total or 0, yearly_mrr or 0
+
+        top_subs = [
+            {
+                "customer_name": row.customer_name,
+                "plan_name": row.plan_name,
+                "amount": row.amount,
+                "currency": row.currency_code,
+                "interval": row.interval,
+                "interval_unit": row.interval_unit,
+                "interval_label": f"{row.interval} ({row.interval_unit}x)" if row.interval_unit > 1 else row.interval,
+                "mrr": row.mrr,
+            }
+            for row in top_result
+        ]
 
         # Get monthly snapshot data if viewing specific month
         snapshot_data = None
         is_excel_import = False
         if month:
-            snapshot_stmt = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month)
-            snapshot_result = await session.execute(snapshot_stmt)
             snapshot = snapshot_result.scalar_one_or_none()
             if snapshot:
                 is_excel_import = (snapshot.source == "excel_import")
@@ -1282,7 +1546,7 @@ async def get_mrr_breakdown(
                 # No snapshot available, use calculated data
                 summary_data = {
                     "total_mrr": round(total_mrr, 2),
-                    "total_subscriptions": len(subscriptions),
+                    "total_subscriptions": subscription_count,
                     "total_customers": unique_customers,
                     "arpu": round(total_mrr / unique_customers, 2) if unique_customers > 0 else 0,
                     "data_source": "calculated"  # Indicate this is calculated
@@ -1291,7 +1555,7 @@ async def get_mrr_breakdown(
             # Current month - use calculated data
             summary_data = {
                 "total_mrr": round(total_mrr, 2),
-                "total_subscriptions": len(subscriptions),
+                "total_subscriptions": subscription_count,
                 "total_customers": unique_customers,
                 "arpu": round(total_mrr / unique_customers, 2) if unique_customers > 0 else 0,
                 "data_source": "calculated"
@@ -1321,7 +1585,7 @@ async def get_mrr_breakdown(
                     "percentage": round(yearly_mrr / total_mrr * 100, 2) if total_mrr > 0 else 0,
                 },
             ],
-            "all_subscriptions": top_subs,  # Show all subscriptions (sorted by MRR)
+            "all_subscriptions": top_subs,  # Largest subscriptions (sorted by MRR)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get MRR breakdown: {str(e)}")
@@ -1341,7 +1605,7 @@ class ProductConfigUpdate(BaseModel):
     recalculate: bool = False  # Whether to recalculate existing data
 
 
-@app.post("/api/import-zoho-mrr-details")
+@api.post("/import-zoho-mrr-details")
 async def import_zoho_mrr_details(
     request: ImportRequest,
     session: AsyncSession = Depends(get_session),
@@ -1359,39 +1623,32 @@ async def import_zoho_mrr_details(
     """
     try:
         importer = ZohoReportImporter()
-        month_data = importer.import_mrr_details_report(request.file_path, request.month)
+        # pandas/openpyxl parsing is blocking - keep it off the event loop
+        month_data = await asyncio.to_thread(importer.import_mrr_details_report, request.file_path, request.month)
 
         # Update or create snapshot with Zoho's exact numbers
-        from sqlalchemy import select
-
         month = month_data['month']
-        stmt = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month)
-        result = await session.execute(stmt)
-        existing_snapshot = result.scalar_one_or_none()
-
-        if existing_snapshot:
-            # Update with Zoho's exact numbers
-            existing_snapshot.mrr = round(month_data['mrr'], 2)
-            existing_snapshot.arr = round(month_data['mrr'] * 12, 2)
-            existing_snapshot.total_customers = month_data['customer_count']
-            existing_snapshot.active_subscriptions = month_data['subscription_count']
+        existing = await upsert_monthly_snapshots(
+            session,
+            [{
+                "month": month,
+                "mrr": round(month_data['mrr'], 2),
+                "arr": round(month_data['mrr'] * 12, 2),
+                "total_customers": month_data['customer_count'],
+                "active_subscriptions": month_data['subscription_count'],
+                "new_mrr": 0.0,  # Can be calculated later
+                "churned_mrr": 0.0,  # Can be calculated later
+                "net_mrr": 0.0,  # Can be calculated later
+            }],
+            update_columns=["mrr", "arr", "total_customers", "active_subscriptions"],
+        )
+        if month in existing:
             message = f"Updated snapshot for {month} with Zoho's exact data"
         else:
-            # Create new snapshot
-            snapshot = MonthlyMRRSnapshot(
-                month=month,
-                mrr=round(month_data['mrr'], 2),
-                arr=round(month_data['mrr'] * 12, 2),
-                total_customers=month_data['customer_count'],
-                active_subscriptions=month_data['subscription_count'],
-                new_mrr=0.0,  # Can be calculated later
-                churned_mrr=0.0,  # Can be calculated later
-                net_mrr=0.0,  # Can be calculated later
-            )
-            session.add(snapshot)
             message = f"Created snapshot for {month} with Zoho's exact data"
 
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         return {
             "status": "success",
@@ -1409,7 +1666,7 @@ async def import_zoho_mrr_details(
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
-@app.post("/api/import-zoho-mrr-report")
+@api.post("/import-zoho-mrr-report")
 async def import_zoho_mrr_report(
     request: ImportRequest,
     session: AsyncSession = Depends(get_session),
@@ -1424,47 +1681,33 @@ async def import_zoho_mrr_report(
     try:
         # Import the report
         importer = ZohoReportImporter()
-        monthly_data = importer.import_monthly_mrr_report(file_path)
+        monthly_data = await asyncio.to_thread(importer.import_monthly_mrr_report, file_path)
 
         if not monthly_data:
             raise HTTPException(status_code=400, detail="No data found in the Excel file")
 
-        # Save each month's data as a snapshot
-        from sqlalchemy import select
-
-        snapshots_created = []
-        snapshots_updated = []
-
-        for month_data in monthly_data:
-            month = month_data['month']
-            mrr = month_data['mrr']
-
-            # Check if snapshot already exists
-            stmt = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month)
-            result = await session.execute(stmt)
-            existing_snapshot = result.scalar_one_or_none()
-
-            if existing_snapshot:
-                # Update MRR with Zoho's actual value
-                existing_snapshot.mrr = round(mrr, 2)
-                existing_snapshot.arr = round(mrr * 12, 2)
-                existing_snapshot.source = "excel_import"  # Mark as from Excel import
-                snapshots_updated.append(month)
-            else:
-                # Create new snapshot with just MRR
-                # Other fields will be populated when we calculate them
-                snapshot = MonthlyMRRSnapshot(
-                    month=month,
-                    mrr=round(mrr, 2),
-                    arr=round(mrr * 12, 2),
-                    total_customers=0,  # Will be calculated later
-                    active_subscriptions=0,  # Will be calculated later
-                    source="excel_import",  # Mark as from Excel import
-                )
-                session.add(snapshot)
-                snapshots_created.append(month)
+        # Save all months as snapshots in one upsert (latest row wins for repeated months).
+        # New months get just MRR - other fields will be populated when we calculate them
+        rows = {
+            month_data['month']: {
+                "month": month_data['month'],
+                "mrr": round(month_data['mrr'], 2),
+                "arr": round(month_data['mrr'] * 12, 2),
+                "total_customers": 0,  # Will be calculated later
+                "active_subscriptions": 0,  # Will be calculated later
+                "source": "excel_import",  # Mark as from Excel import
+            }
+            for month_data in monthly_data
+        }
+        # Existing months only get Zoho's MRR
+        existing = await upsert_monthly_snapshots(
+            session, list(rows.values()), update_columns=["mrr", "arr", "source"]
+        )
+        snapshots_created = [month for month in rows if month not in existing]
+        snapshots_updated = [month for month in rows if month in existing]
 
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         return {
             "status": "success",
@@ -1480,7 +1723,27 @@ async def import_zoho_mrr_report(
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
-@app.get("/api/churn-status")
+# Churn columns of the monthly snapshots - raw SQL to avoid mapper cache issues
+CHURN_SNAPSHOT_SQL = text("""
+    SELECT month, churned_customers, churned_mrr, updated_at
+    FROM monthly_mrr_snapshots
+    WHERE month IN :months
+""").bindparams(bindparam("months", expanding=True))
+
+
+def format_updated_at(value) -> str:
+    """Display format for a raw SQL timestamp (datetime on PostgreSQL, ISO string on SQLite)"""
+    if not value:
+        return 'N/A'
+    try:
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(value)
+        return value.strftime('%d.%m.%Y kl. %H:%M')
+    except ValueError:
+        return 'N/A'
+
+
+@api.get("/churn-status")
 async def get_churn_status(session: AsyncSession = Depends(get_session)):
     """
     Get churn import status for all months
@@ -1490,39 +1753,33 @@ async def get_churn_status(session: AsyncSession = Depends(get_session)):
         from models.subscription import ChurnedCustomer
         from dateutil.relativedelta import relativedelta
 
-        # Get last 12 months
+        # Get last 12 months (oldest first)
         today = datetime.utcnow()
-        months = []
-        for i in range(12):
-            month_date = today - relativedelta(months=i)
-            month_str = month_date.strftime("%Y-%m")
-            months.append({
-                'month': month_str,
-                'month_name': month_date.strftime("%B %Y"),
-            })
+        month_dates = [today - relativedelta(months=i) for i in reversed(range(12))]
+        month_strs = [month_date.strftime("%Y-%m") for month_date in month_dates]
 
-        # Get churn data for each month
-        result_months = []
-        for month_info in reversed(months):
-            month = month_info['month']
+        # Get snapshot data for all months
+        sql = CHURN_SNAPSHOT_SQL.bindparams(months=month_strs)
 
-            # Get snapshot data using raw SQL to avoid mapper cache issues
-            from sqlalchemy import text
-            sql = text("""
-                SELECT churned_customers, churned_mrr, updated_at
-                FROM monthly_mrr_snapshots
-                WHERE month = :month
-            """)
-            result = await session.execute(sql, {'month': month})
-            row = result.fetchone()
+        # Count unique cancellation reasons per month
+        reason_stmt = select(
+            ChurnedCustomer.month,
+            func.count(func.distinct(ChurnedCustomer.cancellation_reason)),
+        ).where(
+            ChurnedCustomer.month.in_(month_strs),
+            ChurnedCustomer.cancellation_reason.isnot(None)
+        ).group_by(ChurnedCustomer.month)
 
-            # Count unique cancellation reasons
-            reason_stmt = select(func.count(func.distinct(ChurnedCustomer.cancellation_reason))).where(
-                ChurnedCustomer.month == month,
-                ChurnedCustomer.cancellation_reason.isnot(None)
-            )
-            reason_result = await session.execute(reason_stmt)
-            reason_count = reason_result.scalar() or 0
+        snapshot_result, reason_result = await execute_concurrently(session, sql, reason_stmt)
+        snapshot_rows = {row[0]: row[1:] for row in snapshot_result}
+        reason_counts = dict(reason_result.all())
+
+        # Get churn data for each month
+        result_months = []
+        for month_date, month in zip(month_dates, month_strs):
+            month_name = month_date.strftime("%B %Y")
+            row = snapshot_rows.get(month)
+            reason_count = reason_counts.get(month) or 0
 
             # Extract values from raw SQL row
             churned_customers = row[0] if row and row[0] is not None else 0
@@ -1530,28 +1787,18 @@ async def get_churn_status(session: AsyncSession = Depends(get_session)):
             updated_at_raw = row[2] if row and row[2] is not None else None
 
             if row and churned_customers and churned_customers > 0:
-                # Parse datetime string from database
-                if updated_at_raw:
-                    try:
-                        from datetime import datetime as dt
-                        updated_at_dt = dt.fromisoformat(updated_at_raw.replace(' ', 'T'))
-                        updated_at_str = updated_at_dt.strftime('%d.%m.%Y kl. %H:%M')
-                    except:
-                        updated_at_str = 'N/A'
-                else:
-                    updated_at_str = 'N/A'
                 result_months.append({
                     'month': month,
-                    'month_name': month_info['month_name'],
+                    'month_name': month_name,
                     'churned_customers': churned_customers,
                     'churned_mrr': churned_mrr,
                     'reason_count': reason_count,
-                    'updated_at': updated_at_str,
+                    'updated_at': format_updated_at(updated_at_raw),
                 })
             else:
                 result_months.append({
                     'month': month,
-                    'month_name': month_info['month_name'],
+                    'month_name': month_name,
                     'churned_customers': 0,
                     'churned_mrr': 0,
                     'reason_count': 0,
@@ -1569,7 +1816,27 @@ async def get_churn_status(session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Failed to get churn status: {str(e)}")
 
 
-@app.post("/api/upload-excel")
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_to_tempfile(src, suffix: str) -> str:
+    """Blocking part of save_upload"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        shutil.copyfileobj(src, tmp_file, UPLOAD_CHUNK_SIZE)
+        return tmp_file.name
+
+
+async def save_upload(file: UploadFile, suffix: str = ".xlsx") -> str:
+    """
+    Copy an uploaded file to a temp file in 1 MB chunks (never the whole upload in memory)
+
+    The blocking copy runs in a worker thread. Returns the temp file path - the caller deletes it.
+    """
+    return await asyncio.to_thread(_copy_to_tempfile, file.file, suffix)
+
+
+@api.post("/upload-excel")
 async def upload_excel(
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session)
@@ -1577,67 +1844,48 @@ async def upload_excel(
     """
     Upload and import Excel file
     """
-    import tempfile
     import os
 
     try:
         # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        tmp_file_path = await save_upload(file)
 
         # Import the MRR Details report (subscription-level data)
         importer = ZohoReportImporter()
-        import_result = importer.import_mrr_details_report(tmp_file_path)
+        import_result = await asyncio.to_thread(importer.import_mrr_details_report, tmp_file_path)
 
         if not import_result:
             raise HTTPException(status_code=400, detail="No data found in the Excel file")
 
         # Save month's data as a snapshot
-        from sqlalchemy import select
-
         month = import_result['month']
         mrr = import_result['mrr']
         customer_count = import_result['customer_count']
         subscription_count = import_result['subscription_count']
         arpu = import_result['arpu']
 
-        # Check if snapshot already exists
-        stmt = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month)
-        result = await session.execute(stmt)
-        existing_snapshot = result.scalar_one_or_none()
-
-        snapshots_created = []
-        snapshots_updated = []
-
-        if existing_snapshot:
-            # Update with Zoho's actual values
-            existing_snapshot.mrr = round(mrr, 2)
-            existing_snapshot.arr = round(mrr * 12, 2)
-            existing_snapshot.total_customers = customer_count
-            existing_snapshot.active_subscriptions = subscription_count
-            existing_snapshot.arpu = round(arpu, 2)
-            existing_snapshot.source = "excel_import"  # Mark as from Excel import
-            snapshots_updated.append(month)
-        else:
-            # Create new snapshot with all data
-            snapshot = MonthlyMRRSnapshot(
-                month=month,
-                mrr=round(mrr, 2),
-                arr=round(mrr * 12, 2),
-                total_customers=customer_count,
-                active_subscriptions=subscription_count,
-                arpu=round(arpu, 2),
-                new_mrr=0.0,  # Will be calculated later if needed
-                churned_mrr=0.0,  # Will be calculated later if needed
-                net_mrr=0.0,  # Will be calculated later if needed
-                source="excel_import",  # Mark as from Excel import
-            )
-            session.add(snapshot)
-            snapshots_created.append(month)
+        # Existing snapshots get Zoho's actual values, new ones also zeroed movement fields
+        existing = await upsert_monthly_snapshots(
+            session,
+            [{
+                "month": month,
+                "mrr": round(mrr, 2),
+                "arr": round(mrr * 12, 2),
+                "total_customers": customer_count,
+                "active_subscriptions": subscription_count,
+                "arpu": round(arpu, 2),
+                "new_mrr": 0.0,  # Will be calculated later if needed
+                "churned_mrr": 0.0,  # Will be calculated later if needed
+                "net_mrr": 0.0,  # Will be calculated later if needed
+                "source": "excel_import",  # Mark as from Excel import
+            }],
+            update_columns=["mrr", "arr", "total_customers", "active_subscriptions", "arpu", "source"],
+        )
+        snapshots_created = [] if month in existing else [month]
+        snapshots_updated = [month] if month in existing else []
 
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         # Clean up temp file
         os.unlink(tmp_file_path)
@@ -1659,7 +1907,7 @@ async def upload_excel(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
-@app.post("/api/upload-churn")
+@api.post("/upload-churn")
 async def upload_churn(
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session)
@@ -1667,15 +1915,11 @@ async def upload_churn(
     """
     Upload and import Churn report Excel file
     """
-    import tempfile
     import os
 
     try:
         # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        tmp_file_path = await save_upload(file)
 
         # Import the Churn report - pass original filename for month extraction
         importer = ZohoReportImporter()
@@ -1705,7 +1949,7 @@ async def upload_churn(
                 }
                 month_from_filename = f"{year}-{month_map[month_name]}"
 
-        churn_result = importer.import_churn_report(tmp_file_path, month=month_from_filename)
+        churn_result = await asyncio.to_thread(importer.import_churn_report, tmp_file_path, month=month_from_filename)
 
         if not churn_result:
             raise HTTPException(status_code=400, detail="No churn data found in the Excel file")
@@ -1774,6 +2018,7 @@ async def upload_churn(
             session.add(churn_record)
 
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         # Clean up temp file
         os.unlink(tmp_file_path)
@@ -1796,7 +2041,7 @@ async def upload_churn(
         raise HTTPException(status_code=500, detail=f"Churn upload failed: {str(e)}")
 
 
-@app.post("/api/accounting/import-receivables")
+@api.post("/accounting/import-receivables")
 async def import_receivables(
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session)
@@ -1804,16 +2049,12 @@ async def import_receivables(
     """
     Upload and import Receivable Details Excel file from accounting
     """
-    import tempfile
     import os
     from import_accounting_receivables import import_accounting_excel
 
     try:
         # Save uploaded file to temp location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
+        tmp_file_path = await save_upload(file)
 
         # Import the Receivable Details - pass original filename for month extraction
         original_filename = file.filename
@@ -1843,7 +2084,7 @@ async def import_receivables(
         raise HTTPException(status_code=500, detail=f"Receivable upload failed: {str(e)}")
 
 
-@app.get("/api/accounting/receivables-status")
+@api.get("/accounting/receivables-status")
 async def get_receivables_status(session: AsyncSession = Depends(get_session)):
     """
     Get receivable details import status for all months
@@ -1941,7 +2182,7 @@ class QuestionRequest(BaseModel):
     question: str
 
 
-@app.post("/api/ask-ai")
+@api.post("/ask-ai")
 async def ask_ai_question(
     request: QuestionRequest,
     session: AsyncSession = Depends(get_session),
@@ -1972,7 +2213,7 @@ async def ask_ai_question(
         raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
 
 
-@app.post("/api/ask-trends")
+@api.post("/ask-trends")
 async def ask_trends_question(
     request: QuestionRequest,
     session: AsyncSession = Depends(get_session),
@@ -2079,7 +2320,7 @@ class ComprehensiveQuestionRequest(BaseModel):
     conversation_history: list = []
 
 
-@app.post("/api/ask-niko")
+@api.post("/ask-niko")
 async def ask_niko_comprehensive(
     request: ComprehensiveQuestionRequest,
     session: AsyncSession = Depends(get_session),
@@ -2322,7 +2563,7 @@ async def ask_niko_comprehensive(
         raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
 
 
-@app.post("/api/generate-historical-snapshots")
+@api.post("/generate-historical-snapshots")
 async def generate_historical_snapshots(
     session: AsyncSession = Depends(get_session),
     months_back: int = 12,
@@ -2333,25 +2574,17 @@ async def generate_historical_snapshots(
     """
     try:
         calculator = MetricsCalculator(session)
-        from dateutil.relativedelta import relativedelta
-
-        today = datetime.utcnow()
         snapshots_created = []
 
-        for i in range(months_back):
-            # Calculate end of each month
-            month_date = today - relativedelta(months=i)
-            end_of_month = datetime(month_date.year, month_date.month, 1) + relativedelta(months=1) - relativedelta(days=1)
-            end_of_month = end_of_month.replace(hour=23, minute=59, second=59)
-
-            month_str = month_date.strftime("%Y-%m")
-
-            try:
-                await calculator.save_monthly_snapshot(month_str, end_of_month)
-                snapshots_created.append(month_str)
-                print(f"Created snapshot for {month_str}")
-            except Exception as e:
-                print(f"Failed to create snapshot for {month_str}: {e}")
+        # All months in one pass over the subscriptions
+        month_ends = last_month_ends(months_back)
+        try:
+            await calculator.save_monthly_snapshots(month_ends)
+            snapshots_created = [month_str for month_str, _ in month_ends]
+            _snapshot_exists_cache.clear()
+            print(f"Created snapshots for {', '.join(snapshots_created)}")
+        except Exception as e:
+            print(f"Failed to create snapshots: {e}")
 
         return {
             "status": "success",
@@ -2362,7 +2595,7 @@ async def generate_historical_snapshots(
         raise HTTPException(status_code=500, detail=f"Failed to generate snapshots: {str(e)}")
 
 
-@app.get("/api/debug-mrr")
+@api.get("/debug-mrr")
 async def debug_mrr(
     session: AsyncSession = Depends(get_session),
 ):
@@ -2392,7 +2625,7 @@ async def debug_mrr(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/clear-snapshots")
+@api.post("/clear-snapshots")
 async def clear_snapshots(session: AsyncSession = Depends(get_session)):
     """
     Clear all monthly snapshots from database
@@ -2404,6 +2637,7 @@ async def clear_snapshots(session: AsyncSession = Depends(get_session)):
         stmt = delete(MonthlyMRRSnapshot)
         result = await session.execute(stmt)
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         deleted_count = result.rowcount
 
@@ -2418,7 +2652,7 @@ async def clear_snapshots(session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Kunne ikke slette snapshots: {str(e)}")
 
 
-@app.post("/api/clear-subscriptions")
+@api.post("/clear-subscriptions")
 async def clear_subscriptions(session: AsyncSession = Depends(get_session)):
     """
     Clear all subscriptions from database
@@ -2444,7 +2678,7 @@ async def clear_subscriptions(session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Kunne ikke slette subscriptions: {str(e)}")
 
 
-@app.post("/api/clear-all")
+@api.post("/clear-all")
 async def clear_all(session: AsyncSession = Depends(get_session)):
     """
     Clear entire database (nuclear option)
@@ -2466,6 +2700,7 @@ async def clear_all(session: AsyncSession = Depends(get_session)):
         result_metrics = await session.execute(stmt_metrics)
 
         await session.commit()
+        _snapshot_exists_cache.clear()
 
         total_deleted = (
             result_snapshots.rowcount +
@@ -2489,7 +2724,7 @@ async def clear_all(session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Kunne ikke tømme database: {str(e)}")
 
 
-@app.get("/api/drilldown/customers", response_class=HTMLResponse)
+@api.get("/drilldown/customers", response_class=HTMLResponse)
 async def drilldown_customers(request: Request, session: AsyncSession = Depends(get_session)):
     """Drilldown: All customers with their subscriptions"""
     try:
@@ -2587,7 +2822,7 @@ async def drilldown_customers(request: Request, session: AsyncSession = Depends(
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/drilldown/subscriptions", response_class=HTMLResponse)
+@api.get("/drilldown/subscriptions", response_class=HTMLResponse)
 async def drilldown_subscriptions(
     request: Request,
     session: AsyncSession = Depends(get_session),
@@ -2669,7 +2904,7 @@ async def drilldown_subscriptions(
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/drilldown/mrr", response_class=HTMLResponse)
+@api.get("/drilldown/mrr", response_class=HTMLResponse)
 async def drilldown_mrr(request: Request, session: AsyncSession = Depends(get_session)):
     """Drilldown: MRR breakdown by subscription"""
     try:
@@ -2709,7 +2944,7 @@ async def drilldown_mrr(request: Request, session: AsyncSession = Depends(get_se
             })
 
         # Prepare plan summary for stats
-        top_plans = sorted(plan_mrr.items(), key=lambda x: x[1]['mrr'], reverse=True)[:3]
+        top_plans = heapq.nlargest(3, plan_mrr.items(), key=lambda x: x[1]['mrr'])
 
         stats = [
             {'label': 'Total MRR', 'value': f"{total_mrr:,.0f} kr", 'class': ''},
@@ -2739,7 +2974,7 @@ async def drilldown_mrr(request: Request, session: AsyncSession = Depends(get_se
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/drilldown/arpu", response_class=HTMLResponse)
+@api.get("/drilldown/arpu", response_class=HTMLResponse)
 async def drilldown_arpu(request: Request, session: AsyncSession = Depends(get_session)):
     """Drilldown: ARPU by customer"""
     try:
@@ -2812,7 +3047,7 @@ async def drilldown_arpu(request: Request, session: AsyncSession = Depends(get_s
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/drilldown/churn", response_class=HTMLResponse)
+@api.get("/drilldown/churn", response_class=HTMLResponse)
 async def drilldown_churn(request: Request, session: AsyncSession = Depends(get_session)):
     """Drilldown: Churned customers grouped by month with drilldown"""
     try:
@@ -2901,7 +3136,7 @@ async def drilldown_churn(request: Request, session: AsyncSession = Depends(get_
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/drilldown/new-mrr", response_class=HTMLResponse)
+@api.get("/drilldown/new-mrr", response_class=HTMLResponse)
 async def drilldown_new_mrr(request: Request, session: AsyncSession = Depends(get_session)):
     """Drilldown: New MRR from last 30 days"""
     try:
@@ -2962,7 +3197,7 @@ async def drilldown_new_mrr(request: Request, session: AsyncSession = Depends(ge
         raise HTTPException(status_code=500, detail=f"Drilldown failed: {str(e)}")
 
 
-@app.get("/api/customers/all", response_class=HTMLResponse)
+@api.get("/customers/all", response_class=HTMLResponse)
 async def all_customers(request: Request, session: AsyncSession = Depends(get_session)):
     """Complete customer overview with active and churned customers"""
     try:
@@ -3102,7 +3337,7 @@ async def all_customers(request: Request, session: AsyncSession = Depends(get_se
         raise HTTPException(status_code=500, detail=f"Failed to fetch customers: {str(e)}")
 
 
-@app.get("/api/customers/export")
+@api.get("/customers/export")
 async def export_customers_csv(session: AsyncSession = Depends(get_session)):
     """Export all customers to CSV"""
     try:
@@ -3227,7 +3462,7 @@ async def export_customers_csv(session: AsyncSession = Depends(get_session)):
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
-@app.get("/api/forecast", response_class=HTMLResponse)
+@api.get("/forecast", response_class=HTMLResponse)
 async def mrr_forecast(request: Request, session: AsyncSession = Depends(get_session)):
     """MRR Forecast based on non-renewing subscriptions"""
     try:
@@ -3366,7 +3601,7 @@ async def mrr_forecast(request: Request, session: AsyncSession = Depends(get_ses
 # Separate system for calculating MRR from invoices (not subscriptions)
 # ============================================================================
 
-@app.post("/api/invoices/sync")
+@api.post("/invoices/sync")
 async def sync_invoices(
     zoho: ZohoClient = Depends(get_zoho_client),
     session: AsyncSession = Depends(get_session),
@@ -3377,7 +3612,9 @@ async def sync_invoices(
     This uses invoice periods (from description field) to calculate accurate MRR
     """
     try:
-        import httpx
+        # One timestamp for every row written by this sync
+        sync_started = datetime.utcnow()
+
         from models.invoice import Invoice, InvoiceLineItem, InvoiceSyncStatus
         from services.invoice import InvoiceService
         from sqlalchemy import select, desc
@@ -3404,7 +3641,7 @@ async def sync_invoices(
 
         # Fetch invoices from Zoho
         print("Fetching invoices from Zoho...")
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with zoho._http(timeout=60.0) as client:
             # Get all invoices (paginated)
             all_invoices = []
             page = 1
@@ -3441,12 +3678,22 @@ async def sync_invoices(
             skipped_count = 0
             total_invoices = len(all_invoices)
 
+            # Stored updated_time of the fetched invoices (id -> updated_time), looked up
+            # in batches instead of loading each invoice just to compare timestamps
+            invoice_ids = [inv_data["invoice_id"] for inv_data in all_invoices]
+            stored_updated_times = {}
+            for start in range(0, len(invoice_ids), EXISTING_ID_BATCH_SIZE):
+                stmt = select(Invoice.id, Invoice.updated_time).where(
+                    Invoice.id.in_(invoice_ids[start:start + EXISTING_ID_BATCH_SIZE])
+                )
+                stored_updated_times.update((await session.execute(stmt)).all())
+
             for idx, inv_data in enumerate(all_invoices, 1):
                 invoice_id = inv_data["invoice_id"]
 
                 # Check if invoice exists and hasn't changed (optimization)
-                existing_invoice = await session.get(Invoice, invoice_id)
-                if existing_invoice:
+                if invoice_id in stored_updated_times:
+                    stored_updated_time = stored_updated_times[invoice_id]
                     # Parse updated_time from Zoho
                     zoho_updated = inv_data.get("last_modified_time") or inv_data.get("updated_time")
                     if zoho_updated:
@@ -3455,7 +3702,7 @@ async def sync_invoices(
                             zoho_updated_dt = parser.parse(zoho_updated).replace(tzinfo=None)
 
                             # Skip if not modified since last sync
-                            if existing_invoice.updated_time and zoho_updated_dt <= existing_invoice.updated_time:
+                            if stored_updated_time and zoho_updated_dt <= stored_updated_time:
                                 skipped_count += 1
                                 if idx % 50 == 0:
                                     print(f"Progress: {idx}/{total_invoices} ({skipped_count} skipped, {synced_count} updated)")
@@ -3519,7 +3766,7 @@ async def sync_invoices(
                     invoice.transaction_type = invoice_detail.get("transaction_type", "")
                     invoice.created_time = created_time
                     invoice.updated_time = updated_time
-                    invoice.last_synced = datetime.utcnow()
+                    invoice.last_synced = sync_started
                 else:
                     # Create new
                     invoice = Invoice(
@@ -3591,7 +3838,7 @@ async def sync_invoices(
         print("\nFetching credit notes from Zoho...")
         from models.invoice import CreditNote, CreditNoteLineItem
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with zoho._http(timeout=60.0) as client:
             # Get all credit notes (paginated)
             all_creditnotes = []
             page = 1
@@ -3628,12 +3875,21 @@ async def sync_invoices(
             cn_skipped_count = 0
             total_creditnotes = len(all_creditnotes)
 
+            # Last sync time of the fetched credit notes (id -> last_synced), looked up in batches
+            creditnote_ids = [cn_data["creditnote_id"] for cn_data in all_creditnotes]
+            stored_last_synced = {}
+            for start in range(0, len(creditnote_ids), EXISTING_ID_BATCH_SIZE):
+                stmt = select(CreditNote.id, CreditNote.last_synced).where(
+                    CreditNote.id.in_(creditnote_ids[start:start + EXISTING_ID_BATCH_SIZE])
+                )
+                stored_last_synced.update((await session.execute(stmt)).all())
+
             for idx, cn_data in enumerate(all_creditnotes, 1):
                 creditnote_id = cn_data["creditnote_id"]
 
                 # Check if credit note exists and hasn't changed (optimization)
-                existing_cn = await session.get(CreditNote, creditnote_id)
-                if existing_cn:
+                if creditnote_id in stored_last_synced:
+                    cn_last_synced = stored_last_synced[creditnote_id]
                     # Parse updated_time from Zoho
                     zoho_updated = cn_data.get("last_modified_time")
                     if zoho_updated:
@@ -3642,7 +3898,7 @@ async def sync_invoices(
                             zoho_updated_dt = parser.parse(zoho_updated).replace(tzinfo=None)
 
                             # Skip if not modified since last sync
-                            if existing_cn.last_synced and zoho_updated_dt <= existing_cn.last_synced:
+                            if cn_last_synced and zoho_updated_dt <= cn_last_synced:
                                 cn_skipped_count += 1
                                 if idx % 50 == 0:
                                     print(f"Progress: {idx}/{total_creditnotes} ({cn_skipped_count} skipped, {cn_synced_count} updated)")
@@ -3702,7 +3958,7 @@ async def sync_invoices(
                     credit_note.balance = float(cn_detail.get("balance", 0))
                     credit_note.status = cn_detail.get("status", "")
                     credit_note.created_time = created_time
-                    credit_note.last_synced = datetime.utcnow()
+                    credit_note.last_synced = sync_started
                 else:
                     # Create new
                     credit_note = CreditNote(
@@ -3814,7 +4070,7 @@ async def sync_invoices(
         raise HTTPException(status_code=500, detail=f"Invoice sync failed: {str(e)}")
 
 
-@app.get("/api/invoices/dashboard", response_class=HTMLResponse)
+@api.get("/invoices/dashboard", response_class=HTMLResponse)
 async def invoices_dashboard(
     request: Request,
     session: AsyncSession = Depends(get_session),
@@ -3857,7 +4113,7 @@ async def invoices_dashboard(
         raise HTTPException(status_code=500, detail=f"Invoice dashboard failed: {str(e)}")
 
 
-@app.get("/api/invoices/trends", response_class=HTMLResponse)
+@api.get("/invoices/trends", response_class=HTMLResponse)
 async def invoices_trends(request: Request, session: AsyncSession = Depends(get_session)):
     """
     Monthly trends view for invoice-based MRR
@@ -3885,7 +4141,7 @@ async def invoices_trends(request: Request, session: AsyncSession = Depends(get_
 # ACCOUNTING ENDPOINTS
 # ==========================================
 
-@app.get("/api/accounting/dashboard", response_class=HTMLResponse)
+@api.get("/accounting/dashboard", response_class=HTMLResponse)
 async def accounting_dashboard(
     request: Request,
     session: AsyncSession = Depends(get_session),
@@ -3935,7 +4191,7 @@ async def accounting_dashboard(
         raise HTTPException(status_code=500, detail=f"Accounting dashboard failed: {str(e)}")
 
 
-@app.get("/api/accounting/trends", response_class=HTMLResponse)
+@api.get("/accounting/trends", response_class=HTMLResponse)
 async def accounting_trends(request: Request, session: AsyncSession = Depends(get_session)):
     """
     Monthly trends view for accounting-based MRR
@@ -3957,7 +4213,7 @@ async def accounting_trends(request: Request, session: AsyncSession = Depends(ge
         raise HTTPException(status_code=500, detail=f"Accounting trends failed: {str(e)}")
 
 
-@app.get("/api/accounting/month-drilldown", response_class=HTMLResponse)
+@api.get("/accounting/month-drilldown", response_class=HTMLResponse)
 async def accounting_month_drilldown(
     request: Request,
     month: str,
@@ -4054,7 +4310,7 @@ async def accounting_month_drilldown(
         raise HTTPException(status_code=500, detail=f"Accounting drilldown failed: {str(e)}")
 
 
-@app.get("/api/accounting/categories", response_class=HTMLResponse)
+@api.get("/accounting/categories", response_class=HTMLResponse)
 async def accounting_categories(
     request: Request,
     month: str = None,
@@ -4120,7 +4376,7 @@ async def accounting_categories(
         raise HTTPException(status_code=500, detail=f"Accounting categories failed: {str(e)}")
 
 
-@app.get("/api/accounting/category-drilldown", response_class=HTMLResponse)
+@api.get("/accounting/category-drilldown", response_class=HTMLResponse)
 async def accounting_category_drilldown(
     request: Request,
     month: str,
@@ -4165,7 +4421,7 @@ async def accounting_category_drilldown(
 # Product Configuration Endpoints
 # ============================================================================
 
-@app.get("/api/accounting/products")
+@api.get("/accounting/products")
 async def get_all_products(
     session: AsyncSession = Depends(get_session),
     _credentials = Depends(verify_credentials)
@@ -4197,7 +4453,7 @@ async def get_all_products(
         raise HTTPException(status_code=500, detail=f"Failed to get products: {str(e)}")
 
 
-@app.get("/api/accounting/products/{product_name}")
+@api.get("/accounting/products/{product_name}")
 async def get_product_config(
     product_name: str,
     session: AsyncSession = Depends(get_session),
@@ -4235,7 +4491,7 @@ async def get_product_config(
         raise HTTPException(status_code=500, detail=f"Failed to get product config: {str(e)}")
 
 
-@app.put("/api/accounting/products/{product_name}")
+@api.put("/accounting/products/{product_name}")
 async def update_product_config(
     product_name: str,
     config_update: ProductConfigUpdate,
@@ -4324,7 +4580,7 @@ async def update_product_config(
         raise HTTPException(status_code=500, detail=f"Failed to update product config: {str(e)}")
 
 
-@app.delete("/api/accounting/products/{product_name}")
+@api.delete("/accounting/products/{product_name}")
 async def delete_product_config(
     product_name: str,
     session: AsyncSession = Depends(get_session),
@@ -4352,7 +4608,7 @@ async def delete_product_config(
         raise HTTPException(status_code=500, detail=f"Failed to delete product config: {str(e)}")
 
 
-@app.get("/api/accounting/products-admin", response_class=HTMLResponse)
+@api.get("/accounting/products-admin", response_class=HTMLResponse)
 async def products_admin_page(
     request: Request,
     session: AsyncSession = Depends(get_session),
@@ -4377,7 +4633,7 @@ async def products_admin_page(
         raise HTTPException(status_code=500, detail=f"Failed to load products admin: {str(e)}")
 
 
-@app.get("/api/gap-analysis/export")
+@api.get("/gap-analysis/export")
 async def export_gap_analysis(
     month: str = None,
     session: AsyncSession = Depends(get_session)
@@ -4417,7 +4673,7 @@ async def export_gap_analysis(
         raise HTTPException(status_code=500, detail=f"Gap analysis export failed: {str(e)}")
 
 
-@app.get("/api/invoices/month-drilldown", response_class=HTMLResponse)
+@api.get("/invoices/month-drilldown", response_class=HTMLResponse)
 async def invoices_month_drilldown(
     request: Request,
     month: str,
@@ -4562,7 +4818,7 @@ async def invoices_month_drilldown(
         raise HTTPException(status_code=500, detail=f"Invoice drilldown failed: {str(e)}")
 
 
-@app.get("/api/invoices/month-drilldown/export")
+@api.get("/invoices/month-drilldown/export")
 async def export_invoice_month_drilldown(
     month: str,
     session: AsyncSession = Depends(get_session),
@@ -4645,7 +4901,7 @@ async def export_invoice_month_drilldown(
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 
-@app.get("/api/invoices/monthly-trends")
+@api.get("/invoices/monthly-trends")
 async def get_invoice_monthly_trends(
     session: AsyncSession = Depends(get_session),
     months: int = 12,
@@ -4672,7 +4928,7 @@ async def get_invoice_monthly_trends(
 # DEBUG ENDPOINTS
 # ============================================================================
 
-@app.get("/api/dump-non-renewing")
+@api.get("/dump-non-renewing")
 async def dump_non_renewing():
     """Dump raw data for all non-renewing subscriptions from Zoho API"""
     try:
@@ -4690,7 +4946,7 @@ async def dump_non_renewing():
         raise HTTPException(status_code=500, detail=f"Dump failed: {str(e)}")
 
 
-@app.get("/api/debug-invoices")
+@api.get("/debug-invoices")
 async def debug_invoices(zoho: ZohoClient = Depends(get_zoho_client)):
     """Debug endpoint to analyze invoice, product, and plan structure from Zoho"""
     try:
@@ -4853,13 +5109,13 @@ async def version():
 # ADMIN - USER MANAGEMENT ENDPOINTS
 # =============================================================================
 
-@app.get("/api/admin/users-page", response_class=HTMLResponse)
+@api.get("/admin/users-page", response_class=HTMLResponse)
 async def admin_users_page(request: Request):
     """Admin users management page"""
     return templates.TemplateResponse("admin_users.html", {"request": request})
 
 
-@app.get("/api/admin/versions-page", response_class=HTMLResponse)
+@api.get("/admin/versions-page", response_class=HTMLResponse)
 async def admin_versions_page(request: Request):
     """Admin versions management page"""
     return templates.TemplateResponse("admin_versions.html", {"request": request})
@@ -4891,7 +5147,7 @@ class VersionCreate(BaseModel):
     release_notes: str
 
 
-@app.get("/api/admin/users")
+@api.get("/admin/users")
 async def get_users(session: AsyncSession = Depends(get_session)):
     """Get all users"""
     from services import UserService
@@ -4914,7 +5170,7 @@ async def get_users(session: AsyncSession = Depends(get_session)):
     ]
 
 
-@app.post("/api/admin/users")
+@api.post("/admin/users")
 async def create_user(
     user_data: UserCreate,
     session: AsyncSession = Depends(get_session)
@@ -4975,7 +5231,7 @@ async def create_user(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.put("/api/admin/users/{user_id}")
+@api.put("/admin/users/{user_id}")
 async def update_user(
     user_id: int,
     user_data: UserUpdate,
@@ -5012,7 +5268,7 @@ async def update_user(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.delete("/api/admin/users/{user_id}")
+@api.delete("/admin/users/{user_id}")
 async def delete_user(
     user_id: int,
     session: AsyncSession = Depends(get_session)
@@ -5029,7 +5285,7 @@ async def delete_user(
     return {"message": "User deleted successfully"}
 
 
-@app.get("/api/admin/versions")
+@api.get("/admin/versions")
 async def get_versions(session: AsyncSession = Depends(get_session)):
     """Get all versions"""
     from models.user import AppVersion
@@ -5053,7 +5309,7 @@ async def get_versions(session: AsyncSession = Depends(get_session)):
     ]
 
 
-@app.post("/api/admin/versions")
+@api.post("/admin/versions")
 async def create_version(
     version_data: VersionCreate,
     request: Request,
@@ -5141,7 +5397,7 @@ async def create_version(
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/api/admin/versions/{version}/notify")
+@api.post("/admin/versions/{version}/notify")
 async def send_version_notifications(
     version: str,
     session: AsyncSession = Depends(get_session)
@@ -5207,6 +5463,9 @@ async def send_version_notifications(
     return {"sent_count": sent_count}
 
 
+app.include_router(api)
+
+
 if __name__ == "__main__":
     import uvicorn
 
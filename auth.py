@@ -1,13 +1,24 @@
 """
 Simple Basic Authentication for SaaS Analytics Dashboard
 """
+import base64
 import secrets
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from config import settings
 
 security = HTTPBasic()
 
+# Expected Authorization header for the /api routes (None = auth disabled)
+if settings.auth_username and settings.auth_password:
+    _EXPECTED_AUTH = (
+        "Basic " + base64.b64encode(f"{settings.auth_username}:{settings.auth_password}".encode("utf-8")).decode("ascii")
+    ).encode("ascii")
+else:
+    _EXPECTED_AUTH = None
+
+_AUTH_CHALLENGE = {"WWW-Authenticate": "Basic realm=\"SaaS Analytics\""}
+
 
 def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)) -> str:
     """
@@ -40,3 +51,27 @@ def verify_credentials(credentials: HTTPBasicCredentials = Depends(security)) ->
         )
 
     return credentials.username
+
+
+def verify_api_auth(request: Request) -> None:
+    """
+    Router-wide Basic Auth for /api/* routes (no-op if credentials are not configured).
+    Compares the Authorization header against the precomputed value in constant time.
+    """
+    if _EXPECTED_AUTH is None:
+        return
+
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Basic "):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication required",
+            headers=_AUTH_CHALLENGE,
+        )
+
+    if not secrets.compare_digest(auth_header.encode("utf-8"), _EXPECTED_AUTH):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials",
+            headers=_AUTH_CHALLENGE,
+        )
@@ -6,7 +6,7 @@ import asyncio
 from datetime import datetime
 from database import AsyncSessionLocal
 from models.invoice import Invoice, InvoiceLineItem
-from sqlalchemy import select
+from sqlalchemy import select, case, cast, func, Float
 from sqlalchemy.orm import selectinload
 
 
@@ -59,43 +59,17 @@ async def calculate_invoice_mrr():
         # Get subscription-based MRR for comparison
         from models.subscription import Subscription
 
+        # Summed by the database. `interval` holds the unit ("months"/"years"), counting
+        # as 1 of that unit, so only yearly plans are spread over 12 months
+        amount = cast(func.coalesce(Subscription.amount, 0), Float)
         result = await session.execute(
-            select(Subscription)
+            select(func.coalesce(func.sum(case(
+                (func.lower(Subscription.interval) == 'years', amount / 1.25 / 12),
+                else_=amount / 1.25
+            )), 0))
             .where(Subscription.status.in_(['live', 'non_renewing']))
         )
-        subscriptions = result.scalars().all()
-
-        subscription_mrr = 0
-        for sub in subscriptions:
-            amount = float(sub.amount or 0)
-            vat_exclusive = amount / 1.25
-
-            # Handle interval and interval_unit
-            interval_val = sub.interval
-            interval_unit = str(sub.interval_unit or 'months').lower()
-
-            # Check if interval contains unit name (data inconsistency)
-            if isinstance(interval_val, str):
-                if interval_val.lower() in ['years', 'months']:
-                    # Swap: interval contains unit, interval_unit contains number
-                    interval_unit = interval_val.lower()
-                    interval = 1
-                else:
-                    try:
-                        interval = int(interval_val)
-                    except:
-                        interval = 1
-            else:
-                interval = int(interval_val or 1)
-
-            if interval_unit == 'years':
-                mrr = vat_exclusive / 12
-            elif interval_unit == 'months':
-                mrr = vat_exclusive / interval
-            else:
-                mrr = vat_exclusive
-
-            subscription_mrr += mrr
+        subscription_mrr = result.scalar()
 
         print("\n" + "="*80)
         print("COMPARISON")
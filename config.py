@@ -21,6 +21,10 @@ class Settings(BaseSettings):
     port: int = 8000
     database_url: str = "sqlite+aiosqlite:///./data/app.db"
 
+    # Daily Zoho sync inside the app process (set to false when an external
+    # scheduler calls POST /api/auto-sync instead, e.g. with several workers)
+    auto_sync_enabled: bool = True
+
     # Authentication Configuration (optional - if not set, auth is disabled)
     auth_username: str = ""
     auth_password: str = ""
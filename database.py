@@ -1,9 +1,10 @@
+from sqlalchemy import text, inspect, select, update, or_, and_
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
-from models.subscription import Base
+from models.subscription import Base, match_key
 from config import settings
 # Import all models to register them with Base.metadata
-from models import User, AppVersion, EmailLog, ProductConfiguration
+from models import User, AppVersion, EmailLog, ProductConfiguration, Subscription, InvoiceLineItem
 # Force reload for churned_customers column
 
 
@@ -14,10 +15,24 @@ if database_url.startswith("postgresql://") and "+asyncpg" not in database_url:
     print(f"[INFO] Fixed DATABASE_URL to use asyncpg driver: {database_url[:50]}...")
 
 # Create async engine
+if "sqlite" in settings.database_url:
+    pool_options = {"poolclass": NullPool}
+else:
+    # Enough warm connections for a long-running sync alongside dashboard/metrics
+    # requests (20 + 10 overflow). pre_ping drops connections the server closed,
+    # and anything older than 30 minutes is recycled
+    pool_options = {
+        "pool_size": 20,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    }
+
 engine = create_async_engine(
     database_url,
     echo=settings.app_env == "dev",
-    poolclass=NullPool if "sqlite" in settings.database_url else None,
+    **pool_options,
 )
 
 # Create session factory
@@ -28,11 +43,117 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+# Columns added to existing tables after their first release (create_all only creates missing tables)
+MATCH_KEY_COLUMNS = [
+    ("subscriptions", "call_sign_key"),
+    ("subscriptions", "vessel_key"),
+    ("invoice_line_items", "call_sign_key"),
+    ("invoice_line_items", "vessel_key"),
+]
+
+MATCH_KEY_INDEXES = [
+    ("ix_invoice_line_items_call_sign_key", """
+        CREATE INDEX IF NOT EXISTS ix_invoice_line_items_call_sign_key
+        ON invoice_line_items(call_sign_key);
+    """),
+    ("ix_invoice_line_items_vessel_key", """
+        CREATE INDEX IF NOT EXISTS ix_invoice_line_items_vessel_key
+        ON invoice_line_items(vessel_key);
+    """),
+]
+
+MATCH_KEY_BATCH_SIZE = 5000
+
+
+def _column_names(sync_conn, table):
+    """Column names currently in a table"""
+    return {col['name'] for col in inspect(sync_conn).get_columns(table)}
+
+
+async def _backfill_match_keys(session, model):
+    """Fill in keys missing on existing rows (same normalization as the model listeners)"""
+    columns = [model.id, model.call_sign, model.vessel_name, model.call_sign_key, model.vessel_key]
+    # The backfill is not a sync - write last_synced back unchanged so its onupdate does not fire
+    if hasattr(model, 'last_synced'):
+        columns.append(model.last_synced)
+
+    result = await session.execute(
+        select(*columns).where(or_(
+            and_(model.call_sign_key.is_(None), model.call_sign.isnot(None)),
+            and_(model.vessel_key.is_(None), model.vessel_name.isnot(None)),
+        ))
+    )
+    rows = []
+    for row in result.mappings():
+        keys = {'call_sign_key': match_key(row['call_sign']), 'vessel_key': match_key(row['vessel_name'])}
+        # Blank names normalize to None - rows whose keys are already right need no update
+        if keys['call_sign_key'] == row['call_sign_key'] and keys['vessel_key'] == row['vessel_key']:
+            continue
+        if 'last_synced' in row:
+            keys['last_synced'] = row['last_synced']
+        rows.append({'id': row['id'], **keys})
+
+    for i in range(0, len(rows), MATCH_KEY_BATCH_SIZE):
+        # Bulk UPDATE by primary key (executemany)
+        await session.execute(update(model), rows[i:i + MATCH_KEY_BATCH_SIZE])
+    return len(rows)
+
+
+async def migrate_match_keys():
+    """
+    Add the call sign / vessel match key columns to existing tables, index and backfill them
+
+    Safe to run repeatedly. Every step runs in its own transaction, so a failed step
+    is rolled back without aborting the ones after it (PostgreSQL rejects every
+    statement in a transaction after an error).
+
+    Returns:
+        List of (ok, message) tuples, one per step that did something or failed
+    """
+    results = []
+
+    # 1. Add columns that are missing (SQLite has no ADD COLUMN IF NOT EXISTS)
+    for table, column in MATCH_KEY_COLUMNS:
+        try:
+            async with engine.begin() as conn:
+                if column in await conn.run_sync(_column_names, table):
+                    continue
+                if_not_exists = " IF NOT EXISTS" if conn.dialect.name == "postgresql" else ""
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN{if_not_exists} {column} VARCHAR"))
+            results.append((True, f"Added {column} to {table}"))
+        except Exception as e:
+            results.append((False, f"{table}.{column}: {e}"))
+
+    # 2. Index the invoice line keys used for matching
+    for name, statement in MATCH_KEY_INDEXES:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(statement))
+        except Exception as e:
+            results.append((False, f"{name}: {e}"))
+
+    # 3. Backfill existing rows
+    for model in (Subscription, InvoiceLineItem):
+        try:
+            async with AsyncSessionLocal() as session:
+                count = await _backfill_match_keys(session, model)
+                await session.commit()
+            if count:
+                results.append((True, f"Backfilled match keys for {count} {model.__tablename__}"))
+        except Exception as e:
+            results.append((False, f"Backfill {model.__tablename__}: {e}"))
+
+    return results
+
+
 async def init_db():
-    """Initialize database tables"""
+    """Initialize database tables and add columns that existing tables are missing"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    for ok, message in await migrate_match_keys():
+        print(f"[DB] {'Migrated' if ok else 'Migration failed'}: {message}")
+
 
 async def get_session() -> AsyncSession:
     """Dependency for getting database sessions"""
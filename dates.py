@@ -0,0 +1,27 @@
+"""
+Month-end snapshot dates shared by the MRR calculations
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def month_end_snapshot(year: int, month: int) -> datetime:
+    """
+    Last second of a month - the snapshot date used for month-end closing
+
+    Items count towards a month when they are active at this moment
+    (period_start_date <= month_end AND period_end_date >= month_end).
+
+    Args:
+        year: Year (e.g. 2025)
+        month: Month number 1-12
+
+    Returns:
+        datetime for the last day of the month at 23:59:59
+    """
+    if month == 12:
+        next_month = datetime(year + 1, 1, 1)
+    else:
+        next_month = datetime(year, month + 1, 1)
+    return next_month - timedelta(seconds=1)
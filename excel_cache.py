@@ -0,0 +1,235 @@
+"""
+Parquet cache for the Zoho Excel exports used by the analysis scripts
+
+Parsing XLSX (zip + XML) is the slowest part of most analysis runs. The first
+read converts the sheet to a Parquet file next to the workbook; later runs load
+the typed, columnar copy instead. The Parquet file is rebuilt whenever the
+workbook is newer.
+"""
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+BATCH_SIZE = 10000
+COLUMNS_KEY = b'excel_cache.columns'
+
+
+def parquet_path_for(xlsx_path: str, header: int = 0) -> str:
+    """Parquet cache path for a workbook (header row is part of the name)"""
+    base, _ = os.path.splitext(xlsx_path)
+    return f"{base}.parquet" if header == 0 else f"{base}.h{header}.parquet"
+
+
+def _convert_cell(cell):
+    """Cell value as pd.read_excel sees it (empty -> '', error -> NaN, whole numbers -> int)"""
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+def _sheet_rows(sheet):
+    """Rows of a read-only sheet, trimmed and padded the way pd.read_excel does it"""
+    sheet.reset_dimensions()
+
+    rows = []
+    last_row_with_data = -1
+    for row in sheet.rows:
+        values = [_convert_cell(cell) for cell in row]
+        while values and values[-1] == '':
+            values.pop()
+        if values:
+            last_row_with_data = len(rows)
+        rows.append(values)
+    del rows[last_row_with_data + 1:]
+
+    width = max((len(values) for values in rows), default=0)
+    for values in rows:
+        values.extend([''] * (width - len(values)))
+    return rows
+
+
+def _is_mixed(values):
+    """True for object columns holding anything but text (numbers next to text, dates, booleans with gaps)"""
+    return values.dtype == object and not all(isinstance(value, str) for value in values.dropna())
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table for a sheet DataFrame, as stored in the cache
+
+    Typed columns map to their Arrow types. Object columns that mix cell types
+    are stored as pickled cells in a binary column, so every value comes back
+    with the type pd.read_excel gave it (see column_values()). Arrow needs text
+    column names, so the original header values are kept in the schema metadata.
+    """
+    arrays = []
+    for col in df.columns:
+        values = df[col]
+        if _is_mixed(values):
+            arrays.append(pa.array(
+                [None if pd.isna(value) else pickle.dumps(value) for value in values],
+                type=pa.binary()
+            ))
+        elif values.dtype == object and values.isna().all():
+            # Columns that are always empty are stored as text
+            arrays.append(pa.array([None] * len(values), type=pa.string()))
+        else:
+            arrays.append(pa.Array.from_pandas(values))
+
+    names = [str(col) for col in df.columns]
+    table = pa.table(arrays, names=names)
+    return table.replace_schema_metadata({COLUMNS_KEY: pickle.dumps(dict(zip(names, df.columns)))})
+
+
+def _original_names(schema) -> dict:
+    """Header values by Arrow column name (names are their own header for tables without the metadata)"""
+    if schema.metadata and COLUMNS_KEY in schema.metadata:
+        return pickle.loads(schema.metadata[COLUMNS_KEY])
+    return {name: name for name in schema.names}
+
+
+def column_values(column) -> pd.Series:
+    """Cached Arrow column as a pandas Series with the cell types pd.read_excel gives"""
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if pa.types.is_binary(column.type):
+        return pd.Series(
+            [np.nan if value is None else pickle.loads(value) for value in column.to_pylist()],
+            dtype=object
+        )
+    values = column.to_pandas()
+    if pa.types.is_string(column.type):
+        # pd.read_excel marks empty text cells with NaN, Arrow with None
+        values = values.fillna(np.nan)
+    return values
+
+
+def from_arrow(table: pa.Table) -> pd.DataFrame:
+    """DataFrame for a cached Arrow table (inverse of to_arrow())"""
+    original = _original_names(table.schema)
+    df = pd.DataFrame({name: column_values(table[name]) for name in table.column_names})
+    df.columns = [original.get(name, name) for name in table.column_names]
+    return df
+
+
+def convert_xlsx_to_parquet(xlsx_path: str, parquet_path: str = None, header: int = 0) -> str:
+    """
+    One-time conversion of the first sheet of a workbook to Parquet
+
+    Reads the cells from openpyxl in read-only mode and parses them with the
+    same TextParser call pd.read_excel uses, so the cached frame has the same
+    columns, types and values. The file is written to a temp file and moved
+    into place only when complete.
+
+    Args:
+        xlsx_path: Path to the Excel file
+        parquet_path: Output path (defaults to parquet_path_for(xlsx_path, header))
+        header: Row index (0-based) holding the column names
+
+    Returns:
+        Path to the written Parquet file
+    """
+    parquet_path = parquet_path or parquet_path_for(xlsx_path, header)
+
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = _sheet_rows(wb.worksheets[0])
+    finally:
+        wb.close()
+
+    # Blank rows inside the sheet stay as empty rows, like in pd.read_excel
+    df = TextParser(rows, header=header, skip_blank_lines=False).read()
+    table = to_arrow(df)
+
+    # Never leave a partial file at the cache path - it would be trusted on later runs
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(parquet_path)), suffix='.parquet.tmp')
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path, compression='zstd', row_group_size=BATCH_SIZE)
+        os.replace(tmp_path, parquet_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return parquet_path
+
+
+def _is_current(parquet_path: str, xlsx_path: str) -> bool:
+    """True if the Parquet copy exists, is newer than the workbook and was written in the current format"""
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(xlsx_path):
+        return False
+    # Caches written before the cell types were kept lack the column metadata
+    metadata = pq.read_schema(parquet_path).metadata or {}
+    return COLUMNS_KEY in metadata
+
+
+def cached_parquet_path(xlsx_path: str, header: int = 0) -> str:
+    """
+    Path to an up-to-date Parquet copy of a workbook, converting it first if needed
+
+    Args:
+        xlsx_path: Path to the Excel file
+        header: Row index (0-based) holding the column names
+
+    Returns:
+        Path to the Parquet file
+    """
+    parquet_path = parquet_path_for(xlsx_path, header)
+
+    if not _is_current(parquet_path, xlsx_path):
+        print(f"  Converting {os.path.basename(xlsx_path)} to Parquet (one-time)...")
+        convert_xlsx_to_parquet(xlsx_path, parquet_path, header)
+
+    return parquet_path
+
+
+def read_excel_cached(xlsx_path: str, header: int = 0, columns=None, dtype=None) -> pd.DataFrame:
+    """
+    Read the first sheet of a workbook through the Parquet cache
+
+    Falls back to pd.read_excel if the Parquet copy cannot be written.
+
+    Args:
+        xlsx_path: Path to the Excel file
+        header: Row index (0-based) holding the column names
+        columns: Optional collection of column names to load (missing ones are skipped)
+        dtype: Optional {column: dtype} mapping applied after loading
+
+    Returns:
+        DataFrame with the requested columns
+    """
+    try:
+        parquet_path = cached_parquet_path(xlsx_path, header)
+    except Exception as e:
+        print(f"  WARNING: Could not write Parquet cache ({e}), reading Excel directly")
+        return pd.read_excel(
+            xlsx_path,
+            engine='openpyxl',
+            sheet_name=0,
+            header=header,
+            usecols=(lambda col: col in columns) if columns is not None else None,
+            dtype=dtype
+        )
+
+    if columns is not None:
+        columns = [name for name, col in _original_names(pq.read_schema(parquet_path)).items() if col in columns]
+
+    df = from_arrow(pq.read_table(parquet_path, columns=columns))
+
+    if dtype:
+        df = df.astype({col: t for col, t in dtype.items() if col in df.columns})
+
+    return df
@@ -42,7 +42,7 @@ async def fix_linking():
             if sub.vessel_name and sub.customer_name:
                 vessel_clean = sub.vessel_name.strip().upper()
                 customer_clean = sub.customer_name.strip().upper()
-                key = f"{vessel_clean}|{customer_clean}"
+                key = (vessel_clean, customer_clean)
                 if key not in sub_by_vessel_customer:
                     sub_by_vessel_customer[key] = []
                 sub_by_vessel_customer[key].append(sub)
@@ -92,7 +92,7 @@ async def fix_linking():
             if not matched_sub and hasattr(line_item, 'vessel_name') and line_item.vessel_name:
                 vessel_clean = line_item.vessel_name.strip().upper()
                 customer_clean = invoice.customer_name.strip().upper()
-                key = f"{vessel_clean}|{customer_clean}"
+                key = (vessel_clean, customer_clean)
                 if key in sub_by_vessel_customer:
                     matched_sub = sub_by_vessel_customer[key][0]
                     matched_by_vessel += 1
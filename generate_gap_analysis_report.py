@@ -10,7 +10,22 @@ from datetime import datetime
 from database import AsyncSessionLocal
 from models.invoice import Invoice, InvoiceLineItem
 from models.subscription import Subscription
-from sqlalchemy import select
+from sqlalchemy import select, case, cast, func, literal, Float, String
+
+# Subscription amount and MRR computed in SQL, so rows arrive as native floats.
+# `interval` normally holds the unit ("months"/"years"), counting as 1 of that unit;
+# any other value falls back to `interval_unit` as the unit (billed as a monthly amount)
+INTERVAL_TEXT = func.lower(Subscription.interval)
+INTERVAL_UNIT = case(
+    (INTERVAL_TEXT.in_(['years', 'months']), INTERVAL_TEXT),
+    (func.coalesce(Subscription.interval_unit, 0) == 0, 'months'),
+    else_=cast(Subscription.interval_unit, String)
+)
+SUB_AMOUNT = cast(func.coalesce(Subscription.amount, 0), Float)
+SUB_MRR = case(
+    (INTERVAL_UNIT == 'years', SUB_AMOUNT / 1.25 / 12),
+    else_=SUB_AMOUNT / 1.25
+)
 
 
 async def generate_comprehensive_report():
@@ -41,91 +56,73 @@ async def generate_comprehensive_report():
         # ===== FETCH SUBSCRIPTION DATA =====
         print("\n[1/6] Fetching subscription data...")
         sub_result = await session.execute(
-            select(Subscription).where(Subscription.status.in_(['live', 'non_renewing']))
+            select(
+                Subscription.id,
+                Subscription.customer_name,
+                Subscription.plan_name,
+                Subscription.status,
+                SUB_AMOUNT.label('amount'),
+                (literal('1 ') + INTERVAL_UNIT).label('interval_label'),
+                SUB_MRR.label('mrr'),
+                Subscription.vessel_name,
+                Subscription.call_sign,
+                Subscription.vessel_key,
+                Subscription.call_sign_key,
+                Subscription.created_time
+            ).where(Subscription.status.in_(['live', 'non_renewing']))
         )
-        subscriptions = sub_result.scalars().all()
-
-        subscription_data = []
-        sub_mrr_by_customer = {}
-        sub_by_call_sign = {}
-        sub_by_vessel_customer = {}
-        total_sub_mrr = 0
-
-        for sub in subscriptions:
-            # Calculate MRR (accounting for VAT and intervals)
-            amount = float(sub.amount or 0)
-            interval_unit = str(sub.interval_unit or 'months').lower()
-            interval_val = sub.interval
-
-            if isinstance(interval_val, str):
-                if interval_val.lower() in ['years', 'months']:
-                    interval_unit = interval_val.lower()
-                    interval = 1
-                else:
-                    try:
-                        interval = int(interval_val)
-                    except:
-                        interval = 1
-            else:
-                interval = int(interval_val or 1)
-
-            if interval_unit == 'years':
-                mrr = (amount / 1.25) / 12
-            elif interval_unit == 'months':
-                mrr = (amount / 1.25) / interval
-            else:
-                mrr = amount / 1.25
-
-            customer_name = sub.customer_name
-            sub_id = sub.id
-
-            subscription_data.append({
-                'Subscription ID': sub_id,
-                'Kunde': customer_name,
-                'Plan': sub.plan_name or '',
-                'Status': sub.status,
-                'Beløp (inkl. MVA)': amount,
-                'Intervall': f"{interval} {interval_unit}",
-                'MRR (ekskl. MVA)': mrr,
-                'Fartøy': sub.vessel_name or '',
-                'Kallesignal': sub.call_sign or '',
-                'Opprettet': sub.created_time.strftime('%Y-%m-%d') if sub.created_time else '',
-            })
-
-            sub_mrr_by_customer[customer_name] = sub_mrr_by_customer.get(customer_name, 0) + mrr
-            total_sub_mrr += mrr
-
-            # Index by call sign
-            if sub.call_sign:
-                call_sign_clean = sub.call_sign.strip().upper()
-                if call_sign_clean not in sub_by_call_sign:
-                    sub_by_call_sign[call_sign_clean] = []
-                sub_by_call_sign[call_sign_clean].append({'sub_id': sub_id, 'customer': customer_name, 'mrr': mrr})
-
-            # Index by vessel + customer
-            if sub.vessel_name:
-                vessel_clean = sub.vessel_name.strip().upper()
-                key = f"{vessel_clean}|{customer_name}"
-                if key not in sub_by_vessel_customer:
-                    sub_by_vessel_customer[key] = []
-                sub_by_vessel_customer[key].append({'sub_id': sub_id, 'customer': customer_name, 'mrr': mrr})
-
-        print(f"  [OK] {len(subscriptions)} subscriptions loaded")
+        subs = pd.DataFrame(sub_result.all(), columns=list(sub_result.keys()))
+
+        subscription_data = pd.DataFrame({
+            'Subscription ID': subs['id'],
+            'Kunde': subs['customer_name'],
+            'Plan': subs['plan_name'].fillna(''),
+            'Status': subs['status'],
+            'Beløp (inkl. MVA)': subs['amount'],
+            'Intervall': subs['interval_label'],
+            'MRR (ekskl. MVA)': subs['mrr'],
+            'Fartøy': subs['vessel_name'].fillna(''),
+            'Kallesignal': subs['call_sign'].fillna(''),
+            'Opprettet': pd.to_datetime(subs['created_time']).dt.strftime('%Y-%m-%d').fillna(''),
+        }).to_dict('records')
+
+        sub_mrr_by_customer = subs.groupby('customer_name', sort=False)['mrr'].sum().to_dict()
+        total_sub_mrr = subs['mrr'].sum()
+
+        print(f"  [OK] {len(subs)} subscriptions loaded")
         print(f"  [OK] Total Subscription MRR: {total_sub_mrr:,.2f} NOK")
 
         # ===== FETCH INVOICE DATA =====
         print(f"\n[2/6] Fetching invoice data for {month_name}...")
         # Use snapshot approach: only include invoices active on LAST DAY of month
         # This matches the snapshot calculation method (consistent with subscription MRR)
-        inv_result = await session.execute(
-            select(InvoiceLineItem, Invoice)
+        # Plain columns, streamed in batches - one pass builds the invoice sheet,
+        # the MRR sums and the line keys used for call sign / vessel matching
+        inv_result = await session.stream(
+            select(
+                Invoice.invoice_number,
+                Invoice.transaction_type,
+                Invoice.customer_name,
+                Invoice.invoice_date,
+                InvoiceLineItem.name,
+                InvoiceLineItem.period_start_date,
+                InvoiceLineItem.period_end_date,
+                InvoiceLineItem.period_months,
+                InvoiceLineItem.item_total,
+                InvoiceLineItem.mrr_per_month,
+                InvoiceLineItem.subscription_id,
+                InvoiceLineItem.vessel_name,
+                InvoiceLineItem.call_sign,
+                InvoiceLineItem.vessel_key,
+                InvoiceLineItem.call_sign_key
+            )
             .join(Invoice, InvoiceLineItem.invoice_id == Invoice.id)
             .where(
                 InvoiceLineItem.period_start_date <= target_month_end,
                 InvoiceLineItem.period_end_date >= target_month_end  # Snapshot: active on month-end
             )
+            .execution_options(yield_per=5000)
         )
-        invoice_rows = inv_result.all()
 
         invoice_data = []
         inv_mrr_by_customer = {}
@@ -134,25 +131,28 @@ async def generate_comprehensive_report():
         total_inv_positive = 0
         total_inv_negative = 0
 
-        for line_item, invoice in invoice_rows:
-            mrr = line_item.mrr_per_month or 0
-            customer_name = invoice.customer_name
-            sub_id = line_item.subscription_id
+        # (call sign key, vessel key, customer) per line - matched against subscriptions below
+        line_keys = []
+
+        async for line in inv_result:
+            mrr = line.mrr_per_month or 0
+            customer_name = line.customer_name
+            sub_id = line.subscription_id
 
             invoice_data.append({
-                'Fakturanr': invoice.invoice_number,
-                'Type': 'Faktura' if invoice.transaction_type == 'invoice' else 'Kreditnota',
+                'Fakturanr': line.invoice_number,
+                'Type': 'Faktura' if line.transaction_type == 'invoice' else 'Kreditnota',
                 'Kunde': customer_name,
-                'Produktnavn': line_item.name or '',
-                'Periode Start': line_item.period_start_date.strftime('%Y-%m-%d') if line_item.period_start_date else '',
-                'Periode Slutt': line_item.period_end_date.strftime('%Y-%m-%d') if line_item.period_end_date else '',
-                'Periode (mnd)': line_item.period_months or 0,
-                'Totalt Beløp': line_item.item_total or 0,
+                'Produktnavn': line.name or '',
+                'Periode Start': line.period_start_date.strftime('%Y-%m-%d') if line.period_start_date else '',
+                'Periode Slutt': line.period_end_date.strftime('%Y-%m-%d') if line.period_end_date else '',
+                'Periode (mnd)': line.period_months or 0,
+                'Totalt Beløp': line.item_total or 0,
                 'MRR per Måned': mrr,
                 'Subscription ID': sub_id or '',
-                'Fartøy': line_item.vessel_name or '',
-                'Kallesignal': line_item.call_sign or '',
-                'Fakturadato': invoice.invoice_date.strftime('%Y-%m-%d') if invoice.invoice_date else '',
+                'Fartøy': line.vessel_name or '',
+                'Kallesignal': line.call_sign or '',
+                'Fakturadato': line.invoice_date.strftime('%Y-%m-%d') if line.invoice_date else '',
             })
 
             inv_mrr_by_customer[customer_name] = inv_mrr_by_customer.get(customer_name, 0) + mrr
@@ -166,7 +166,10 @@ async def generate_comprehensive_report():
             if sub_id:
                 inv_mrr_by_sub_id[sub_id] = inv_mrr_by_sub_id.get(sub_id, 0) + mrr
 
-        print(f"  [OK] {len(invoice_rows)} invoice line items loaded")
+            if line.call_sign_key or line.vessel_key:
+                line_keys.append((line.call_sign_key, line.vessel_key, customer_name))
+
+        print(f"  [OK] {len(invoice_data)} invoice line items loaded")
         print(f"  [OK] Total Invoice MRR: {total_inv_mrr:,.2f} NOK")
         print(f"    - Positive (Fakturaer): {total_inv_positive:,.2f} NOK")
         print(f"    - Negative (Kreditnotaer): {total_inv_negative:,.2f} NOK")
@@ -174,39 +177,33 @@ async def generate_comprehensive_report():
         # ===== MATCHING ANALYSIS =====
         print("\n[3/6] Performing multi-tier matching...")
 
-        matched_by_sub_id = set()
-        matched_by_call_sign = set()
-        matched_by_vessel = set()
+        # Subscriptions sharing a call sign / vessel with a line of the same customer -
+        # hash joins on the keys instead of a dict lookup per invoice line
+        line_keys = pd.DataFrame(line_keys, columns=['call_sign_key', 'vessel_key', 'customer_name']).drop_duplicates()
+        sub_keys = subs[['id', 'customer_name', 'call_sign_key', 'vessel_key']]
+        call_sign_candidates = set(
+            line_keys.dropna(subset=['call_sign_key'])
+            .merge(sub_keys, on=['call_sign_key', 'customer_name'])['id']
+        )
+        vessel_candidates = set(
+            line_keys.dropna(subset=['vessel_key'])
+            .merge(sub_keys, on=['vessel_key', 'customer_name'])['id']
+        )
 
         # Tier 1: Subscription ID
-        for sub_id in inv_mrr_by_sub_id.keys():
-            if any(s['Subscription ID'] == sub_id for s in subscription_data):
-                matched_by_sub_id.add(sub_id)
-
-        # Tier 2: Call Sign
-        for line_item, invoice in invoice_rows:
-            if line_item.call_sign:
-                call_sign_clean = line_item.call_sign.strip().upper()
-                if call_sign_clean in sub_by_call_sign:
-                    for sub_info in sub_by_call_sign[call_sign_clean]:
-                        if invoice.customer_name == sub_info['customer']:
-                            if sub_info['sub_id'] not in matched_by_sub_id:
-                                matched_by_call_sign.add(sub_info['sub_id'])
-
-        # Tier 3: Vessel + Customer
-        for line_item, invoice in invoice_rows:
-            if line_item.vessel_name:
-                vessel_clean = line_item.vessel_name.strip().upper()
-                key = f"{vessel_clean}|{invoice.customer_name}"
-                if key in sub_by_vessel_customer:
-                    for sub_info in sub_by_vessel_customer[key]:
-                        if sub_info['sub_id'] not in matched_by_sub_id and sub_info['sub_id'] not in matched_by_call_sign:
-                            matched_by_vessel.add(sub_info['sub_id'])
+        sub_ids = set(subs['id'])
+        matched_by_sub_id = {sub_id for sub_id in inv_mrr_by_sub_id if sub_id in sub_ids}
+
+        # Tier 2: Call Sign (not already matched by ID)
+        matched_by_call_sign = call_sign_candidates - matched_by_sub_id
+
+        # Tier 3: Vessel + Customer (not matched by ID or call sign)
+        matched_by_vessel = vessel_candidates - matched_by_sub_id - matched_by_call_sign
 
         all_matched = matched_by_sub_id | matched_by_call_sign | matched_by_vessel
-        match_pct = (len(all_matched) / len(subscriptions) * 100) if subscriptions else 0
+        match_pct = (len(all_matched) / len(subs) * 100) if len(subs) else 0
 
-        print(f"  [OK] Matched {len(all_matched)} / {len(subscriptions)} subscriptions ({match_pct:.1f}%)")
+        print(f"  [OK] Matched {len(all_matched)} / {len(subs)} subscriptions ({match_pct:.1f}%)")
         print(f"    - By Subscription ID: {len(matched_by_sub_id)}")
         print(f"    - By Call Sign: {len(matched_by_call_sign)}")
         print(f"    - By Vessel: {len(matched_by_vessel)}")
@@ -364,8 +361,8 @@ async def generate_comprehensive_report():
                     f"{total_inv_mrr - total_sub_mrr:,.2f} NOK",
                     f"{((total_inv_mrr - total_sub_mrr) / total_sub_mrr * 100):.2f}%",
                     '',
-                    len(subscriptions),
-                    len(invoice_rows),
+                    len(subs),
+                    len(invoice_data),
                     len(sub_mrr_by_customer),
                     len(inv_mrr_by_customer),
                     '',
@@ -373,7 +370,7 @@ async def generate_comprehensive_report():
                     len(matched_by_sub_id),
                     len(matched_by_call_sign),
                     len(matched_by_vessel),
-                    len(subscriptions) - len(all_matched),
+                    len(subs) - len(all_matched),
                     '',
                     '',
                     f"{len(name_mismatch_data)} kunder",
@@ -23,6 +23,9 @@ from services.product_config import ProductConfigService
 from sqlalchemy import delete, select
 from models.product_config import ProductConfiguration
 
+# Pattern: "Gjelder perioden DD MMM YYYY til DD MMM YYYY"
+PERIOD_PATTERN = re.compile(r'(\d{1,2}\s+\w+\s+\d{4})\s+til\s+(\d{1,2}\s+\w+\s+\d{4})', re.IGNORECASE)
+
 
 def should_be_12_months(item_name: str) -> bool:
     """
@@ -77,8 +80,7 @@ def parse_period_from_description(description: str, item_name: str = "") -> tupl
 
     try:
         # Pattern: "Gjelder perioden DD MMM YYYY til DD MMM YYYY"
-        pattern = r'(\d{1,2}\s+\w+\s+\d{4})\s+til\s+(\d{1,2}\s+\w+\s+\d{4})'
-        match = re.search(pattern, description, re.IGNORECASE)
+        match = PERIOD_PATTERN.search(description)
 
         if match:
             start_str = match.group(1)
@@ -108,6 +110,19 @@ def parse_period_from_description(description: str, item_name: str = "") -> tupl
     return None, None, 1
 
 
+def read_receivables_excel(file_path: str) -> pd.DataFrame:
+    """Read the Receivable Details export (column names are in the first data row)"""
+    df = pd.read_excel(file_path)
+
+    # First row contains column names
+    col_names = df.iloc[0].tolist()
+    df = pd.read_excel(file_path, skiprows=1, header=None)
+    df.columns = col_names
+
+    # Remove the duplicate header row
+    return df[df['transaction_type'] != 'transaction_type']
+
+
 async def import_accounting_excel(file_path: str, source_month: str = None):
     """
     Import accounting receivable details from Excel file
@@ -121,17 +136,9 @@ async def import_accounting_excel(file_path: str, source_month: str = None):
     print(f"File: {file_path}")
     print(f"{'='*120}")
 
-    # Read Excel file
+    # Read Excel file (blocking - in a worker thread so the app's event loop keeps serving)
     print("\n[1/5] Reading Excel file...")
-    df = pd.read_excel(file_path)
-
-    # First row contains column names
-    col_names = df.iloc[0].tolist()
-    df = pd.read_excel(file_path, skiprows=1, header=None)
-    df.columns = col_names
-
-    # Remove the duplicate header row
-    df = df[df['transaction_type'] != 'transaction_type']
+    df = await asyncio.to_thread(read_receivables_excel, file_path)
 
     print(f"  [OK] {len(df)} rows loaded")
 
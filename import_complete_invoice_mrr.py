@@ -11,6 +11,9 @@ from database import AsyncSessionLocal, init_db
 from models import InvoiceMRRSnapshot
 import re
 
+# Dates in descriptions like "Gjelder perioden 01 May 2025 til 30 Apr 2026"
+DATE_PATTERN = re.compile(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})')
+
 print("=" * 100)
 print("COMPLETE INVOICE MRR ANALYSIS")
 print("Using Invoice Details (includes paid invoices) + Credit Note Details")
@@ -164,12 +167,11 @@ print(f"{'='*100}")
 
 def extract_period_months(desc):
     """Extract number of months from description like 'Gjelder perioden 01 May 2025 til 30 Apr 2026'"""
-    if pd.isna(desc):
+    if not isinstance(desc, str):
         return None, None, None
 
     # Try to find date patterns
-    date_pattern = r'(\d{1,2})\s+(\w+)\s+(\d{4})'
-    matches = re.findall(date_pattern, str(desc))
+    matches = DATE_PATTERN.findall(desc)
 
     if len(matches) >= 2:
         try:
@@ -191,9 +193,11 @@ def extract_period_months(desc):
     return None, None, None
 
 print("\nExtracting periods from descriptions...")
-period_info = df_combined['description'].apply(extract_period_months).apply(pd.Series)
-period_info.columns = ['period_months', 'period_start', 'period_end']
-df_combined = pd.concat([df_combined, period_info], axis=1)
+# Unzip the (months, start, end) tuples into columns - no per-row Series construction
+period_months, period_start, period_end = zip(*[extract_period_months(desc) for desc in df_combined['description']])
+df_combined['period_months'] = pd.Series(period_months, index=df_combined.index, dtype='float64')
+df_combined['period_start'] = pd.to_datetime(pd.Series(period_start, index=df_combined.index))
+df_combined['period_end'] = pd.to_datetime(pd.Series(period_end, index=df_combined.index))
 
 # Check how many we extracted
 extracted = df_combined['period_months'].notna().sum()
@@ -239,10 +243,9 @@ def calculate_period_dates(row):
     return row['period_start'], row['period_end']
 
 print("\nCalculating period dates for inferred periods...")
-period_dates = df_combined.apply(calculate_period_dates, axis=1).apply(pd.Series)
-period_dates.columns = ['calc_start', 'calc_end']
-df_combined['period_start'] = period_dates['calc_start']
-df_combined['period_end'] = period_dates['calc_end']
+calc_start, calc_end = zip(*df_combined.apply(calculate_period_dates, axis=1))
+df_combined['period_start'] = list(calc_start)
+df_combined['period_end'] = list(calc_end)
 
 # Convert to datetime
 df_combined['period_start'] = pd.to_datetime(df_combined['period_start'], errors='coerce')
@@ -271,17 +274,22 @@ print(f"\n{'='*100}")
 print(f"MONTHLY MRR CALCULATION")
 print(f"{'='*100}")
 
-def calculate_monthly_mrr(df, target_month):
+# Lines that can contribute to MRR, with their periods as an IntervalIndex built once
+# CRITICAL: Include both invoices AND credit notes for accurate MRR
+mrr_lines = df_combined[
+    df_combined['period_start'].notna() &
+    df_combined['period_end'].notna() &
+    (df_combined['period_start'] <= df_combined['period_end']) &
+    (df_combined['transaction_type'].isin(['invoice', 'creditnote']))
+]
+mrr_periods = pd.IntervalIndex.from_arrays(mrr_lines['period_start'], mrr_lines['period_end'], closed='both')
+
+def calculate_monthly_mrr(lines, periods, target_month):
     """Calculate MRR for a specific month based on active invoice periods (including credit notes)"""
     target_date = pd.to_datetime(f"{target_month}-01")
 
     # Filter to lines where period covers target month
-    # CRITICAL: Include both invoices AND credit notes for accurate MRR
-    active_lines = df[
-        (df['period_start'] <= target_date) &
-        (df['period_end'] >= target_date) &
-        (df['transaction_type'].isin(['invoice', 'creditnote']))
-    ].copy()
+    active_lines = lines[periods.contains(target_date)]
 
     total_mrr = active_lines['line_mrr'].sum()
     line_count = len(active_lines)
@@ -299,7 +307,7 @@ mrr_by_month = []
 print("\nCalculating invoice-based MRR by month (including credit notes)...")
 for month in months_to_check:
     month_str = month.strftime('%Y-%m')
-    mrr, count, inv_count, cn_count = calculate_monthly_mrr(df_combined, month_str)
+    mrr, count, inv_count, cn_count = calculate_monthly_mrr(mrr_lines, mrr_periods, month_str)
     mrr_by_month.append({
         'month': month_str,
         'invoice_mrr': mrr,
@@ -1,10 +1,12 @@
 """
-Migration script to add new columns to sync_status table
+Migration script to add new columns (and the latest-sync index) to sync_status table
 Run this once to update the database schema
 """
 import asyncio
 from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
 from database import AsyncSessionLocal
+from models.subscription import SyncStatus
 
 def safe_print(message):
     """Print with ASCII-safe characters for Windows console"""
@@ -46,6 +48,19 @@ async def migrate():
             if await add_column(session, column_name, column_def):
                 success_count += 1
 
+    # Index for the "latest successful sync" lookup every sync starts with
+    async with AsyncSessionLocal() as session:
+        try:
+            # Compiled from the model so the partial WHERE matches the dialect's boolean literal
+            # (the planner only uses the index when it matches the query's "success = ..." exactly)
+            index = next(ix for ix in SyncStatus.__table__.indexes if ix.name == "ix_sync_status_success_time")
+            await session.execute(CreateIndex(index, if_not_exists=True))
+            await session.commit()
+            safe_print("[OK] Created index ix_sync_status_success_time")
+        except Exception as e:
+            await session.rollback()
+            safe_print(f"[ERROR] Failed to create ix_sync_status_success_time: {e}")
+
     safe_print(f"\n[SUCCESS] Migration completed! {success_count}/{len(columns_to_add)} columns processed.")
 
 if __name__ == "__main__":
@@ -67,6 +67,7 @@ class AccountingReceivableItem(Base):
     # Indexes for fast querying
     __table_args__ = (
         Index('idx_accounting_period', 'period_start_date', 'period_end_date'),
+        Index('idx_accounting_period_end', 'period_end_date', 'period_start_date'),  # Month-end snapshots
         Index('idx_accounting_customer_period', 'customer_name', 'period_start_date'),
         Index('idx_accounting_month_type', 'source_month', 'transaction_type'),
     )
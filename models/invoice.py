@@ -1,7 +1,7 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, String, Float, Integer, DateTime, ForeignKey, Boolean, Text, Index, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
-from models.subscription import Base
+from models.subscription import Base, match_key
 
 
 class Invoice(Base):
@@ -40,6 +40,11 @@ class Invoice(Base):
     # Relationships
     line_items = relationship("InvoiceLineItem", back_populates="invoice", cascade="all, delete-orphan")
 
+    # Customer lookups in the gap analysis (detail rows per customer)
+    __table_args__ = (
+        Index('idx_invoices_customer_name', 'customer_name'),
+    )
+
     def __repr__(self):
         return f"<Invoice {self.invoice_number} - {self.customer_name} - {self.total} {self.currency_code}>"
 
@@ -69,6 +74,10 @@ class InvoiceLineItem(Base):
     vessel_name = Column(String, index=True, nullable=True)  # CF.Fartøy from XLSX
     call_sign = Column(String, index=True, nullable=True)  # CF.Radiokallesignal from XLSX
 
+    # Normalized copies for matching - maintained on write (see _set_line_match_keys)
+    call_sign_key = Column(String, index=True, nullable=True)
+    vessel_key = Column(String, index=True, nullable=True)
+
     # Pricing
     price = Column(Float, nullable=False)  # Excluding tax
     quantity = Column(Integer, default=1)
@@ -90,10 +99,25 @@ class InvoiceLineItem(Base):
     # Relationships
     invoice = relationship("Invoice", back_populates="line_items")
 
+    # Active-in-month lookups filter on both period bounds. Month-end snapshots
+    # (start <= X AND end >= X) are most selective on the end date, so lead with it
+    __table_args__ = (
+        Index('idx_invoice_line_period', 'period_start_date', 'period_end_date'),
+        Index('idx_invoice_line_period_end', 'period_end_date', 'period_start_date'),
+    )
+
     def __repr__(self):
         return f"<InvoiceLineItem {self.name} - {self.price} {self.invoice.currency_code if self.invoice else 'NOK'}>"
 
 
+@event.listens_for(InvoiceLineItem, 'before_insert')
+@event.listens_for(InvoiceLineItem, 'before_update')
+def _set_line_match_keys(mapper, connection, target):
+    """Keep the match keys in sync with call_sign / vessel_name"""
+    target.call_sign_key = match_key(target.call_sign)
+    target.vessel_key = match_key(target.vessel_name)
+
+
 class InvoiceMRRSnapshot(Base):
     """
     Monthly MRR snapshots calculated from invoices
@@ -1,10 +1,15 @@
 from datetime import datetime
-from sqlalchemy import Column, String, Float, DateTime, Integer, Boolean
+from sqlalchemy import Column, String, Float, DateTime, Integer, Boolean, Index, event
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 
+def match_key(value):
+    """Normalized call sign / vessel name used for subscription matching (None when blank)"""
+    return (value or '').strip().upper() or None
+
+
 class Subscription(Base):
     """Model for storing subscription data from Zoho Billing"""
     __tablename__ = "subscriptions"
@@ -24,6 +29,10 @@ class Subscription(Base):
     vessel_name = Column(String, nullable=True)  # Fartøy
     call_sign = Column(String, nullable=True)  # Kallesignal
 
+    # Normalized copies for matching - maintained on write (see _set_match_keys)
+    call_sign_key = Column(String, nullable=True)
+    vessel_key = Column(String, nullable=True)
+
     created_time = Column(DateTime)
     activated_at = Column(DateTime, index=True)
     cancelled_at = Column(DateTime, nullable=True)
@@ -32,6 +41,23 @@ class Subscription(Base):
     # Metadata
     last_synced = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Active subscriptions per customer (MRR and gap analysis only read live/non_renewing)
+    __table_args__ = (
+        Index(
+            'idx_subscriptions_active_customer', 'customer_name',
+            postgresql_where=status.in_(['live', 'non_renewing']),
+            sqlite_where=status.in_(['live', 'non_renewing'])
+        ),
+    )
+
+
+@event.listens_for(Subscription, 'before_insert')
+@event.listens_for(Subscription, 'before_update')
+def _set_match_keys(mapper, connection, target):
+    """Keep the match keys in sync with call_sign / vessel_name"""
+    target.call_sign_key = match_key(target.call_sign)
+    target.vessel_key = match_key(target.vessel_name)
+
 
 class MetricsSnapshot(Base):
     """Model for storing calculated metrics snapshots"""
@@ -80,6 +106,16 @@ class SyncStatus(Base):
     error_message = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Every sync starts by looking up the latest successful sync - a partial index
+    # turns the ORDER BY ... LIMIT 1 into a single index fetch
+    __table_args__ = (
+        Index(
+            'ix_sync_status_success_time', last_sync_time.desc(),
+            postgresql_where=success == True,
+            sqlite_where=success == True
+        ),
+    )
+
 
 class MonthlyMRRSnapshot(Base):
     """Model for storing monthly MRR snapshots based on actual subscription data at that time"""
@@ -4,14 +4,15 @@ Handles MRR calculations from accounting's receivable details (ultimate source o
 """
 
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from typing import List, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+from functools import lru_cache
 import json
 import os
 
 from models.accounting import AccountingReceivableItem, AccountingMRRSnapshot
+from dates import month_end_snapshot
 
 # Load category mapping from JSON (generated from parameters.xlsx)
 CATEGORY_MAPPING = {}
@@ -45,13 +46,7 @@ class AccountingService:
         year, month = map(int, target_month.split('-'))
 
         # Calculate last day of month
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-
-        # Set to end of day (23:59:59)
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Get all items active on the last day of month
         # Logic: period must have started before month_end AND not yet ended
@@ -86,12 +81,7 @@ class AccountingService:
         year, month = map(int, target_month.split('-'))
 
         # Calculate last day of month
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Count unique customers with active items on the last day of month
         stmt = select(func.count(func.distinct(AccountingReceivableItem.customer_name))).where(
@@ -118,12 +108,7 @@ class AccountingService:
         year, month = map(int, target_month.split('-'))
 
         # Calculate last day of month
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Calculate invoice MRR (periodized)
         stmt = select(
@@ -196,11 +181,7 @@ class AccountingService:
 
         # Calculate last day of month for all queries
         year, month = map(int, target_month.split('-'))
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Count invoice and credit note items
         stmt = select(
@@ -334,11 +315,14 @@ class AccountingService:
         return trends
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def categorize_item(item_name: str) -> str:
         """
         Categorize an accounting item based on parameters.xlsx mapping
 
         Uses official category mapping from accounting's parameters file.
+        Results are cached per item name - the same few names repeat across
+        thousands of lines, and the mapping is loaded once at import.
 
         Categories from parameters.xlsx:
         - Fangstdagbok (recurring MRR)
@@ -375,6 +359,7 @@ class AccountingService:
         return 'Andre inntekter'
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def is_recurring_category(category: str) -> bool:
         """
         Check if a category represents recurring revenue (MRR)
@@ -404,11 +389,7 @@ class AccountingService:
         """
         # Calculate last day of month
         year, month = map(int, target_month.split('-'))
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Get all items active on last day of month
         stmt = select(AccountingReceivableItem).where(
@@ -467,11 +448,7 @@ class AccountingService:
         """
         # Calculate last day of month
         year, month = map(int, target_month.split('-'))
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Get all items active on last day of month
         stmt = select(AccountingReceivableItem).where(
@@ -1,3 +1,4 @@
+import heapq
 from openai import AsyncOpenAI
 from typing import Dict
 
@@ -294,7 +295,7 @@ class AnalysisService:
                 plans_summary[plan_name]['total_mrr'] += mrr
 
             context += "**Fordeling per plan:**\n"
-            sorted_plans = sorted(plans_summary.items(), key=lambda x: x[1]['total_mrr'], reverse=True)[:10]
+            sorted_plans = heapq.nlargest(10, plans_summary.items(), key=lambda x: x[1]['total_mrr'])
             for plan_name, data in sorted_plans:
                 context += f"- **{plan_name}**: {data['count']} subscriptions, {data['total_mrr']:,.0f} kr MRR\n"
             context += "\n"
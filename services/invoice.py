@@ -7,6 +7,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 
 from models.invoice import Invoice, InvoiceLineItem, InvoiceMRRSnapshot
+from dates import month_end_snapshot
+
+# Billing period formats in line item descriptions (see parse_period_from_description)
+PERIOD_PATTERN_NORWEGIAN = re.compile(r'(\d{1,2}\s+\w+\s+\d{4})\s+til\s+(\d{1,2}\s+\w+\s+\d{4})', re.IGNORECASE)
+PERIOD_PATTERN_ENGLISH = re.compile(r'from\s+(\d{1,2}-\w+-\d{4})\s+to\s+(\d{1,2}-\w+-\d{4})', re.IGNORECASE)
+PERIOD_PATTERN_NORWEGIAN_ALT = re.compile(r'fra\s+(\d{1,2}\s+\w+)\s*-\s*(\d{1,2}\s+\w+\s+\d{4})', re.IGNORECASE)
+PERIOD_PATTERN_DOTS = re.compile(r'(\d{1,2}\.\d{1,2}\.\d{2,4})\s*-\s*(\d{1,2}\.\d{1,2}\.\d{2,4})', re.IGNORECASE)
 
 
 class InvoiceService:
@@ -33,8 +40,7 @@ class InvoiceService:
 
         try:
             # Pattern 1: Norwegian format "DD MMM YYYY til DD MMM YYYY"
-            pattern1 = r'(\d{1,2}\s+\w+\s+\d{4})\s+til\s+(\d{1,2}\s+\w+\s+\d{4})'
-            match = re.search(pattern1, description, re.IGNORECASE)
+            match = PERIOD_PATTERN_NORWEGIAN.search(description)
 
             if match:
                 start_str = match.group(1)
@@ -50,8 +56,7 @@ class InvoiceService:
                 return start_date, end_date, months
 
             # Pattern 2: English format "(from DD-Month-YYYY to DD-Month-YYYY)"
-            pattern2 = r'from\s+(\d{1,2}-\w+-\d{4})\s+to\s+(\d{1,2}-\w+-\d{4})'
-            match = re.search(pattern2, description, re.IGNORECASE)
+            match = PERIOD_PATTERN_ENGLISH.search(description)
 
             if match:
                 start_str = match.group(1)
@@ -67,8 +72,7 @@ class InvoiceService:
                 return start_date, end_date, months
 
             # Pattern 3: "Gjelder fra DD måned - DD måned YYYY"
-            pattern3 = r'fra\s+(\d{1,2}\s+\w+)\s*-\s*(\d{1,2}\s+\w+\s+\d{4})'
-            match = re.search(pattern3, description, re.IGNORECASE)
+            match = PERIOD_PATTERN_NORWEGIAN_ALT.search(description)
 
             if match:
                 start_str_partial = match.group(1)  # e.g. "1 januar"
@@ -83,8 +87,7 @@ class InvoiceService:
                 return start_date, end_date, months
 
             # Pattern 4: Dot format "DD.MM.YY-DD.MM.YY"
-            pattern4 = r'(\d{1,2}\.\d{1,2}\.\d{2,4})\s*-\s*(\d{1,2}\.\d{1,2}\.\d{2,4})'
-            match = re.search(pattern4, description, re.IGNORECASE)
+            match = PERIOD_PATTERN_DOTS.search(description)
 
             if match:
                 start_str = match.group(1).replace('.', '-')
@@ -230,13 +233,7 @@ class InvoiceService:
         year, month = map(int, target_month.split('-'))
 
         # Calculate last day of month
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-
-        # Set to end of day (23:59:59) for consistency
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Get all invoice line items that are active on the last day of month
         # Logic: period must have started before month_end AND not yet ended
@@ -277,12 +274,7 @@ class InvoiceService:
         year, month = map(int, target_month.split('-'))
 
         # Calculate last day of month
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Get all invoices with line items active on the last day of month
         stmt = select(func.count(func.distinct(Invoice.customer_id))).select_from(Invoice).join(
@@ -320,11 +312,7 @@ class InvoiceService:
 
         # Calculate last day of month for all queries
         year, month = map(int, target_month.split('-'))
-        if month == 12:
-            month_end = datetime(year + 1, 1, 1) - relativedelta(days=1)
-        else:
-            month_end = datetime(year, month + 1, 1) - relativedelta(days=1)
-        month_end = month_end.replace(hour=23, minute=59, second=59)
+        month_end = month_end_snapshot(year, month)
 
         # Count active invoices (invoices with line items active on last day of month)
         stmt = select(func.count(func.distinct(Invoice.id))).select_from(Invoice).join(
@@ -108,7 +108,6 @@ class InvoiceSyncService:
         """Sync invoices modified since given date"""
         print(f"\nSyncing invoices modified since {since.date()}...")
 
-        import httpx
         headers = await self.zoho._get_headers()
         # Invoices use different organization ID header
         headers['X-com-zoho-invoice-organizationid'] = self.zoho.org_id
@@ -116,7 +115,7 @@ class InvoiceSyncService:
         synced_count = 0
         line_items_count = 0
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with self.zoho._http(timeout=60.0) as client:
             # Fetch invoices (paginated)
             page = 1
             per_page = 200
@@ -232,7 +231,6 @@ class InvoiceSyncService:
         """Sync credit notes modified since given date"""
         print(f"\nSyncing credit notes modified since {since.date()}...")
 
-        import httpx
         headers = await self.zoho._get_headers()
         # Credit notes use invoice organization ID header
         headers['X-com-zoho-invoice-organizationid'] = self.zoho.org_id
@@ -240,7 +238,7 @@ class InvoiceSyncService:
         synced_count = 0
         line_items_count = 0
 
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        async with self.zoho._http(timeout=60.0) as client:
             # Try credit notes endpoint (similar to invoices)
             try:
                 page = 1
@@ -338,81 +338,114 @@ class MetricsCalculator:
             month_str: Month in format "YYYY-MM"
             as_of_date: Calculate metrics as of this date (typically end of month)
         """
+        await self.save_monthly_snapshots([(month_str, as_of_date)])
+
+    async def save_monthly_snapshots(self, month_ends: List[Tuple[str, datetime]]) -> None:
+        """
+        Save monthly MRR snapshots for several months
+
+        The subscriptions are read once and every month is computed from those
+        rows, instead of re-querying the table per month and metric.
+
+        Args:
+            month_ends: (month_str "YYYY-MM", as_of_date) pairs - as_of_date is typically end of month
+        """
         from models.subscription import MonthlyMRRSnapshot
-        from sqlalchemy import select
-        from datetime import timedelta
 
-        # Calculate metrics for this month
-        mrr = await self.calculate_mrr(as_of_date)
-        arr = mrr * 12
+        stmt = select(
+            Subscription.customer_id,
+            Subscription.status,
+            Subscription.amount,
+            Subscription.interval,
+            Subscription.interval_unit,
+            Subscription.activated_at,
+            Subscription.cancelled_at,
+        )
+        subs = (await self.session.execute(stmt)).all()
 
-        # Get subscription counts (don't filter by status - use dates only)
-        stmt = select(Subscription).where(
-            Subscription.activated_at <= as_of_date,
-            (Subscription.cancelled_at.is_(None)) | (Subscription.cancelled_at > as_of_date)
+        def mrr_of(rows) -> float:
+            return sum(self._normalize_to_mrr(sub.amount, sub.interval, sub.interval_unit) for sub in rows)
+
+        # Existing snapshots for all months in one query
+        stmt_existing = select(MonthlyMRRSnapshot).where(
+            MonthlyMRRSnapshot.month.in_([month_str for month_str, _ in month_ends])
         )
-        result = await self.session.execute(stmt)
-        active_subs = result.scalars().all()
-        customer_count = len(set(sub.customer_id for sub in active_subs))
-        subscription_count = len(active_subs)
+        existing_snapshots = {
+            snapshot.month: snapshot
+            for snapshot in (await self.session.execute(stmt_existing)).scalars()
+        }
+        current_month = datetime.utcnow().strftime("%Y-%m")
+
+        for month_str, as_of_date in month_ends:
+            # Active on as_of_date (dates only - a subscription could be "cancelled" now but was "live" then)
+            active_subs = [
+                sub for sub in subs
+                if sub.activated_at is not None and sub.activated_at <= as_of_date
+                and (sub.cancelled_at is None or sub.cancelled_at > as_of_date)
+            ]
+
+            # MRR - same rules as calculate_mrr (current MRR only counts live and non_renewing)
+            if (datetime.utcnow() - as_of_date).total_seconds() < 3600:
+                mrr = round(mrr_of(sub for sub in subs if sub.status in ("live", "non_renewing")), 2)
+            else:
+                mrr = round(mrr_of(active_subs), 2)
+            arr = mrr * 12
 
-        # Calculate ARPU
-        arpu = mrr / customer_count if customer_count > 0 else 0
+            customer_count = len(set(sub.customer_id for sub in active_subs))
+            subscription_count = len(active_subs)
 
-        # Calculate new and churned MRR for this month
-        from dateutil.relativedelta import relativedelta
-        month_date = datetime.strptime(month_str, "%Y-%m")
-        start_of_month = datetime(month_date.year, month_date.month, 1)
-        new_mrr = await self.calculate_new_mrr(start_of_month, as_of_date)
+            # Calculate ARPU
+            arpu = mrr / customer_count if customer_count > 0 else 0
 
-        # Get churned MRR
-        stmt_churned = select(Subscription).where(
-            Subscription.activated_at < start_of_month,
-            Subscription.cancelled_at.between(start_of_month, as_of_date)
-        )
-        result_churned = await self.session.execute(stmt_churned)
-        churned_subs = result_churned.scalars().all()
-        churned_mrr = sum(self._normalize_to_mrr(sub.amount, sub.interval, sub.interval_unit) for sub in churned_subs)
+            # Calculate new and churned MRR for this month
+            month_date = datetime.strptime(month_str, "%Y-%m")
+            start_of_month = datetime(month_date.year, month_date.month, 1)
+            new_mrr = round(mrr_of(
+                sub for sub in subs
+                if sub.activated_at is not None and start_of_month <= sub.activated_at <= as_of_date
+                and sub.status in ("live", "non_renewing")
+            ), 2)
+            churned_mrr = mrr_of(
+                sub for sub in subs
+                if sub.activated_at is not None and sub.activated_at < start_of_month
+                and sub.cancelled_at is not None and start_of_month <= sub.cancelled_at <= as_of_date
+            )
 
-        net_mrr = new_mrr - churned_mrr
-
-        # Check if snapshot already exists
-        stmt_existing = select(MonthlyMRRSnapshot).where(MonthlyMRRSnapshot.month == month_str)
-        result_existing = await self.session.execute(stmt_existing)
-        existing_snapshot = result_existing.scalar_one_or_none()
-
-        if existing_snapshot:
-            # DO NOT overwrite snapshots from Excel imports
-            # Only update if this is the current month (allow auto-updates for ongoing month)
-            current_month = datetime.utcnow().strftime("%Y-%m")
-            if month_str == current_month:
-                # Update current month snapshot
-                existing_snapshot.mrr = round(mrr, 2)
-                existing_snapshot.arr = round(arr, 2)
-                existing_snapshot.total_customers = customer_count
-                existing_snapshot.active_subscriptions = subscription_count
-                existing_snapshot.new_mrr = round(new_mrr, 2)
-                existing_snapshot.churned_mrr = round(churned_mrr, 2)
-                existing_snapshot.net_mrr = round(net_mrr, 2)
-                existing_snapshot.arpu = round(arpu, 2)
+            net_mrr = new_mrr - churned_mrr
+
+            existing_snapshot = existing_snapshots.get(month_str)
+            if existing_snapshot:
+                # DO NOT overwrite snapshots from Excel imports
+                # Only update if this is the current month (allow auto-updates for ongoing month)
+                if month_str == current_month:
+                    # Update current month snapshot
+                    existing_snapshot.mrr = round(mrr, 2)
+                    existing_snapshot.arr = round(arr, 2)
+                    existing_snapshot.total_customers = customer_count
+                    existing_snapshot.active_subscriptions = subscription_count
+                    existing_snapshot.new_mrr = round(new_mrr, 2)
+                    existing_snapshot.churned_mrr = round(churned_mrr, 2)
+                    existing_snapshot.net_mrr = round(net_mrr, 2)
+                    existing_snapshot.arpu = round(arpu, 2)
+                else:
+                    # Historical month - don't overwrite Excel data
+                    print(f"Skipping update for {month_str} - using imported Excel data")
             else:
-                # Historical month - don't overwrite Excel data
-                print(f"Skipping update for {month_str} - using imported Excel data")
-        else:
-            # Create new snapshot
-            snapshot = MonthlyMRRSnapshot(
-                month=month_str,
-                mrr=round(mrr, 2),
-                arr=round(arr, 2),
-                total_customers=customer_count,
-                active_subscriptions=subscription_count,
-                new_mrr=round(new_mrr, 2),
-                churned_mrr=round(churned_mrr, 2),
-                net_mrr=round(net_mrr, 2),
-                arpu=round(arpu, 2),
-                source="calculated",  # Mark as calculated from subscriptions
-            )
-            self.session.add(snapshot)
+                # Create new snapshot
+                snapshot = MonthlyMRRSnapshot(
+                    month=month_str,
+                    mrr=round(mrr, 2),
+                    arr=round(arr, 2),
+                    total_customers=customer_count,
+                    active_subscriptions=subscription_count,
+                    new_mrr=round(new_mrr, 2),
+                    churned_mrr=round(churned_mrr, 2),
+                    net_mrr=round(net_mrr, 2),
+                    arpu=round(arpu, 2),
+                    source="calculated",  # Mark as calculated from subscriptions
+                )
+                self.session.add(snapshot)
+                existing_snapshots[month_str] = snapshot
 
         await self.session.commit()
 
@@ -1,6 +1,7 @@
 import httpx
-from typing import List, Dict, Optional
-from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Dict, Optional
+from datetime import datetime, timedelta
 
 
 class ZohoClient:
@@ -13,6 +14,7 @@ class ZohoClient:
         refresh_token: str,
         org_id: str,
         base_url: str = "https://www.zohoapis.eu",
+        http_client: Optional[httpx.AsyncClient] = None,
     ):
         self.client_id = client_id
         self.client_secret = client_secret
@@ -21,6 +23,22 @@ class ZohoClient:
         self.base_url = base_url.rstrip("/")
         self.access_token: Optional[str] = None
         self.token_expires_at: Optional[datetime] = None
+        # Shared connection pool (kept alive between calls); None = one client per call
+        self.http_client = http_client
+
+    @asynccontextmanager
+    async def _http(self, timeout: float = 30.0) -> AsyncIterator[httpx.AsyncClient]:
+        """HTTP client for a request - the shared pool if there is one, else a short-lived client"""
+        if self.http_client is not None:
+            yield self.http_client
+            return
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            yield client
+
+    async def aclose(self):
+        """Close the shared connection pool"""
+        if self.http_client is not None:
+            await self.http_client.aclose()
 
     async def _refresh_access_token(self) -> str:
         """Refresh the OAuth2 access token using refresh token"""
@@ -32,18 +50,19 @@ class ZohoClient:
             "grant_type": "refresh_token",
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             response = await client.post(url, params=params)
             response.raise_for_status()
             data = response.json()
 
             self.access_token = data["access_token"]
-            # Token typically expires in 3600 seconds
+            # Token typically expires in 3600 seconds - refresh a minute early
+            self.token_expires_at = datetime.utcnow() + timedelta(seconds=int(data.get("expires_in", 3600)) - 60)
             return self.access_token
 
     async def _get_headers(self) -> Dict[str, str]:
         """Get authorization headers with valid access token"""
-        if not self.access_token:
+        if not self.access_token or (self.token_expires_at and datetime.utcnow() >= self.token_expires_at):
             await self._refresh_access_token()
 
         return {
@@ -83,7 +102,7 @@ class ZohoClient:
 
         headers = await self._get_headers()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with self._http() as client:
             try:
                 response = await client.get(url, headers=headers, params=params)
                 response.raise_for_status()
@@ -97,27 +116,22 @@ class ZohoClient:
                 print(f"Error fetching subscriptions: {str(e)}")
                 raise
 
-    async def get_all_subscriptions(self, last_modified_time: Optional[str] = None, include_cancelled: bool = True) -> List[Dict]:
+    async def iter_subscriptions(self, last_modified_time: Optional[str] = None) -> AsyncIterator[List[Dict]]:
         """
-        Fetch all subscriptions across all pages
+        Yield subscriptions one page at a time (all statuses)
+
+        Lets callers write each page before the next one is fetched, so memory
+        stays at one page instead of the whole tenant.
 
         Args:
-            last_modified_time: Filter by last modified time (ISO format) - NOTE: Cannot be used with status filter
-            include_cancelled: If True, fetch all statuses including cancelled (default: True)
+            last_modified_time: Filter by last modified time (ISO format)
 
-        Returns:
-            List of all subscription dictionaries
+        Yields:
+            List of subscription dictionaries per page
         """
-        all_subscriptions = []
         page = 1
         per_page = 200
 
-        # Zoho API filter_by causes 400 errors, so we fetch ALL subscriptions
-        # and filter in memory based on status
-        print(f"Fetching all subscriptions from Zoho...")
-        if last_modified_time:
-            print(f"  (modified since {last_modified_time})")
-
         while True:
             subs = await self.get_subscriptions(
                 status=None,  # Don't use filter_by - causes 400 error
@@ -128,13 +142,35 @@ class ZohoClient:
             if not subs:
                 break
 
-            all_subscriptions.extend(subs)
+            yield subs
 
             if len(subs) < per_page:
                 break
 
             page += 1
 
+    async def get_all_subscriptions(self, last_modified_time: Optional[str] = None, include_cancelled: bool = True) -> List[Dict]:
+        """
+        Fetch all subscriptions across all pages
+
+        Args:
+            last_modified_time: Filter by last modified time (ISO format) - NOTE: Cannot be used with status filter
+            include_cancelled: If True, fetch all statuses including cancelled (default: True)
+
+        Returns:
+            List of all subscription dictionaries
+        """
+        all_subscriptions = []
+
+        # Zoho API filter_by causes 400 errors, so we fetch ALL subscriptions
+        # and filter in memory based on status
+        print(f"Fetching all subscriptions from Zoho...")
+        if last_modified_time:
+            print(f"  (modified since {last_modified_time})")
+
+        async for subs in self.iter_subscriptions(last_modified_time=last_modified_time):
+            all_subscriptions.extend(subs)
+
         # Filter in memory if we don't want all subscriptions
         if not include_cancelled:
             # Only keep live and non_renewing
@@ -160,7 +196,7 @@ class ZohoClient:
         url = f"{self.base_url}/billing/v1/subscriptions/{subscription_id}"
         headers = await self._get_headers()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with self._http() as client:
             response = await client.get(url, headers=headers)
             response.raise_for_status()
             data = response.json()
@@ -182,7 +218,7 @@ class ZohoClient:
         params = {"page": page, "per_page": per_page}
         headers = await self._get_headers()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with self._http() as client:
             response = await client.get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
@@ -214,7 +250,7 @@ class ZohoClient:
 
         headers = await self._get_headers()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with self._http() as client:
             try:
                 response = await client.get(url, headers=headers, params=params)
                 response.raise_for_status()
@@ -278,7 +314,7 @@ class ZohoClient:
         url = f"{self.base_url}/billing/v1/creditnotes/{creditnote_id}"
         headers = await self._get_headers()
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with self._http() as client:
             response = await client.get(url, headers=headers)
             response.raise_for_status()
             data = response.json()